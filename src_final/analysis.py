@@ -1,9 +1,8 @@
 from collections import Counter
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
-import networkx as nx
-from skimage.morphology import skeletonize
-from skimage.measure import regionprops, label
+from instrumentation import logger
+# scipy, networkx and skimage are imported by the functions that need them, so that simulation workers (which import
+# this module through main.py) do not load them at startup
 
 def analyze_structure(lattice, monomers):
     """Perform analysis on the resulting structure after growth."""
@@ -14,12 +13,12 @@ def analyze_structure(lattice, monomers):
                                 if lattice.is_occupied(*neighbour) and lattice.grid[neighbour[1]][neighbour[0]].coupled)
         neighbour_frequencies[coupled_neighbours] += 1
     
-    print("Frequency of coupled neighbours:")
+    logger.info("Frequency of coupled neighbours:")
     for neighbours, count in sorted(neighbour_frequencies.items()):
-        print(f"{count} monomers have {neighbours} coupled neighbours.")
+        logger.info("%d monomers have %d coupled neighbours.", count, neighbours)
 
     radius, radius_of_gyration = calculate_effective_radius(lattice, monomers)
-    print(f"The Radius of Gyration of the Structure is {radius_of_gyration}")
+    logger.info("The Radius of Gyration of the Structure is %s", radius_of_gyration)
 
     """ # Skeletonize and analyze enclosed areas
     num_enclosed_areas, avg_enclosed_area, enclosed_areas = skeletonize_and_analyze(lattice)
@@ -35,6 +34,103 @@ def analyze_structure(lattice, monomers):
 
     return neighbour_frequencies, radius, radius_of_gyration
 
+def bond_graph(lattice, monomers):
+    """
+    Collect the bonds of the coupled network, using the same criterion as analyze_structure (a coupled monomer on a
+    next-nearest neighbour site).
+
+    Returns:
+        list: Sorted list of ((x1, y1), (x2, y2)) position pairs, one per bond.
+    """
+    bonds = set()
+    for monomer in monomers:
+        position = monomer.get_position()
+        for neighbour in lattice.get_next_nearest_neighbours(*position, monomer.get_orientation()):
+            if lattice.is_occupied(*neighbour) and lattice.grid[neighbour[1]][neighbour[0]].coupled:
+                bonds.add(tuple(sorted((position, neighbour))))
+    return sorted(bonds)
+
+# directions (degrees, in the plot coordinates of plotter.hexagonal_positions) of the three bonds of a monomer, in the
+# order of the next-nearest neighbour slots of geometry.py, for orientations 0 and 180
+BOND_ANGLES = {0: (210, 330, 90), 180: (270, 30, 150)}
+
+def bond_half_edges(lattice, monomers):
+    """
+    The bonds of the coupled network (same criterion as bond_graph) as half-edges: two per bond, one in each direction.
+
+    Returns:
+        tuple: (source, target, angle) arrays; half-edges 2i and 2i + 1 are the two directions of bond i, source and target
+            are indices into monomers and angle is the direction from source to target in degrees.
+    """
+    geometry = lattice.geometry
+    num_sites = geometry.num_sites
+    sites = np.fromiter((y * lattice.width + x for x, y in (monomer.position for monomer in monomers)), dtype=np.int64, count=len(monomers))
+    orientation_180 = np.fromiter((monomer.orientation == 180 for monomer in monomers), dtype=bool, count=len(monomers))
+    node = np.full(num_sites + 1, -1, dtype=np.int64) # monomer index per site (index num_sites stands for "off the lattice")
+    node[sites] = np.arange(len(monomers))
+    coupled = np.zeros(num_sites + 1, dtype=bool)
+    coupled[sites] = np.fromiter((bool(monomer.coupled) for monomer in monomers), dtype=bool, count=len(monomers))
+
+    next_nearest = np.asarray(geometry.next_nearest)[orientation_180.astype(int), sites] # (monomers, 3)
+    next_nearest = np.where(next_nearest >= 0, next_nearest, num_sites)
+    angles = np.where(orientation_180[:, None], BOND_ANGLES[180], BOND_ANGLES[0])
+    source, slot = np.nonzero(coupled[next_nearest])
+    target = node[next_nearest[source, slot]]
+    angle = angles[source, slot]
+
+    # a bond may be found from both ends; keep one direction of every bond
+    pairs = np.unique(np.column_stack([np.minimum(source, target), np.maximum(source, target)]), axis=0, return_index=True)[1]
+    source, target, angle = source[pairs], target[pairs], angle[pairs]
+    half_source = np.column_stack([source, target]).ravel()
+    half_target = np.column_stack([target, source]).ravel()
+    half_angle = np.column_stack([angle, (angle + 180) % 360]).ravel()
+    return half_source, half_target, half_angle
+
+def ring_statistics(lattice, monomers):
+    """
+    Ring (pore) sizes of the coupled network, from the faces of its planar embedding on the lattice.
+
+    Every monomer orders its bonds by direction, which gives the bond graph a fixed embedding in the plane. The faces of
+    the embedding are the orbits of the half-edge permutation next(h) = the bond leaving the end of h just clockwise of
+    the way back, so that each face is walked with its inside on the left; they are found as the connected components of
+    that permutation. A face is a pore if its walk turns by +360 degrees in total (U-turns at dangling ends count as -180);
+    the outer boundary of every island turns by -360 degrees, and faces that wrap around a periodic lattice by 0. The ring
+    size of a pore is the number of bonds around it, not counting bonds that dangle into it (those are walked in both
+    directions). Everything is done with array operations, in O(N log N) for N monomers.
+
+    Returns:
+        Counter: {ring size: number of pores}
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    source, target, angle = bond_half_edges(lattice, monomers)
+    count = len(source)
+    if count == 0:
+        return Counter()
+    twin = np.arange(count) ^ 1
+
+    # outgoing half-edges of every monomer in counterclockwise order; the clockwise neighbour of h is the previous one
+    # in its block, wrapping around to the end of the block
+    order = np.lexsort((angle, source))
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    block_start = np.searchsorted(source[order], source, side="left")
+    block_end = np.searchsorted(source[order], source, side="right")
+    clockwise = order[np.where(rank > block_start, rank - 1, block_end - 1)]
+    following = clockwise[twin]
+
+    faces = connected_components(coo_matrix((np.ones(count), (np.arange(count), following)), shape=(count, count)), directed=True,
+                                 connection="strong")[1]
+    turn = (angle[following] - angle + 180) % 360 - 180 # in [-180, 180), so U-turns are -180
+    turning = np.bincount(faces, weights=turn)
+    length = np.bincount(faces)
+    dangling = np.bincount(faces[faces == faces[twin]]) if np.any(faces == faces[twin]) else np.zeros(0)
+    dangling = np.pad(dangling, (0, len(length) - len(dangling))) / 2 # both half-edges of a dangling bond were counted
+
+    pores = np.flatnonzero(np.isclose(turning, 360))
+    return Counter((length[pores] - 2 * dangling[pores]).astype(int).tolist())
+
 def skeletonize_and_analyze(lattice):
     """
     Skeletonize the monomer network on the lattice and calculate enclosed area statistics.
@@ -47,6 +143,9 @@ def skeletonize_and_analyze(lattice):
         average_area (float): Average area of the enclosed regions.
         enclosed_areas (list): List of areas of each enclosed region.
     """
+    from skimage.morphology import skeletonize
+    from skimage.measure import regionprops, label
+
     # Step 1: Convert lattice to binary grid
     binary_grid = np.array([[1 if cell is not None else 0 for cell in row] for row in lattice.grid])
 
@@ -95,6 +194,9 @@ def calculate_mst_metrics(positions, cell_areas):
         m (float): Normalized mean MST edge length.
         sigma (float): Normalized standard deviation of MST edge lengths.
     """
+    from scipy.spatial.distance import pdist, squareform
+    import networkx as nx
+
     # Calculate pairwise distances
     distance_matrix = squareform(pdist(positions))
 
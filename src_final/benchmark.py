@@ -0,0 +1,286 @@
+# src/benchmark.py
+
+"""
+Benchmark suite for the engine, lattice and analysis hot paths.
+
+Every benchmark runs with fixed seeds, is repeated a few times and reports the minimum, median and mean wall time. The
+results are written as a JSON report; passing a baseline report compares the medians and exits with status 1 if any
+benchmark got slower than the baseline by more than the threshold, so engine and data-structure changes can be checked
+against it:
+
+    python benchmark.py -o baseline.json                             # record a baseline
+    python benchmark.py --baseline baseline.json --threshold 0.2     # fail on slowdowns of more than 20 %
+    python benchmark.py --suite full -k growth                       # only the growth benchmarks, at all sizes
+
+The "quick" suite runs the small sizes and takes a minute or two; the "full" suite adds lattices of width 1000 and
+islands of 500 and 5000 monomers and can take hours. The islands used by the analysis benchmarks are grown once with a
+fixed seed and stored as snapshots (see snapshot.py) in the data folder, so later runs analyze the same islands.
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import numpy as np
+
+SUITES = ("quick", "full")
+LOW_BARRIER = {"diffusion": 0.3, "rotation": 0.0, "coupling": 0.3, "dehalogenation": 0.3}
+HIGH_BARRIER = {"diffusion": 1.5, "rotation": 0.0, "coupling": 1.7, "dehalogenation": 1.7}
+DEFECT_PARAMS = [1.0, 0.00, 1.0]
+SEED = 12345
+GROWTH_MAX_STEPS = 1e5
+SWEEP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "zach_output_5_5_5_0-1_8.csv")
+
+BENCHMARKS = [] # (name, suites, repeat, params, function returning (setup, run))
+
+def benchmark(name, suites=SUITES, repeat=5, **params):
+    '''
+    Register a benchmark. The decorated function gets the params and returns (setup, run): setup() is called untimed
+    before every repetition and its return value is passed to the timed run(state).
+    '''
+    def register(function):
+        BENCHMARKS.append((name, suites, repeat, params, function))
+        return function
+    return register
+
+def monomer_params(energies):
+    return ['A', 1e13, energies["diffusion"], 1e13, energies["rotation"], 1e13, energies["coupling"], 1e13, energies["dehalogenation"]]
+
+def island_width(total_monomers):
+    # enough room that the island does not wrap around the periodic lattice
+    return max(60, 2 * math.ceil(math.sqrt(8 * total_monomers) / 2))
+
+def seed_all(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+
+def stored_island(total_monomers, data_dir):
+    """
+    Restore an island of total_monomers (low-barrier energies) from the data folder, growing and storing it first if needed.
+    """
+    from lattice import Lattice
+    from main import slow_growth_simulation
+    from snapshot import snapshot_state, restore_state
+
+    params = monomer_params(LOW_BARRIER)
+    path = os.path.join(data_dir, f"island_{total_monomers}_seed{SEED}.kmcs")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        seed_all()
+        lattice = Lattice(island_width(total_monomers))
+        monomers = slow_growth_simulation(lattice, params, DEFECT_PARAMS, 0.0, total_monomers, max_steps=GROWTH_MAX_STEPS)
+        with open(path, "wb") as file:
+            file.write(snapshot_state(lattice, monomers))
+    with open(path, "rb") as file:
+        lattice, monomers, _ = restore_state(file.read(), params)
+    return lattice, monomers
+
+# lattice construction
+
+for width, suites in ((60, SUITES), (240, SUITES), (1000, ("full",))):
+    @benchmark(f"geometry_tables_w{width}", suites, repeat=3, width=width)
+    def _(width, data_dir):
+        from geometry import compute_geometry
+        return None, lambda state: compute_geometry(width)
+
+    @benchmark(f"lattice_init_w{width}", suites, repeat=3, width=width)
+    def _(width, data_dir):
+        from lattice import Lattice
+        from geometry import get_geometry
+        get_geometry(width) # warm geometry cache, as in a sweep after the first lattice
+        return None, lambda state: Lattice(width)
+
+# single walker
+
+@benchmark("monomer_action_10k_hops", repeat=5, hops=10000)
+def _(hops, data_dir):
+    from lattice import Lattice
+    from monomer import Monomer
+
+    def setup():
+        seed_all()
+        lattice = Lattice(60)
+        monomer = Monomer(*monomer_params(LOW_BARRIER))
+        lattice.place_monomer(monomer, 30, 30)
+        return lattice, monomer
+
+    def run(state):
+        lattice, monomer = state
+        for _ in range(hops):
+            monomer.action(lattice, False)
+    return setup, run
+
+# growth
+
+for total_monomers, suites in ((50, SUITES), (500, ("full",)), (5000, ("full",))):
+    for label, energies in (("low", LOW_BARRIER), ("high", HIGH_BARRIER)):
+        @benchmark(f"growth_{total_monomers}_{label}_barrier", suites, repeat=3 if total_monomers <= 50 else 1,
+                   total_monomers=total_monomers, energies=energies)
+        def _(total_monomers, energies, data_dir):
+            from lattice import Lattice
+            from main import slow_growth_simulation
+
+            def setup():
+                seed_all()
+                return Lattice(island_width(total_monomers))
+
+            def run(lattice):
+                slow_growth_simulation(lattice, monomer_params(energies), DEFECT_PARAMS, 0.0, total_monomers, max_steps=GROWTH_MAX_STEPS)
+            return setup, run
+
+# analysis of stored islands
+
+for total_monomers, suites in ((50, SUITES), (500, ("full",))):
+    @benchmark(f"analyze_structure_{total_monomers}", suites, total_monomers=total_monomers)
+    def _(total_monomers, data_dir):
+        from analysis import analyze_structure
+        lattice, monomers = stored_island(total_monomers, data_dir)
+        return None, lambda state: analyze_structure(lattice, monomers)
+
+    @benchmark(f"mst_metrics_{total_monomers}", suites, total_monomers=total_monomers)
+    def _(total_monomers, data_dir):
+        from analysis import calculate_mst_metrics
+        _, monomers = stored_island(total_monomers, data_dir)
+        positions = np.array([monomer.position for monomer in monomers], dtype=float)
+        return None, lambda state: calculate_mst_metrics(positions, math.sqrt(3) / 2)
+
+    @benchmark(f"skeletonize_and_analyze_{total_monomers}", suites, total_monomers=total_monomers)
+    def _(total_monomers, data_dir):
+        from analysis import skeletonize_and_analyze
+        lattice, _ = stored_island(total_monomers, data_dir)
+        return None, lambda state: skeletonize_and_analyze(lattice)
+
+# Wasserstein comparison over a stored sweep
+
+@benchmark("wasserstein_stored_sweep", repeat=5, sweep=os.path.basename(SWEEP_FILE), experiments=16)
+def _(sweep, experiments, data_dir):
+    from wasserstein import load_simulated_histograms, histogram_degrees, histogram_matrix, wasserstein_matrix
+
+    # the sweep's own first rows stand in for the experimental histograms, which are not part of the repository
+    _, _, histograms = load_simulated_histograms(SWEEP_FILE)
+    experimental = histograms[:experiments]
+
+    def run(state):
+        degrees = histogram_degrees(histograms + experimental)
+        return wasserstein_matrix(histogram_matrix(histograms, degrees), histogram_matrix(experimental, degrees))
+    return None, run
+
+def calibrate(run, min_time):
+    '''
+    Number of calls of a stateless benchmark that take at least min_time, so short benchmarks are not dominated by timer noise.
+    '''
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run(None)
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 10
+
+def run_benchmark(name, repeat, params, function, data_dir, min_time=0.2):
+    """
+    Time a registered benchmark. Benchmarks without a setup are called repeatedly per repetition (see calibrate) and the
+    time per call is reported. Output printed by the benchmarked code is discarded.
+    """
+    setup, run = function(data_dir=data_dir, **params)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        number = calibrate(run, min_time) if setup is None else 1
+        for _ in range(repeat):
+            state = setup() if setup is not None else None
+            start = time.perf_counter()
+            for _ in range(number):
+                run(state)
+            times.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "repeat": repeat,
+        "number": number,
+        "params": {key: value for key, value in params.items()},
+    }
+
+def environment():
+    from result_cache import code_version
+
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "code_version": code_version(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Compare the medians with a baseline report.
+
+    Returns:
+        list of tuple: (name, baseline median, current median, relative change) of every benchmark slower than the threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        change = result["median"] / reference["median"] - 1
+        print(f"{name:<40} {reference['median']:10.6f} s -> {result['median']:10.6f} s ({change:+.1%})")
+        if change > threshold:
+            regressions.append((name, reference["median"], result["median"], change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the engine, lattice and analysis hot paths.")
+    parser.add_argument("--suite", choices=SUITES, default="quick")
+    parser.add_argument("-k", dest="pattern", default="*", help="only run benchmarks whose name matches this pattern (substring or glob)")
+    parser.add_argument("-o", "--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", default=None, help="report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="largest allowed relative slowdown of a median")
+    parser.add_argument("--data-dir", default=".benchmark_data", help="folder for the stored islands")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks of the suite and exit")
+    args = parser.parse_args(argv)
+
+    pattern = args.pattern if any(c in args.pattern for c in "*?[") else f"*{args.pattern}*"
+    selected = [b for b in BENCHMARKS if args.suite in b[1] and fnmatch.fnmatch(b[0], pattern)]
+    if args.list:
+        for name, _, repeat, params, _ in selected:
+            print(f"{name} (x{repeat})")
+        return 0
+
+    from instrumentation import configure_logging
+    configure_logging("WARNING") # keep the growth benchmarks quiet
+
+    results = {}
+    for name, _, repeat, params, function in selected:
+        results[name] = run_benchmark(name, repeat, params, function, args.data_dir)
+        print(f"{name:<40} median {results[name]['median']:.6f} s (min {results[name]['min']:.6f} s, {repeat} runs)")
+
+    report = {"suite": args.suite, "environment": environment(), "results": results}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=1)
+    print(f"Report saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}:")
+            for name, before, after, change in regressions:
+                print(f"    {name}: {before:.6f} s -> {after:.6f} s ({change:+.1%})")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
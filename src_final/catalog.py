@@ -0,0 +1,431 @@
+# src/catalog.py
+
+"""
+Indexed, deduplicated catalog of the results of all sweeps.
+
+Results files written by save_results_to_csv (and their older variants: cluster_results.csv has no dehalogenation energy,
+only recent files have a "Replicas" column) and the distance files of wasserstein.py are ingested once into a single
+SQLite file. Every parameter point is keyed on its energies, the lattice width and the number of monomers in the island:
+
+    diffusion, rotation, coupling, dehalogenation   rounded to 6 decimals, so that 0.5750000000000001 from np.linspace
+                                                    is 0.575; NULL where a file does not have the column
+    width                                           given at ingest (the files do not record it), NULL otherwise
+    monomers                                        given at ingest, otherwise read off the histogram (number of monomers
+                                                    it counts)
+
+The same row found in several files (copies of a sweep in different folders) counts once. Different rows with the same
+key (the point was simulated again) are merged into one point: the histograms and the means are averaged weighted by the
+replicas of each row and the standard deviations are pooled. Files without a "Replicas" column are taken to have
+DEFAULT_REPLICAS replicas per row unless told otherwise. Rows of points that produced no island ({} and NaN) are points
+with an empty histogram and no radii; they take the island size of the other rows of their file and count toward the
+replicas of their point, but not toward its averages.
+
+Files are re-read only if they changed since they were last ingested. Slice queries go to indexed columns and do not
+touch the CSVs:
+
+    python catalog.py ingest ../data ../wasserstein-distance-experiment-vs-simulations.csv
+    python catalog.py ingest zach_output_rot.csv --width 60 --replicas 3
+    python catalog.py query --coupling 0.575
+    python catalog.py query --diffusion 0.5 0.9 --experiment STM02_graph_metrics.csv
+    python catalog.py stats
+
+or from Python, Catalog("sweep_catalog.sqlite").points(coupling=0.575), which returns aggregate_replicas-style dicts.
+"""
+
+import argparse
+import ast
+import csv
+import glob
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from wasserstein import ENERGY_COLUMNS
+
+ENERGIES = ["diffusion", "rotation", "coupling", "dehalogenation"] # catalog columns, in the order of ENERGY_COLUMNS
+KEY_COLUMNS = ENERGIES + ["width", "monomers"]
+DECIMALS = 6
+DEFAULT_REPLICAS = 3 # replicas per point of main() when the files without a "Replicas" column were written
+
+def _number(text):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def _energy(value):
+    value = _number(value)
+    return None if value is None else round(value, DECIMALS) + 0.0 # + 0.0 turns -0.0 into 0.0
+
+def _histogram(text):
+    # "{3: 21.0, 2: 19.0}" as written by save_results_to_csv; empty cells and "{}" give an empty histogram
+    histogram = ast.literal_eval(text) if text and text.strip() else {}
+    return {int(key): float(value) for key, value in histogram.items()}
+
+def _signature(path, options):
+    stat = os.stat(path)
+    return json.dumps([stat.st_mtime_ns, stat.st_size, options])
+
+def file_kind(fieldnames):
+    '''
+    "results" for files written by save_results_to_csv, "distances" for files written by wasserstein.py, else None.
+    '''
+    fieldnames = fieldnames or []
+    if "Averaged Neighbour Frequency" in fieldnames:
+        return "results"
+    if "Wasserstein Distance" in fieldnames and "Experimental File" in fieldnames:
+        return "distances"
+    return None
+
+def point_key(energies, width, monomers):
+    return json.dumps(list(energies) + [width, monomers])
+
+def pooled(samples):
+    """
+    Mean and (population) standard deviation of the union of several samples.
+
+    Args:
+        samples (list): (size, mean, standard deviation) of every sample; samples with a missing mean are ignored.
+
+    Returns:
+        tuple: (mean, standard deviation), both None without any samples.
+    """
+    samples = [(n, mean, std or 0.0) for n, mean, std in samples if mean is not None]
+    total = sum(n for n, _, _ in samples)
+    if total == 0:
+        return None, None
+    mean = sum(n * m for n, m, _ in samples) / total
+    variance = sum(n * (s**2 + (m - mean)**2) for n, m, s in samples) / total
+    return mean, math.sqrt(max(variance, 0.0))
+
+def combine(rows):
+    """
+    Merge the results rows of one point (see read_results) into a single row, weighting every row by its replicas.
+    """
+    replicas = sum(row["replicas"] for row in rows)
+    def average(field):
+        # rows without an island ({}) are left out of the average; a point without any island keeps an empty histogram
+        with_field = [row for row in rows if row[field]]
+        weight = sum(row["replicas"] for row in with_field)
+        if not weight:
+            return {} if any(row[field] is not None for row in rows) else None
+        total = {}
+        for row in with_field:
+            for key, value in row[field].items():
+                total[key] = total.get(key, 0.0) + value * row["replicas"]
+        return {key: value / weight for key, value in sorted(total.items())}
+    radius = pooled([(row["replicas"], row["radius"], row["std_radius"]) for row in rows])
+    radius_of_gyration = pooled([(row["replicas"], row["radius_of_gyration"], row["std_radius_of_gyration"]) for row in rows])
+    return {"replicas": replicas, "neighbour_freq": average("neighbour_freq"), "ring_sizes": average("ring_sizes"),
+            "radius": radius[0], "std_radius": radius[1], "radius_of_gyration": radius_of_gyration[0],
+            "std_radius_of_gyration": radius_of_gyration[1]}
+
+def read_results(path, width=None, monomers=None, replicas=DEFAULT_REPLICAS):
+    """
+    Rows of a results file (see save_results_to_csv), whatever subset of its columns the file has.
+
+    Args:
+        path (str): Results CSV.
+        width (int): Lattice width of the sweep, if known.
+        monomers (int): Monomers per island; read off every histogram if not given (rows without an island take the
+            most common size of the file, or None if no row has an island).
+        replicas (int): Replicas per row for files without a "Replicas" column.
+
+    Returns:
+        list of tuple: (energies, width, monomers, row) with row as in combine.
+    """
+    rows = []
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        for line in reader:
+            neighbour_freq = _histogram(line.get("Averaged Neighbour Frequency")) # empty if the point produced no island
+            ring_sizes = line.get("Averaged Ring Sizes")
+            row = {
+                "replicas": int(_number(line.get("Replicas")) or replicas),
+                "neighbour_freq": neighbour_freq,
+                "ring_sizes": _histogram(ring_sizes) if ring_sizes else None,
+                "radius": _number(line.get("Average Radius")),
+                "std_radius": _number(line.get("Standard Dev Radius")),
+                "radius_of_gyration": _number(line.get("Average Radius of Gyration")),
+                "std_radius_of_gyration": _number(line.get("Standard Dev ROG")),
+            }
+            energies = [_energy(line.get(column)) for column in ENERGY_COLUMNS]
+            island = monomers if monomers is not None or not neighbour_freq else int(round(sum(neighbour_freq.values())))
+            rows.append((energies, width, island, row))
+    sizes = [island for _, _, island, _ in rows if island is not None]
+    if sizes and len(sizes) < len(rows):
+        common = max(sorted(set(sizes)), key=sizes.count)
+        rows = [(energies, row_width, common if island is None else island, row) for energies, row_width, island, row in rows]
+    return rows
+
+def read_distances(path, width=None, monomers=None):
+    '''
+    (energies, width, monomers, experiment, distance) of every row of a distance file written by wasserstein.py.
+    '''
+    rows = []
+    with open(path, newline="") as file:
+        for line in csv.DictReader(file):
+            distance = _number(line.get("Wasserstein Distance"))
+            experiment = os.path.basename(line["Experimental File"].replace("\\", "/"))
+            rows.append(([_energy(line.get(column)) for column in ENERGY_COLUMNS], width, monomers, experiment, distance))
+    return rows
+
+def _where(filters):
+    '''
+    SQL condition and parameters of the filters of a query: a value selects that value (energies are rounded like the
+    catalog), a (low, high) pair an inclusive range and None a missing value.
+    '''
+    conditions, parameters = [], []
+    for column, value in filters.items():
+        if column not in KEY_COLUMNS:
+            raise KeyError(f"Cannot filter on '{column}'. Columns: {KEY_COLUMNS}")
+        if value is None:
+            conditions.append(f"{column} IS NULL")
+        elif isinstance(value, (tuple, list)):
+            low, high = value
+            slack = 0.5 * 10**-DECIMALS if column in ENERGIES else 0
+            conditions.append(f"{column} BETWEEN ? AND ?")
+            parameters += [low - slack, high + slack]
+        else:
+            conditions.append(f"{column} = ?")
+            parameters.append(_energy(value) if column in ENERGIES else value)
+    return " AND ".join(conditions) or "1", parameters
+
+class Catalog:
+    def __init__(self, path="sweep_catalog.sqlite"):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        key_columns = ", ".join(f"{column} {'REAL' if column in ENERGIES else 'INTEGER'}" for column in KEY_COLUMNS)
+        self.connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                signature TEXT NOT NULL,
+                kind TEXT,
+                rows INTEGER NOT NULL,
+                ingested REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS contributions (
+                file INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS contributions_key ON contributions (key);
+            CREATE INDEX IF NOT EXISTS contributions_file ON contributions (file);
+            CREATE TABLE IF NOT EXISTS points (
+                key TEXT PRIMARY KEY,
+                {key_columns},
+                replicas INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                neighbour_freq TEXT NOT NULL,
+                ring_sizes TEXT,
+                radius REAL,
+                std_radius REAL,
+                radius_of_gyration REAL,
+                std_radius_of_gyration REAL
+            );
+            CREATE TABLE IF NOT EXISTS distances (
+                file INTEGER NOT NULL,
+                {key_columns},
+                experiment TEXT NOT NULL,
+                distance REAL
+            );
+            CREATE INDEX IF NOT EXISTS distances_file ON distances (file);
+            CREATE INDEX IF NOT EXISTS distances_experiment ON distances (experiment);
+        """ + "".join(f"""
+            CREATE INDEX IF NOT EXISTS points_{column} ON points ({column});
+            CREATE INDEX IF NOT EXISTS distances_{column} ON distances ({column});""" for column in ENERGIES) + """
+            CREATE INDEX IF NOT EXISTS points_lattice ON points (width, monomers);
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(self, path, width=None, monomers=None, replicas=DEFAULT_REPLICAS, force=False):
+        """
+        Add (or update) one file.
+
+        Args:
+            path (str): Results or distance CSV; files of any other kind are recorded and skipped.
+            width (int): Lattice width of the sweep, if known.
+            monomers (int): Monomers per island, if known.
+            replicas (int): Replicas per row for results files without a "Replicas" column.
+            force (bool): Re-read the file even if it did not change.
+
+        Returns:
+            tuple: (kind, number of rows read), or None if the file was unchanged.
+        """
+        path = os.path.abspath(path)
+        signature = _signature(path, [width, monomers, replicas])
+        stored = self.connection.execute("SELECT id, signature FROM files WHERE path = ?", (path,)).fetchone()
+        if stored is not None and stored[1] == signature and not force:
+            return None
+
+        with open(path, newline="") as file:
+            kind = file_kind(next(csv.reader(file), None))
+        if kind == "results":
+            rows = read_results(path, width, monomers, replicas)
+        elif kind == "distances":
+            rows = read_distances(path, width, monomers)
+        else:
+            rows = []
+
+        with self.connection:
+            touched = set()
+            if stored is not None:
+                touched.update(key for key, in self.connection.execute("SELECT DISTINCT key FROM contributions WHERE file = ?", (stored[0],)))
+                self.connection.execute("DELETE FROM contributions WHERE file = ?", (stored[0],))
+                self.connection.execute("DELETE FROM distances WHERE file = ?", (stored[0],))
+                self.connection.execute("DELETE FROM files WHERE id = ?", (stored[0],))
+            file_id = self.connection.execute("INSERT INTO files (path, signature, kind, rows, ingested) VALUES (?, ?, ?, ?, ?)",
+                                              (path, signature, kind, len(rows), time.time())).lastrowid
+            if kind == "results":
+                contributions = []
+                for energies, row_width, row_monomers, row in rows:
+                    key = point_key(energies, row_width, row_monomers)
+                    data = json.dumps(row, sort_keys=True)
+                    contributions.append((file_id, key, hashlib.sha256((key + data).encode()).hexdigest(), data))
+                    touched.add(key)
+                self.connection.executemany("INSERT INTO contributions (file, key, digest, data) VALUES (?, ?, ?, ?)", contributions)
+            elif kind == "distances":
+                self.connection.executemany(f"INSERT INTO distances (file, {', '.join(KEY_COLUMNS)}, experiment, distance) VALUES ({', '.join('?' * (len(KEY_COLUMNS) + 3))})",
+                                            [(file_id, *energies, row_width, row_monomers, experiment, distance)
+                                             for energies, row_width, row_monomers, experiment, distance in rows])
+            self._refresh(touched)
+        return kind, len(rows)
+
+    def _refresh(self, keys):
+        # recompute the merged points from their distinct contributions
+        for key in keys:
+            rows = {}
+            for digest, data in self.connection.execute("SELECT digest, data FROM contributions WHERE key = ?", (key,)):
+                rows[digest] = json.loads(data, object_hook=lambda d: {int(k) if k.isdigit() else k: v for k, v in d.items()})
+            if not rows:
+                self.connection.execute("DELETE FROM points WHERE key = ?", (key,))
+                continue
+            merged = combine(list(rows.values()))
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO points (key, {', '.join(KEY_COLUMNS)}, replicas, rows, neighbour_freq, ring_sizes, radius, std_radius, "
+                f"radius_of_gyration, std_radius_of_gyration) VALUES ({', '.join('?' * (len(KEY_COLUMNS) + 9))})",
+                (key, *json.loads(key), merged["replicas"], len(rows), json.dumps(merged["neighbour_freq"]),
+                 json.dumps(merged["ring_sizes"]) if merged["ring_sizes"] is not None else None, merged["radius"], merged["std_radius"],
+                 merged["radius_of_gyration"], merged["std_radius_of_gyration"]))
+
+    def ingest_all(self, paths, **options):
+        '''
+        Ingest files, folders (every *.csv below them) and glob patterns. Returns {path: ingest result}.
+        '''
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(glob.glob(os.path.join(path, "**", "*.csv"), recursive=True))
+            else:
+                files += sorted(glob.glob(path)) or [path]
+        return {path: self.ingest(path, **options) for path in files}
+
+    def points(self, **filters):
+        """
+        The merged points matching the filters, e.g. points(coupling=0.575, diffusion=(0.3, 0.9), monomers=60).
+
+        Returns:
+            list of dict: One aggregate_replicas-style dict per point (energies missing from the files are None), plus
+                the width, monomers and number of distinct rows merged into it.
+        """
+        condition, parameters = _where(filters)
+        query = (f"SELECT {', '.join(KEY_COLUMNS)}, replicas, rows, neighbour_freq, ring_sizes, radius, std_radius, radius_of_gyration, "
+                 f"std_radius_of_gyration FROM points WHERE {condition} ORDER BY {', '.join(KEY_COLUMNS)}")
+        results = []
+        for diffusion, rotation, coupling, dehalogenation, width, monomers, replicas, rows, neighbour_freq, ring_sizes, *radii in \
+                self.connection.execute(query, parameters):
+            results.append({
+                "diffusion_energy": diffusion,
+                "rotation_energy": rotation,
+                "coupling_energy": coupling,
+                "dehalogen_energy": dehalogenation,
+                "width": width,
+                "total_monomers": monomers,
+                "averaged_neighbour_freq": {int(k): v for k, v in json.loads(neighbour_freq).items()},
+                "averaged_ring_sizes": {int(k): v for k, v in json.loads(ring_sizes).items()} if ring_sizes else {},
+                "avg_radius": radii[0],
+                "std_radius": radii[1],
+                "avg_radius_of_gyration": radii[2],
+                "std_radius_of_gyration": radii[3],
+                "num_replicas": replicas,
+                "rows": rows,
+            })
+        return results
+
+    def distances(self, experiment=None, **filters):
+        '''
+        Distinct (energies as {column: value}, experimental file, Wasserstein distance) matching the filters (see points).
+        '''
+        condition, parameters = _where(filters)
+        if experiment is not None:
+            condition += " AND experiment = ?"
+            parameters.append(os.path.basename(experiment))
+        query = (f"SELECT DISTINCT {', '.join(KEY_COLUMNS)}, experiment, distance FROM distances WHERE {condition} "
+                 f"ORDER BY {', '.join(KEY_COLUMNS)}, experiment")
+        return [(dict(zip(KEY_COLUMNS, row[:len(KEY_COLUMNS)])), row[-2], row[-1]) for row in self.connection.execute(query, parameters)]
+
+    def stats(self):
+        files = dict(self.connection.execute("SELECT COALESCE(kind, 'skipped'), COUNT(*) FROM files GROUP BY kind").fetchall())
+        points, replicas = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(replicas), 0) FROM points").fetchone()
+        rows = self.connection.execute("SELECT COUNT(*) FROM contributions").fetchone()[0]
+        distances = self.connection.execute(f"SELECT COUNT(*) FROM (SELECT DISTINCT {', '.join(KEY_COLUMNS)}, experiment, distance FROM distances)").fetchone()[0]
+        return {"files": files, "rows": rows, "points": points, "replicas": replicas, "distances": distances}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexed catalog of the results of all sweeps.")
+    parser.add_argument("--catalog", default="sweep_catalog.sqlite", help="path to the catalog file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add results and distance files (or folders of them)")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--width", type=int, default=None, help="lattice width of the sweeps")
+    ingest.add_argument("--monomers", type=int, default=None, help="monomers per island (read off the histograms by default)")
+    ingest.add_argument("--replicas", type=int, default=DEFAULT_REPLICAS, help="replicas per row of files without a Replicas column")
+    ingest.add_argument("--force", action="store_true", help="re-read files that did not change")
+    query = commands.add_parser("query", help="list the points (or distances) in a slice")
+    for column in KEY_COLUMNS:
+        query.add_argument(f"--{column}", type=float if column in ENERGIES else int, nargs="+", default=None, metavar="VALUE",
+                           help="a value, or low and high of a range")
+    query.add_argument("--experiment", default=None, help="list the Wasserstein distances to this experimental file instead")
+    commands.add_parser("stats", help="summary of the catalog")
+    args = parser.parse_args(argv)
+
+    with Catalog(args.catalog) as catalog:
+        if args.command == "ingest":
+            results = catalog.ingest_all(args.paths, width=args.width, monomers=args.monomers, replicas=args.replicas, force=args.force)
+            for path, result in results.items():
+                status = "unchanged" if result is None else f"{result[1]} rows" if result[0] else "skipped (not a results or distance file)"
+                print(f"{path}: {status}")
+        elif args.command == "query":
+            filters = {column: (values[0] if len(values) == 1 else tuple(values[:2])) for column in KEY_COLUMNS
+                       if (values := getattr(args, column)) is not None}
+            if args.experiment:
+                for energies, experiment, distance in catalog.distances(args.experiment, **filters):
+                    print("  ".join(f"{column} {value}" for column, value in energies.items() if value is not None), f" {distance}")
+            else:
+                for point in catalog.points(**filters):
+                    print(f"diffusion {point['diffusion_energy']}  rotation {point['rotation_energy']}  coupling {point['coupling_energy']}  "
+                          f"dehalogenation {point['dehalogen_energy']}  width {point['width']}  monomers {point['total_monomers']}  "
+                          f"replicas {point['num_replicas']}  {point['averaged_neighbour_freq']}  "
+                          f"radius of gyration {point['avg_radius_of_gyration']} +- {point['std_radius_of_gyration']}")
+        else:
+            stats = catalog.stats()
+            files = ", ".join(f"{count} {kind}" for kind, count in sorted(stats["files"].items()))
+            print(f"{sum(stats['files'].values())} files ({files})")
+            print(f"{stats['points']} points ({stats['replicas']} replicas) from {stats['rows']} rows, {stats['distances']} distances")
+
+if __name__ == "__main__":
+    main()
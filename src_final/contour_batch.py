@@ -0,0 +1,166 @@
+# src/contour_batch.py
+
+"""
+Batch rendering of the Wasserstein contour plots of data/contour.py for every experimental file at once.
+
+The distances file is read once and split by experimental file and slice energy with a single groupby. Each slice is
+interpolated onto a regular grid with the same piecewise cubic (Clough-Tocher) interpolation that griddata(...,
+method="cubic") uses, but the Delaunay triangulation is computed once per set of sample points and reused for every
+slice and experiment sampled at the same (x, y) points. Experiments are rendered in parallel worker processes on the
+Agg backend, one figure per experiment with one panel per slice. The filled contours are rasterized, so PDF/SVG files
+only hold one image per panel instead of thousands of paths.
+
+Example:
+    python contour_batch.py wasserstein-distance-experiment-vs-simulations.csv -o contour_plots --format pdf
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.interpolate import CloughTocher2DInterpolator
+from scipy.spatial import Delaunay
+from wasserstein import ENERGY_COLUMNS
+
+_TRIANGULATIONS = {} # per process: sample points -> Delaunay triangulation
+
+def triangulation(points):
+    key = points.tobytes()
+    tri = _TRIANGULATIONS.get(key)
+    if tri is None:
+        tri = _TRIANGULATIONS[key] = Delaunay(points)
+    return tri
+
+def interpolate_slice(x, y, z, resolution=100):
+    '''
+    Cubic interpolation of scattered (x, y, z) samples onto a resolution x resolution grid (NaN outside the convex hull).
+    '''
+    points = np.column_stack([x, y]).astype(float)
+    x_grid, y_grid = np.meshgrid(np.linspace(x.min(), x.max(), resolution), np.linspace(y.min(), y.max(), resolution))
+    interpolator = CloughTocher2DInterpolator(triangulation(points), z)
+    return x_grid, y_grid, interpolator(x_grid, y_grid)
+
+def load_slices(results_csv, x="Diffusion Energy", y="Coupling Energy", slice_column=None, value="Wasserstein Distance"):
+    """
+    Read a distances file and split it by experimental file and slice energy.
+
+    Returns:
+        tuple: (slice column, {experimental file: [(slice energy, x, y, z), ...]})
+    """
+    import pandas as pd
+
+    data = pd.read_csv(results_csv)
+    if slice_column is None:
+        # the first other energy that varies: rotation in older files, dehalogenation in main()-style sweeps
+        others = [column for column in ENERGY_COLUMNS if column in data.columns and column not in (x, y)]
+        if not others:
+            raise ValueError(f"{results_csv} has no energy column besides {x} and {y} to slice by")
+        slice_column = next((column for column in others if data[column].nunique() > 1), others[0])
+    # sorting makes samples taken at the same points identical arrays, so their triangulation is shared
+    data = data.sort_values(["Experimental File", slice_column, x, y])
+    slices = {}
+    for (name, energy), group in data.groupby(["Experimental File", slice_column], sort=True):
+        # the interpolation silently drops repeated points, so a slice mixing several values of another energy would be wrong
+        if group.duplicated([x, y]).any():
+            raise ValueError(f"{name}, {slice_column} = {energy}: several rows share the same ({x}, {y}); "
+                             f"slice by another column or filter the file first")
+        slices.setdefault(name, []).append((energy, group[x].to_numpy(), group[y].to_numpy(), group[value].to_numpy()))
+    return slice_column, slices
+
+def render_experiment(name, slices, output_dir, labels, slice_label, levels, fmt="pdf", resolution=100, style=None, dpi=200):
+    '''
+    Render the contour panels of one experimental file into <output_dir>/<name>_contours.<fmt>. Runs in a worker process.
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if style:
+        plt.style.use(style)
+    columns = min(3, len(slices))
+    rows = -(-len(slices) // columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(3.2 * columns + 1, 3 * rows), sharex=True, sharey=True, squeeze=False)
+    minima = []
+    for ax, (energy, x, y, z) in zip(axes.flat, slices):
+        x_grid, y_grid, z_grid = interpolate_slice(x, y, z, resolution)
+        contour = ax.contourf(x_grid, y_grid, z_grid, cmap="Oranges", levels=levels)
+        contour.set_rasterized(True)
+        ax.set_title(f"{slice_label} = {energy} eV", fontsize="small")
+        if np.isfinite(z_grid).any():
+            i = np.nanargmin(z_grid)
+            minima.append((energy, x_grid.flat[i], y_grid.flat[i], z_grid.flat[i]))
+    for ax in axes.flat[len(slices):]:
+        ax.set_visible(False)
+    for ax in axes[-1]:
+        ax.set_xlabel(labels[0])
+    for ax in axes[:, 0]:
+        ax.set_ylabel(labels[1])
+    fig.colorbar(contour, ax=axes, label="Wasserstein Distance")
+    fig.suptitle(name)
+
+    path = os.path.join(output_dir, f"{os.path.splitext(name)[0]}_contours.{fmt}")
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path, minima
+
+def render_all(results_csv, output_dir, x="Diffusion Energy", y="Coupling Energy", slice_column=None, fmt="pdf", levels=None,
+               resolution=100, workers=None, style=None, dpi=200):
+    """
+    Render the contour plots of every experimental file in a distances file.
+
+    Args:
+        results_csv (str): Distances file, as written by wasserstein.py.
+        output_dir (str): Folder for the figures.
+        x, y (str): Energy columns on the axes of each panel.
+        slice_column (str): Energy column with one panel per value (defaults to the first other energy column with more than one
+            value).
+        fmt (str): pdf, svg or png.
+        levels: Contour levels (defaults to 21 levels between 0 and 0.4, as in contour.py).
+        resolution (int): Interpolation grid points per axis.
+        workers (int): Number of worker processes (defaults to the number of CPUs).
+        style (str): Optional matplotlib style sheet.
+        dpi (int): Resolution of the rasterized contours.
+
+    Returns:
+        dict: {experimental file: (figure path, [(slice energy, x, y, distance) at the interpolated minimum of each panel])}
+    """
+    levels = np.linspace(0.0, 0.4, 21) if levels is None else levels
+    slice_column, slices = load_slices(results_csv, x, y, slice_column)
+    os.makedirs(output_dir, exist_ok=True)
+    labels = (f"{x} [eV]", f"{y} [eV]")
+    slice_label = slice_column.replace(" Energy", "")
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(render_experiment, name, experiment, output_dir, labels, slice_label, levels, fmt, resolution, style, dpi)
+                   for name, experiment in slices.items()}
+        for name, future in futures.items():
+            results[name] = future.result()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Wasserstein contour plots for every experimental file.")
+    parser.add_argument("results_csv", help="distances file written by wasserstein.py")
+    parser.add_argument("-o", "--output-dir", default="contour_plots")
+    parser.add_argument("--x", default="Diffusion Energy")
+    parser.add_argument("--y", default="Coupling Energy")
+    parser.add_argument("--slice", default=None, help="energy column with one panel per value")
+    parser.add_argument("--format", default="pdf", choices=["pdf", "svg", "png"])
+    parser.add_argument("--max-level", type=float, default=0.4, help="upper end of the contour levels")
+    parser.add_argument("--resolution", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--style", default=None, help="matplotlib style sheet, e.g. lex_plot.mplstyle")
+    parser.add_argument("--dpi", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    results = render_all(args.results_csv, args.output_dir, args.x, args.y, args.slice, args.format, np.linspace(0.0, args.max_level, 21),
+                         args.resolution, args.workers, args.style, args.dpi)
+    for name, (path, minima) in results.items():
+        best = min(minima, key=lambda minimum: minimum[3]) if minima else None
+        if best is not None:
+            print(f"{name}: minimum {best[3]:.4f} at {args.x} {best[1]:.3f}, {args.y} {best[2]:.3f}, slice {best[0]} -> {path}")
+    print(f"Rendered {len(results)} experimental files in {time.time() - start:.1f} s.")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import math, random
+import numpy as np
 k_B = 8.617333262145e-5  # Boltzmann constant in eV/K
 
 class Defect:
@@ -41,3 +42,88 @@ class Defect:
             self.diffuse(lattice)
            
         else: pass
+
+
+class DefectField:
+    '''
+    All defects of a lattice as arrays, for defect densities where one Python object per defect is too slow.
+
+    Defects live in their own layer underneath the monomers (they do not block monomer sites, and several defects may
+    share a site). Every step, each free defect hops to a random neighbour with its diffusion probability, all in one
+    vectorized update. The occupancy layer `near` counts, for every site, the defects on that site and its neighbours,
+    so whether a monomer is next to a defect is a single array lookup. A monomer next to a defect starts nucleating
+    with nucleation_prob per step: it stops diffusing and stays on the lattice as a seed for other monomers, and the
+    defect that caught it is used up (it stays where it is and no longer nucleates).
+    '''
+    def __init__(self, lattice, num_defects, diffusion_rate, diffusion_energy, nucleation_prob, rng=None):
+        """
+        Args:
+            lattice (Lattice): Lattice the defects are placed on, at random sites.
+            num_defects (int): Number of defects.
+            diffusion_rate, diffusion_energy, nucleation_prob (float): Same as the Defect parameters.
+            rng (np.random.Generator): Random generator of the defects; by default it is seeded from the random module,
+                so random.seed() makes a run with defects reproducible.
+        """
+        geometry = lattice.geometry
+        self.width = lattice.width
+        self.num_sites = geometry.num_sites
+        self.diffusion_prob = min(1.0, diffusion_rate * math.exp(-diffusion_energy / (k_B * lattice.temperature)))
+        self.nucleation_prob = nucleation_prob
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+        # neighbours[s] are the neighbour sites of s (num_sites for neighbours off a non-periodic lattice, which is a
+        # spare entry of near); hood[s] is s followed by its neighbours
+        neighbours = np.asarray(geometry.neighbours)
+        self.neighbours = np.where(neighbours >= 0, neighbours, self.num_sites)
+        self.hood = np.column_stack([np.arange(self.num_sites), self.neighbours])
+
+        self.positions = self.rng.choice(self.num_sites, size=num_defects, replace=num_defects > self.num_sites)
+        self.free = np.ones(num_defects, dtype=bool) # False once a defect has nucleated a monomer; only free defects are in near
+        self.mobile = np.arange(num_defects) if self.diffusion_prob > 0 else np.arange(0)
+        self.near = np.zeros(self.num_sites + 1, dtype=np.int64) # int64 keeps np.add.at on its fast path
+        np.add.at(self.near, self.hood[self.positions].ravel(), 1)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def step(self):
+        '''
+        One diffusion step of all free defects.
+        '''
+        if not len(self.mobile):
+            return
+        moving = self.mobile[self.rng.random(len(self.mobile)) < self.diffusion_prob]
+        if not len(moving):
+            return
+        old = self.positions[moving]
+        new = self.neighbours[old, self.rng.integers(0, 6, size=len(moving))]
+        new = np.where(new == self.num_sites, old, new) # hops off a non-periodic lattice are rejected
+        np.add.at(self.near, self.hood[old].ravel(), -1)
+        np.add.at(self.near, self.hood[new].ravel(), 1)
+        self.positions[moving] = new
+
+    def near_defect(self, x, y):
+        return self.near[y * self.width + x] > 0
+
+    def try_nucleate(self, monomer):
+        '''
+        Let a monomer that is next to a defect start nucleating, with nucleation_prob. Returns True if it does.
+        '''
+        x, y = monomer.position
+        site = y * self.width + x
+        if not self.near[site] or random.random() >= self.nucleation_prob:
+            return False
+        # use up one of the free defects on the site or its neighbours
+        defect = self.rng.choice(np.flatnonzero(np.isin(self.positions, self.hood[site]) & self.free))
+        self.free[defect] = False
+        np.add.at(self.near, self.hood[self.positions[defect]], -1)
+        if self.diffusion_prob > 0:
+            self.mobile = np.flatnonzero(self.free)
+        monomer.nucleating = True
+        return True
+
+    def site_counts(self):
+        '''
+        Number of defects on every site, as a (height, width) array.
+        '''
+        return np.bincount(self.positions, minlength=self.num_sites).reshape(-1, self.width)
@@ -0,0 +1,238 @@
+# src/energy_search.py
+
+"""
+Adaptive search for the energies that best reproduce an experimental STM degree histogram.
+
+Instead of simulating a full grid of energies and looking for the Wasserstein minimum afterwards, a Gaussian-process
+surrogate of the distance is fitted to the points simulated so far and the next batch of points is proposed where the
+expected improvement is largest. Batches are simulated in parallel and the search stops once the best distance has not
+improved by more than tol for `patience` batches.
+
+Example:
+    python energy_search.py STM02_graph_metrics.csv --diffusion 0 1.5 --coupling 0 1.5 --dehalogenation 0 2.3 --rotation 0 0 --workers 8
+
+Setting both bounds of an energy to the same value keeps it fixed.
+"""
+
+import argparse
+import csv
+import time
+import numpy as np
+from scipy.stats import norm
+from main import run_replica, replica_seed, aggregate_replicas
+from result_cache import ResultCache
+from wasserstein import histogram_distance
+from experiments import load_experimental_histogram
+from worker_pool import warm_pool
+
+ENERGIES = ["diffusion", "coupling", "dehalogenation", "rotation"]
+DEFECT_PARAMS = [1.0, 0.00, 1.0] # diffusion_rate, diffusion_energy, nucleation_prob
+
+def make_monomer_params(diffusion, coupling, dehalogenation, rotation, prefactor=1e13):
+    # monomer_type, diffusion_rate, diffusion_energy, rotation_rate, rotation_energy, coupling_rate, coupling_energy, dehalogen_rate, dehalogen_energy
+    return ['A', prefactor, diffusion, prefactor, rotation, prefactor, coupling, prefactor, dehalogenation]
+
+def evaluate_point(energies, experimental, width, total_monomers, replicas, base_seed, max_steps, cache_path):
+    '''
+    Simulate one energy point and return its distance to the experimental histogram. Runs in a worker process.
+    '''
+    monomer_params = make_monomer_params(**energies)
+    cache = ResultCache(cache_path) if cache_path else None
+    runs = [run_replica(width, monomer_params, DEFECT_PARAMS, 0.0, total_monomers, replica_seed(base_seed, monomer_params, DEFECT_PARAMS, i),
+                        max_steps=max_steps, cache=cache) for i in range(replicas)]
+    if cache is not None:
+        cache.close()
+    result = aggregate_replicas(monomer_params, runs)
+    return histogram_distance(result["averaged_neighbour_freq"], experimental), result
+
+class GaussianProcess:
+    '''
+    Minimal Gaussian-process regressor with a squared-exponential kernel on the unit cube. The length scale and noise
+    level are picked from small grids by maximizing the marginal likelihood.
+    '''
+    def __init__(self, length_scales=(0.05, 0.1, 0.2, 0.4, 0.8), noise_levels=(1e-4, 1e-3, 1e-2, 1e-1)):
+        self.length_scales = length_scales
+        self.noise_levels = noise_levels
+
+    @staticmethod
+    def kernel(a, b, length_scale):
+        squared = np.sum(a**2, axis=1)[:, None] + np.sum(b**2, axis=1)[None, :] - 2 * a @ b.T
+        return np.exp(-0.5 * np.maximum(squared, 0) / length_scale**2)
+
+    def _factorize(self, length_scale, noise):
+        K = self.kernel(self.X, self.X, length_scale) + noise * np.eye(len(self.X))
+        L = np.linalg.cholesky(K)
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, self.z))
+        return L, alpha
+
+    def fit(self, X, y, optimize=True):
+        self.X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        self.z = (y - self.y_mean) / self.y_std
+
+        if optimize:
+            best = -np.inf
+            for length_scale in self.length_scales:
+                for noise in self.noise_levels:
+                    try:
+                        L, alpha = self._factorize(length_scale, noise)
+                    except np.linalg.LinAlgError:
+                        continue
+                    log_likelihood = -0.5 * self.z @ alpha - np.sum(np.log(np.diag(L)))
+                    if log_likelihood > best:
+                        best = log_likelihood
+                        self.length_scale, self.noise = length_scale, noise
+        self.L, self.alpha = self._factorize(self.length_scale, self.noise)
+        return self
+
+    def predict(self, X):
+        k = self.kernel(np.asarray(X, dtype=float), self.X, self.length_scale)
+        mean = k @ self.alpha
+        v = np.linalg.solve(self.L, k.T)
+        variance = np.maximum(1.0 - np.sum(v**2, axis=0), 1e-12)
+        return mean * self.y_std + self.y_mean, np.sqrt(variance) * self.y_std
+
+def expected_improvement(mean, std, best, xi=0.0):
+    improvement = best - mean - xi
+    z = improvement / std
+    return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+def propose_batch(gp, X, y, batch_size, dimensions, rng, num_candidates=4096):
+    """
+    Propose a batch of points in the unit cube by greedily maximizing the expected improvement, assuming the surrogate
+    mean as the outcome of each point already picked ("kriging believer").
+    """
+    X, y = list(X), list(y)
+    best_index = int(np.argmin(y))
+    batch = []
+    for _ in range(batch_size):
+        candidates = rng.random((num_candidates, dimensions))
+        local = np.clip(np.asarray(X[best_index]) + 0.05 * rng.standard_normal((num_candidates // 4, dimensions)), 0, 1) # refine around the best point
+        candidates = np.vstack([candidates, local])
+        mean, std = gp.predict(candidates)
+        choice = candidates[np.argmax(expected_improvement(mean, std, min(y)))]
+        batch.append(choice)
+        X.append(choice)
+        y.append(gp.predict(choice[None, :])[0][0])
+        gp.fit(X, y, optimize=False)
+    return batch
+
+def search_energies(experimental_file, bounds, width=60, total_monomers=50, replicas=3, batch_size=8, initial_points=16, max_evaluations=200,
+                    tol=1e-3, patience=3, workers=None, base_seed=0, max_steps=1e6, cache_path=None, log_file=None, seed=0):
+    """
+    Search the energies that minimize the Wasserstein distance to an experimental degree histogram.
+
+    Args:
+        experimental_file (str): Graph-metrics CSV of the experimental island.
+        bounds (dict): {energy: (low, high)} for each of ENERGIES, in eV. Equal bounds keep an energy fixed.
+        width (int): Lattice width.
+        total_monomers (int): Number of monomers per island.
+        replicas (int): Replicas averaged per energy point.
+        batch_size (int): Points simulated in parallel per iteration.
+        initial_points (int): Size of the initial Latin-hypercube design.
+        max_evaluations (int): Upper limit on the number of energy points simulated.
+        tol (float): Minimum improvement of the best distance for a batch to count as progress.
+        patience (int): Number of batches without progress before the search stops.
+        workers (int): Number of worker processes (defaults to the number of CPUs).
+        base_seed (int): Base seed of the replicas.
+        max_steps (float): Step limit per monomer.
+        cache_path (str): Optional result cache shared by the workers.
+        log_file (str): Optional CSV file that every evaluated point is appended to.
+        seed (int): Seed for the proposals.
+
+    Returns:
+        tuple: (best energies as a dict, best distance, list of all (energies, distance) evaluations)
+    """
+    experimental = load_experimental_histogram(experimental_file)
+    free = [name for name in ENERGIES if bounds[name][0] != bounds[name][1]]
+    low = np.array([bounds[name][0] for name in free], dtype=float)
+    high = np.array([bounds[name][1] for name in free], dtype=float)
+    rng = np.random.default_rng(seed)
+
+    def to_energies(u):
+        energies = {name: float(bounds[name][0]) for name in ENERGIES}
+        energies.update({name: float(value) for name, value in zip(free, low + np.asarray(u) * (high - low))})
+        return energies
+
+    # Latin-hypercube initial design
+    initial_points = min(initial_points, max_evaluations)
+    design = (np.argsort(rng.random((len(free), initial_points)), axis=1).T + rng.random((initial_points, len(free)))) / initial_points
+
+    X, y, evaluations = [], [], []
+    best_history = []
+    gp = GaussianProcess()
+    writer = None
+    if log_file:
+        log = open(log_file, "w", newline="")
+        writer = csv.writer(log)
+        writer.writerow(["Diffusion Energy", "Rotation Energy", "Coupling Energy", "Dehalogenation Energy", "Averaged Neighbour Frequency",
+                         "Average Radius of Gyration", "Wasserstein Distance"])
+
+    with warm_pool(workers, preload=["energy_search"]) as pool:
+        batch = list(design)
+        while batch:
+            start = time.time()
+            points = [to_energies(u) for u in batch]
+            futures = [pool.submit(evaluate_point, energies, experimental, width, total_monomers, replicas, base_seed, max_steps, cache_path) for energies in points]
+            for u, energies, future in zip(batch, points, futures):
+                distance, result = future.result()
+                if not np.isfinite(distance):
+                    distance = 2.0 * max([d for d in y if np.isfinite(d)] + [1.0]) # islands without bonds are maximally far off
+                X.append(u)
+                y.append(distance)
+                evaluations.append((energies, distance))
+                if writer is not None:
+                    writer.writerow([energies["diffusion"], energies["rotation"], energies["coupling"], energies["dehalogenation"],
+                                     result["averaged_neighbour_freq"], result["avg_radius_of_gyration"], distance])
+            if writer is not None:
+                log.flush()
+
+            best_history.append(min(y))
+            print(f"{len(y)} points simulated, best distance {best_history[-1]:.4f} ({time.time() - start:.1f} s for this batch)")
+
+            if len(y) >= max_evaluations or not free:
+                break
+            if len(best_history) > patience and best_history[-patience - 1] - best_history[-1] < tol:
+                print(f"Best distance improved by less than {tol} over the last {patience} batches, stopping.")
+                break
+
+            gp.fit(X, y)
+            batch = propose_batch(gp, X, y, min(batch_size, max_evaluations - len(y)), len(free), rng)
+
+    if writer is not None:
+        log.close()
+    best = int(np.argmin(y))
+    return evaluations[best][0], y[best], evaluations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surrogate-driven search for the energies that best fit an experimental degree histogram.")
+    parser.add_argument("experimental_file", help="graph-metrics CSV of the experimental island")
+    parser.add_argument("--diffusion", nargs=2, type=float, default=[0.0, 1.5], metavar=("LOW", "HIGH"))
+    parser.add_argument("--coupling", nargs=2, type=float, default=[0.0, 1.5], metavar=("LOW", "HIGH"))
+    parser.add_argument("--dehalogenation", nargs=2, type=float, default=[0.0, 2.3], metavar=("LOW", "HIGH"))
+    parser.add_argument("--rotation", nargs=2, type=float, default=[0.0, 0.0], metavar=("LOW", "HIGH"))
+    parser.add_argument("--width", type=int, default=60)
+    parser.add_argument("--monomers", type=int, default=50)
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--initial-points", type=int, default=16)
+    parser.add_argument("--max-evaluations", type=int, default=200)
+    parser.add_argument("--tol", type=float, default=1e-3)
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="result cache shared by the workers")
+    parser.add_argument("--log", default="energy_search.csv", help="CSV file listing every simulated point")
+    args = parser.parse_args(argv)
+
+    bounds = {name: tuple(getattr(args, name)) for name in ENERGIES}
+    best, distance, evaluations = search_energies(args.experimental_file, bounds, width=args.width, total_monomers=args.monomers, replicas=args.replicas,
+                                                  batch_size=args.batch_size, initial_points=args.initial_points, max_evaluations=args.max_evaluations,
+                                                  tol=args.tol, patience=args.patience, workers=args.workers, cache_path=args.cache, log_file=args.log)
+    print(f"Best fit after {len(evaluations)} simulated points (Wasserstein distance {distance:.4f}):")
+    for name in ENERGIES:
+        print(f"    {name}: {best[name]:.3f} eV")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# src/equivalence.py
+
+"""
+Statistical equivalence tests of a candidate simulation engine against the reference engine.
+
+A faster engine (event-driven, batched, compiled, ...) samples differently from the reference loop in
+slow_growth_simulation / Monomer.action, so it cannot reproduce the same islands seed for seed. What it has to reproduce
+is the distribution of the results. For every energy point of a fixed panel, both engines grow many islands with
+independent seeds, and the per-island observables (fraction of monomers with each number of coupled neighbours, mean
+degree, radius, radius of gyration) are compared with two-sample tests:
+
+    ks           Kolmogorov-Smirnov test (scipy.stats.ks_2samp)
+    energy       energy distance, with a p-value from bootstrap resampling of the pooled samples
+    wasserstein  1-D Wasserstein distance, with a p-value from bootstrap resampling of the pooled samples
+
+A point passes if no test rejects at the Bonferroni-corrected level alpha / (number of tests at that point).
+
+An engine is a function engine(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps)
+returning a run_replica-style dict. Engines are registered with @register_engine, or given as "module:function".
+
+Example:
+    python equivalence.py my_engine_module:grow --seeds 64 --workers 8
+    python equivalence.py reference --seeds 32     # reference against itself (independent seeds), should pass
+"""
+
+import argparse
+import importlib
+import json
+import time
+import numpy as np
+from scipy import stats
+from worker_pool import warm_pool
+
+DEFECT_PARAMS = [1.0, 0.00, 1.0]
+DEGREES = (0, 1, 2, 3)
+# (diffusion, rotation, coupling, dehalogenation) energies in eV
+PANEL = [
+    (0.3, 0.0, 0.3, 0.3),
+    (0.9, 0.0, 0.9, 1.2),
+    (1.5, 0.0, 1.5, 1.5),
+    (1.5, 0.0, 1.7, 1.7),
+    (0.5, 1.5, 1.6, 0.9),
+]
+
+ENGINES = {}
+
+def register_engine(name):
+    def register(function):
+        ENGINES[name] = function
+        return function
+    return register
+
+@register_engine("reference")
+def reference_engine(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=1e6):
+    from main import run_replica
+    return run_replica(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=max_steps)
+
+@register_engine("walker")
+def walker_engine(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=1e6):
+    from walker import run_replica # array kernel, compiled with numba if it is installed
+    return run_replica(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=max_steps)
+
+def load_engine(name):
+    '''
+    A registered engine, or "module:function".
+    '''
+    if name in ENGINES:
+        return ENGINES[name]
+    if ":" in name:
+        module, function = name.split(":", 1)
+        module = importlib.import_module(module)
+        return ENGINES.get(name) or getattr(module, function)
+    raise KeyError(f"Unknown engine '{name}'. Registered engines: {sorted(ENGINES)}")
+
+def monomer_params(point):
+    diffusion, rotation, coupling, dehalogenation = point
+    return ['A', 1e13, diffusion, 1e13, rotation, 1e13, coupling, 1e13, dehalogenation]
+
+def observables(replica, total_monomers):
+    '''
+    Per-island observables compared between the engines.
+    '''
+    freq = {int(degree): count for degree, count in replica["neighbour_freq"].items()}
+    monomers = max(sum(freq.values()), 1)
+    values = {f"degree_{degree}_fraction": freq.get(degree, 0) / monomers for degree in DEGREES}
+    values["mean_degree"] = sum(degree * count for degree, count in freq.items()) / monomers
+    values["radius"] = replica["radius"]
+    values["radius_of_gyration"] = replica["radius_of_gyration"]
+    return values
+
+def run_island(engine, point, width, total_monomers, seed, max_steps):
+    '''
+    Grow one island with the named engine. Runs in a worker process.
+    '''
+    from instrumentation import configure_logging
+    configure_logging("WARNING")
+    replica = load_engine(engine)(width, monomer_params(point), DEFECT_PARAMS, 0.0, total_monomers, seed, max_steps)
+    return observables(replica, total_monomers)
+
+def bootstrap_pvalue(statistic, a, b, rng, resamples=1000):
+    """
+    P-value of statistic(a, b) under the null hypothesis that a and b come from the same distribution, estimated by
+    drawing both samples with replacement from the pooled sample.
+    """
+    observed = statistic(a, b)
+    pooled = np.concatenate([a, b])
+    null = np.empty(resamples)
+    for i in range(resamples):
+        draw = rng.choice(pooled, size=len(pooled), replace=True)
+        null[i] = statistic(draw[:len(a)], draw[len(a):])
+    return observed, (1 + np.sum(null >= observed - 1e-12)) / (resamples + 1)
+
+def compare_samples(reference, candidate, rng, resamples=1000):
+    """
+    Two-sample tests of every observable.
+
+    Args:
+        reference, candidate (list of dict): Observables of the islands of each engine.
+
+    Returns:
+        dict: {observable: {test: (statistic, p-value)}}
+    """
+    results = {}
+    for name in reference[0]:
+        a = np.array([values[name] for values in reference], dtype=float)
+        b = np.array([values[name] for values in candidate], dtype=float)
+        if np.ptp(np.concatenate([a, b])) == 0:
+            results[name] = {"ks": (0.0, 1.0), "energy": (0.0, 1.0), "wasserstein": (0.0, 1.0)} # constant, e.g. a degree that never occurs
+            continue
+        ks = stats.ks_2samp(a, b)
+        results[name] = {
+            "ks": (float(ks.statistic), float(ks.pvalue)),
+            "energy": tuple(map(float, bootstrap_pvalue(stats.energy_distance, a, b, rng, resamples))),
+            "wasserstein": tuple(map(float, bootstrap_pvalue(stats.wasserstein_distance, a, b, rng, resamples))),
+        }
+    return results
+
+def validate(candidate, reference="reference", panel=PANEL, seeds=32, width=40, total_monomers=30, max_steps=1e5, alpha=0.01,
+             resamples=1000, workers=None, base_seed=0):
+    """
+    Run both engines over the panel and test every point.
+
+    Args:
+        candidate (str): Engine under test.
+        reference (str): Engine it is compared with.
+        panel (list): Energy points as (diffusion, rotation, coupling, dehalogenation) tuples.
+        seeds (int): Islands per engine and point.
+        width (int): Lattice width.
+        total_monomers (int): Monomers per island.
+        max_steps (float): Step limit per monomer.
+        alpha (float): Family-wise significance level per point.
+        resamples (int): Bootstrap resamples of the energy and Wasserstein tests.
+        workers (int): Number of worker processes (defaults to the number of CPUs).
+        base_seed (int): The candidate and reference use disjoint seeds derived from it.
+
+    Returns:
+        list of dict: Per point: energies, pass/fail, smallest p-value, corrected level and all test results.
+    """
+    jobs = {}
+    with warm_pool(workers, preload=["equivalence"]) as pool:
+        for p, point in enumerate(panel):
+            for e, engine in enumerate((reference, candidate)):
+                for s in range(seeds):
+                    seed = base_seed + (p * 2 + e) * seeds + s # disjoint seeds, so reference vs reference is a real test
+                    jobs[(p, e, s)] = pool.submit(run_island, engine, point, width, total_monomers, seed, max_steps)
+        samples = {key: future.result() for key, future in jobs.items()}
+
+    rng = np.random.default_rng(base_seed)
+    report = []
+    for p, point in enumerate(panel):
+        reference_samples = [samples[(p, 0, s)] for s in range(seeds)]
+        candidate_samples = [samples[(p, 1, s)] for s in range(seeds)]
+        tests = compare_samples(reference_samples, candidate_samples, rng, resamples)
+        pvalues = [pvalue for observable in tests.values() for _, pvalue in observable.values()]
+        level = alpha / len(pvalues)
+        report.append({
+            "energies": dict(zip(("diffusion", "rotation", "coupling", "dehalogenation"), point)),
+            "passed": bool(min(pvalues) >= level),
+            "min_pvalue": float(min(pvalues)),
+            "level": level,
+            "reference_means": {name: float(np.mean([values[name] for values in reference_samples])) for name in tests},
+            "candidate_means": {name: float(np.mean([values[name] for values in candidate_samples])) for name in tests},
+            "tests": tests,
+        })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test a candidate engine for statistical equivalence with the reference engine.")
+    parser.add_argument("candidate", help="registered engine name or module:function")
+    parser.add_argument("--reference", default="reference")
+    parser.add_argument("--seeds", type=int, default=32, help="islands per engine and energy point")
+    parser.add_argument("--width", type=int, default=40)
+    parser.add_argument("--monomers", type=int, default=30)
+    parser.add_argument("--max-steps", type=float, default=1e5)
+    parser.add_argument("--alpha", type=float, default=0.01)
+    parser.add_argument("--resamples", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="equivalence_report.json")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    report = validate(args.candidate, args.reference, seeds=args.seeds, width=args.width, total_monomers=args.monomers, max_steps=args.max_steps,
+                      alpha=args.alpha, resamples=args.resamples, workers=args.workers, base_seed=args.seed)
+    with open(args.output, "w") as file:
+        json.dump({"candidate": args.candidate, "reference": args.reference, "seeds": args.seeds, "points": report}, file, indent=1)
+
+    for result in report:
+        energies = ", ".join(f"{name} {value}" for name, value in result["energies"].items())
+        status = "PASS" if result["passed"] else "FAIL"
+        print(f"{status}  {energies}  (smallest p-value {result['min_pvalue']:.4f}, level {result['level']:.5f})")
+        if not result["passed"]:
+            for name, tests in result["tests"].items():
+                failed = [test for test, (_, pvalue) in tests.items() if pvalue < result["level"]]
+                if failed:
+                    print(f"      {name}: reference mean {result['reference_means'][name]:.4f}, candidate mean "
+                          f"{result['candidate_means'][name]:.4f} ({', '.join(failed)})")
+    passed = sum(result["passed"] for result in report)
+    print(f"{passed}/{len(report)} points passed in {time.time() - start:.1f} s. Report saved to {args.output}")
+    return 0 if passed == len(report) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+# src/experiments.py
+
+"""
+Experimental STM datasets, parsed once.
+
+Every graph-metrics CSV written by STM-Island-Analysis.ipynb holds a few scalar metrics followed by a degree histogram:
+
+    Metric,Value
+    Mean Distance Between Nearest Neighbors,...
+    Radius of Gyration,...
+    Number of Nodes,...
+
+    Degree,Frequency
+    1,...
+
+load_experiments parses a set of these files into an ExperimentalDataset (metric arrays plus an (E, D) histogram array)
+and keeps the parsed files in a binary cache next to them, which is invalidated per file when its modification time or
+size changes. The scorers below then compare all simulations with all experiments in vectorized form.
+"""
+
+import csv
+import glob
+import os
+import pickle
+import numpy as np
+from wasserstein import histogram_degrees, histogram_matrix, wasserstein_matrix
+
+CACHE_NAME = ".graph_metrics_cache.pkl"
+CACHE_VERSION = 1
+METRICS = {
+    "Mean Distance Between Nearest Neighbors": "mean_distance",
+    "Radius of Gyration": "radius_of_gyration",
+    "Number of Nodes": "num_nodes",
+}
+
+def parse_graph_metrics(file_path):
+    """
+    Parse a single graph-metrics CSV.
+
+    Returns:
+        tuple: (metrics as {metric name: value}, degree histogram as {degree: frequency})
+    """
+    metrics, histogram = {}, {}
+    with open(file_path, newline="") as file:
+        in_histogram = False
+        for row in csv.reader(file):
+            if not row:
+                continue
+            if row == ["Degree", "Frequency"]:
+                in_histogram = True
+            elif in_histogram:
+                histogram[int(row[0])] = float(row[1])
+            elif row != ["Metric", "Value"]:
+                metrics[row[0]] = float(row[1])
+    return metrics, histogram
+
+def load_experimental_histogram(file_path):
+    '''
+    Degree histogram ({degree: frequency}) of a single graph-metrics CSV.
+    '''
+    return parse_graph_metrics(file_path)[1]
+
+class ExperimentalDataset:
+    def __init__(self, paths, metrics, histograms):
+        self.paths = list(paths)
+        self.names = [os.path.basename(path) for path in self.paths]
+        self.histograms = list(histograms) # {degree: frequency} per file
+        self.degrees = list(range(0, max((max(h) for h in self.histograms if h), default=0) + 1))
+        self.counts = histogram_matrix(self.histograms, self.degrees) # (E, D) with columns for degrees 0..max
+        self.present = histogram_matrix([{d: 1 for d in h} for h in self.histograms], self.degrees).astype(bool)
+        for metric, attribute in METRICS.items():
+            setattr(self, attribute, np.array([m.get(metric, np.nan) for m in metrics]))
+        self.metrics = list(metrics)
+
+    def __len__(self):
+        return len(self.paths)
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_experiments(paths, cache_path=None):
+    """
+    Load a set of graph-metrics CSVs, re-parsing only files that changed since they were last cached.
+
+    Args:
+        paths (str or list): A folder (all *.csv files in it), a glob pattern, or a list of file paths.
+        cache_path (str): Location of the binary cache. Defaults to a hidden file in the folder of the (first) file.
+
+    Returns:
+        ExperimentalDataset: The parsed dataset, in sorted file order.
+    """
+    if isinstance(paths, str):
+        paths = glob.glob(os.path.join(paths, "*.csv")) if os.path.isdir(paths) else glob.glob(paths)
+    paths = sorted(os.path.abspath(path) for path in paths)
+    if cache_path is None and paths:
+        cache_path = os.path.join(os.path.dirname(paths[0]), CACHE_NAME)
+
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as file:
+                stored = pickle.load(file)
+            if stored.get("version") == CACHE_VERSION:
+                cache = stored["files"]
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            cache = {}
+
+    changed = False
+    metrics, histograms = [], []
+    for path in paths:
+        signature = _file_signature(path)
+        entry = cache.get(path)
+        if entry is None or entry[0] != signature:
+            entry = (signature, *parse_graph_metrics(path))
+            cache[path] = entry
+            changed = True
+        metrics.append(entry[1])
+        histograms.append(entry[2])
+
+    if changed and cache_path:
+        try:
+            with open(cache_path, "wb") as file:
+                pickle.dump({"version": CACHE_VERSION, "files": cache}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass # read-only folder; parsing again next time is fine
+    return ExperimentalDataset(paths, metrics, histograms)
+
+def frequency_mse(sim_histograms, dataset):
+    """
+    Mean squared difference between histograms, averaged over the degrees present in either histogram of a pair (the
+    score of calculate_frequency_similarity in data/cluster-analysis.py).
+
+    Args:
+        sim_histograms (list of dict): Simulated {degree: frequency} histograms.
+        dataset (ExperimentalDataset): Experimental data.
+
+    Returns:
+        ndarray: (S, E) scores.
+    """
+    degrees = list(range(0, max([len(dataset.degrees) - 1] + [max(h) for h in sim_histograms if h]) + 1))
+    sim = histogram_matrix(sim_histograms, degrees)
+    sim_present = histogram_matrix([{d: 1 for d in h} for h in sim_histograms], degrees).astype(bool)
+    padding = ((0, 0), (0, len(degrees) - len(dataset.degrees)))
+    exp = np.pad(dataset.counts, padding)
+    exp_present = np.pad(dataset.present, padding)
+
+    union = sim_present[:, None, :] | exp_present[None, :, :]
+    squared = (sim[:, None, :] - exp[None, :, :]) ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(union, squared, 0).sum(axis=2) / union.sum(axis=2)
+
+def radius_difference(sim_radii_of_gyration, dataset):
+    '''
+    Absolute difference of the radii of gyration, (S, E).
+    '''
+    return np.abs(np.asarray(sim_radii_of_gyration, dtype=float)[:, None] - dataset.radius_of_gyration[None, :])
+
+def wasserstein_scores(sim_histograms, dataset):
+    '''
+    Wasserstein distances of the degree histograms, (S, E), with the degree filtering of wasserstein.py.
+    '''
+    degrees = histogram_degrees(list(sim_histograms) + dataset.histograms)
+    return wasserstein_matrix(histogram_matrix(sim_histograms, degrees), histogram_matrix(dataset.histograms, degrees))
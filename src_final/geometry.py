@@ -0,0 +1,209 @@
+# src/geometry.py
+
+"""
+Lattice geometry tables (neighbours, next-nearest neighbours per orientation and the wrap map) depend only on
+(width, rotational_symmetry, periodic), so they are computed once per configuration and shared.
+
+Within a process, every Lattice of the same shape reuses the same tables. Across processes (e.g. sweep workers),
+the tables are published as .npy files in a cache directory and attached read-only through np.load(..., mmap_mode='r'),
+so the OS page cache holds a single copy no matter how many workers are running.
+
+Sites are addressed by the flat index y * width + x. Entries of -1 mark neighbours that fall off a non-periodic lattice.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+ORIENTATIONS = (0, 180) # index 0 -> orientation 0, index 1 -> orientation 180
+PAD = 2 # largest coordinate offset used by the neighbour tables
+
+_GEOMETRIES = {} # in-process cache, keyed on (width, rotational_symmetry, periodic)
+
+def geometry_cache_dir():
+    return os.environ.get("KMC_GEOMETRY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "2d_kmc", "geometry"))
+
+class LatticeGeometry:
+    def __init__(self, width, rotational_symmetry, periodic, neighbours, next_nearest, wrap_x, wrap_y):
+        self.width = width
+        self.height = width
+        self.rotational_symmetry = rotational_symmetry
+        self.periodic = periodic
+        self.neighbours = neighbours # (W*W, 6) flat site indices
+        self.next_nearest = next_nearest # (2, W*W, 3) flat site indices, first axis is the orientation index
+        self.wrap_x = wrap_x # wrap_x[x + PAD] is the wrapped x coordinate for -PAD <= x < width + PAD
+        self.wrap_y = wrap_y
+        self._neighbour_dict = None
+        self._next_nearest_dict = None
+
+    @property
+    def key(self):
+        return (self.width, self.rotational_symmetry, self.periodic)
+
+    @property
+    def num_sites(self):
+        return self.width * self.height
+
+    def site_index(self, x, y):
+        return y * self.width + x
+
+    def site_coordinates(self, index):
+        return (index % self.width, index // self.width)
+
+    def _to_coordinates(self, row):
+        return [(i % self.width, i // self.width) for i in row if i >= 0]
+
+    def neighbour_dict(self):
+        '''
+        Neighbour table in the {(x, y): [(nx, ny), ...]} form used by Lattice.get_neighbours. Built on first use and
+        shared between all lattices in this process, so callers must not modify the lists.
+        '''
+        if self._neighbour_dict is None:
+            table = self.neighbours.tolist()
+            self._neighbour_dict = {(i % self.width, i // self.width): self._to_coordinates(row) for i, row in enumerate(table)}
+        return self._neighbour_dict
+
+    def next_nearest_dict(self):
+        '''
+        Next-nearest neighbour table in the {(x, y, orientation): [(nx, ny), ...]} form used by
+        Lattice.get_next_nearest_neighbours. Shared in the same way as neighbour_dict().
+        '''
+        if self._next_nearest_dict is None:
+            next_nearest = {}
+            for o, orientation in enumerate(ORIENTATIONS):
+                for i, row in enumerate(self.next_nearest[o].tolist()):
+                    next_nearest[(i % self.width, i // self.width, orientation)] = self._to_coordinates(row)
+            self._next_nearest_dict = next_nearest
+        return self._next_nearest_dict
+
+def build_wrap_map(size, periodic):
+    '''
+    Wrapped coordinate for every raw coordinate in [-PAD, size + PAD). This mirrors Lattice.wrap_coordinates: anything
+    below 0 maps to size - 1 and anything at or above size maps to 0.
+    '''
+    raw = np.arange(-PAD, size + PAD)
+    wrapped = raw.copy()
+    if periodic:
+        wrapped[raw < 0] = size - 1
+        wrapped[raw >= size] = 0
+    else:
+        wrapped[(raw < 0) | (raw >= size)] = -1
+    return wrapped.astype(np.int32)
+
+def compute_geometry(width, rotational_symmetry=6, periodic=True):
+    """
+    Compute the neighbour and next-nearest neighbour tables for a lattice configuration.
+
+    Args:
+        width (int): Lattice width (and height).
+        rotational_symmetry (int): Rotational symmetry of the lattice.
+        periodic (bool): Whether periodic boundary conditions apply.
+
+    Returns:
+        LatticeGeometry: Tables for this configuration.
+    """
+    if rotational_symmetry != 6:
+        raise NotImplementedError("Next nearest neighbour is restricted to 6-fold rotational symmetries (for now).")
+
+    wrap_x = build_wrap_map(width, periodic)
+    wrap_y = build_wrap_map(width, periodic)
+
+    y, x = np.divmod(np.arange(width * width), width)
+    odd = (y % 2).astype(bool)
+
+    def lookup(dx, dy):
+        # dx, dy are arrays (or scalars) of offsets; returns flat indices with -1 for sites off the lattice
+        wx = wrap_x[x + dx + PAD]
+        wy = wrap_y[y + dy + PAD]
+        return np.where((wx < 0) | (wy < 0), -1, wy * width + wx)
+
+    # same ordering as the original per-site lists: up, down, left, right, then the two row-dependent diagonals
+    neighbours = np.stack([
+        lookup(0, -1),
+        lookup(0, 1),
+        lookup(-1, 0),
+        lookup(1, 0),
+        lookup(np.where(odd, 1, -1), -1),
+        lookup(np.where(odd, 1, -1), 1),
+    ], axis=1)
+
+    next_nearest_0 = np.stack([
+        lookup(np.where(odd, -1, -2), -1),
+        lookup(np.where(odd, 2, 1), -1),
+        lookup(0, 2),
+    ], axis=1)
+    next_nearest_180 = np.stack([
+        lookup(0, -2),
+        lookup(np.where(odd, 2, 1), 1),
+        lookup(np.where(odd, -1, -2), 1),
+    ], axis=1)
+    next_nearest = np.stack([next_nearest_0, next_nearest_180])
+
+    return LatticeGeometry(width, rotational_symmetry, periodic, neighbours.astype(np.int32), next_nearest.astype(np.int32), wrap_x, wrap_y)
+
+def _cache_path(key, cache_dir):
+    width, rotational_symmetry, periodic = key
+    return os.path.join(cache_dir, f"w{width}_s{rotational_symmetry}_p{int(periodic)}")
+
+def _load_geometry(key, path):
+    tables = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in ("neighbours", "next_nearest", "wrap_x", "wrap_y")}
+    return LatticeGeometry(*key, tables["neighbours"], tables["next_nearest"], tables["wrap_x"], tables["wrap_y"])
+
+def publish_geometry(geometry, cache_dir=None):
+    '''
+    Write the tables of a geometry to the cache directory. The files are written to a temporary directory first and
+    renamed into place, so concurrent workers either see a complete set of tables or none at all.
+    '''
+    cache_dir = cache_dir or geometry_cache_dir()
+    path = _cache_path(geometry.key, cache_dir)
+    if os.path.isdir(path):
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_")
+    for name in ("neighbours", "next_nearest", "wrap_x", "wrap_y"):
+        np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(getattr(geometry, name)))
+    try:
+        os.rename(tmp, path)
+    except OSError: # another process published the same tables first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+def get_geometry(width, rotational_symmetry=6, periodic=True, cache_dir=None, use_disk_cache=True):
+    """
+    Get the (shared, read-only) geometry tables for a lattice configuration.
+
+    The tables are looked up in the in-process cache first, then attached from the disk cache as memory-mapped arrays,
+    and only computed (and published for other processes) if neither exists.
+
+    Args:
+        width (int): Lattice width (and height).
+        rotational_symmetry (int): Rotational symmetry of the lattice.
+        periodic (bool): Whether periodic boundary conditions apply.
+        cache_dir (str): Directory for the .npy tables. Defaults to $KMC_GEOMETRY_CACHE or ~/.cache/2d_kmc/geometry.
+        use_disk_cache (bool): Set to False to keep the tables in memory only.
+
+    Returns:
+        LatticeGeometry: Tables for this configuration.
+    """
+    key = (width, rotational_symmetry, bool(periodic))
+    geometry = _GEOMETRIES.get(key)
+    if geometry is not None:
+        return geometry
+
+    if use_disk_cache:
+        cache_dir = cache_dir or geometry_cache_dir()
+        path = _cache_path(key, cache_dir)
+        try:
+            geometry = _load_geometry(key, path)
+        except (OSError, ValueError):
+            geometry = compute_geometry(*key)
+            try:
+                publish_geometry(geometry, cache_dir)
+            except OSError:
+                pass # read-only or full filesystem; the in-process tables still work
+    else:
+        geometry = compute_geometry(*key)
+
+    _GEOMETRIES[key] = geometry
+    return geometry
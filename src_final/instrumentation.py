@@ -0,0 +1,105 @@
+# src/instrumentation.py
+
+"""
+Opt-in performance counters and logging for simulation runs.
+
+Counting is switched on by attaching a Counters object to a lattice (lattice.counters = Counters()). The monomer methods
+only check `lattice.counters is not None` before counting, so with counting switched off (the default) the hot path
+pays a single attribute check per event. The counters of a run are exported as JSON next to its results row (see
+save_results_to_csv in main.py).
+
+Progress messages go through the "kmc" logger instead of print. Per-monomer messages are at DEBUG level and therefore
+cost next to nothing unless they are enabled; configure_logging buffers them and writes them out in blocks, while progress
+messages (INFO and up) are written immediately.
+"""
+
+import logging
+import logging.handlers
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("kmc")
+
+class Counters:
+    '''
+    Event counts and wall time per phase of one run.
+    '''
+    EVENTS = (
+        "diffusion_attempts", # diffuse() calls on an uncoupled monomer
+        "diffusion_accepted", # hops to a neighbouring site
+        "rotation_attempts", # rotate() calls on an uncoupled monomer
+        "rotation_accepted", # orientation flips
+        "rotation_index_changes", # changes of the rotations counter used by get_halogenation
+        "coupling_attempts", # coupling draws that succeeded and looked for a partner
+        "coupling_no_partner", # ... of which found no partner with the opposite orientation
+        "coupling_rejected_halogenation", # ... of which were rejected by get_halogenation
+        "coupling_accepted",
+        "dehalogenation_events", # halogen sites removed
+        "nucleations", # walkers caught by a defect (see defect.DefectField)
+        "placements", # monomers introduced on the lattice
+        "failed_placements", # placements that hit max_steps without coupling
+        "steps", # action() steps of the monomers being introduced
+    )
+    __slots__ = EVENTS + ("phases",)
+
+    def __init__(self):
+        for name in self.EVENTS:
+            setattr(self, name, 0)
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Add the wall time spent in the with block to the named phase.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def to_dict(self):
+        counts = {name: getattr(self, name) for name in self.EVENTS}
+        counts["phases"] = dict(self.phases)
+        return counts
+
+def timed(counters, name):
+    '''
+    counters.phase(name), or a no-op context if counting is switched off.
+    '''
+    return nullcontext() if counters is None else counters.phase(name)
+
+def merge_counters(counter_dicts):
+    """
+    Sum the to_dict() outputs of several runs (e.g. the replicas of one parameter point).
+    """
+    total = {name: 0 for name in Counters.EVENTS}
+    total["phases"] = {}
+    for counts in counter_dicts:
+        for name in Counters.EVENTS:
+            total[name] += counts.get(name, 0)
+        for phase, seconds in counts.get("phases", {}).items():
+            total["phases"][phase] = total["phases"].get(phase, 0.0) + seconds
+    return total
+
+def configure_logging(level="INFO", capacity=1024, stream=None):
+    """
+    Send the "kmc" logger to a stream. DEBUG records (one per coupled monomer) are buffered and written out every
+    `capacity` records; anything from INFO up (progress of a sweep, warnings) flushes the buffer, so it shows up live.
+
+    Args:
+        level (str or int): Lowest level that is logged; DEBUG includes the per-monomer messages.
+        capacity (int): Number of DEBUG records buffered before they are written.
+        stream: Output stream (defaults to stdout).
+    """
+    for handler in list(logger.handlers):
+        handler.flush()
+        logger.removeHandler(handler)
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(logging.Formatter("%(message)s"))
+    buffered = logging.handlers.MemoryHandler(capacity, flushLevel=logging.INFO, target=target)
+    logger.addHandler(buffered)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
@@ -1,9 +1,10 @@
 # src/lattice.py
 import random
 import numpy as np
+from geometry import get_geometry
 
 class Lattice:
-    def __init__(self, width, rotational_symmetry = 6, periodic = True, temperature = 600):
+    def __init__(self, width, rotational_symmetry = 6, periodic = True, temperature = 600, geometry = None, substrate = None):
         self.width = width
         self.height = width
         self.rotational_symmetry = rotational_symmetry
@@ -14,9 +15,12 @@ class Lattice:
         self.substrate_properties = {}
         self.neighbours = {} # will be defined below
         self.next_nearest_neighbours = {}
+        self.geometry = None # shared LatticeGeometry tables, attached below
+        self.counters = None # set to an instrumentation.Counters to count events (see instrumentation.py)
+        self.substrate = substrate # substrate.SubstrateMap for biased diffusion on a substrate potential, None for a flat substrate
 
         self.define_grid()
-        self.precompute_neighbors() # precompute neigbours and next nearest neighbours for more efficiency
+        self.precompute_neighbors(geometry) # precompute neigbours and next nearest neighbours for more efficiency
 
     def define_grid(self):
         '''
@@ -30,50 +34,16 @@ class Lattice:
         lattice_coord = [(i, j) for i in range(self.width) for j in range(self.height)]
         return grid, lattice_coord
     
-    def precompute_neighbors(self):
+    def precompute_neighbors(self, geometry=None):
         """
-        Precompute neighbors and next-nearest neighbors for each lattice site and orientation.
+        Attach the neighbour and next-nearest neighbour tables for each lattice site and orientation. The tables only depend
+        on (width, rotational_symmetry, periodic), so they are computed once and shared between lattices (see geometry.py).
         """
-
-        def get_neighbours(x, y):
-            even_row_offsets = [(-1, -1), (-1, 1)]
-            odd_row_offsets = [(1, -1), (1, 1)]
-            base_neighbours = [(x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)]
-            if y % 2 == 0:
-                diagonal_neighbours = [(x + dx, y + dy) for dx, dy in even_row_offsets]
-            else:
-                diagonal_neighbours = [(x + dx, y + dy) for dx, dy in odd_row_offsets]
-            
-            neighbours = base_neighbours + diagonal_neighbours
-            return [self.wrap_coordinates(*coord) for coord in neighbours]
-
-        def get_next_nearest_neighbours(x, y, orientation):
-            # for now only 6-fold rotational symmetry
-            if self.rotational_symmetry == 6:
-                if orientation == 180:
-                    if y % 2 == 0:
-                        next_nearest = [(x, y - 2), (x + 1, y + 1), (x - 2, y + 1)]
-                    else:
-                        next_nearest = [(x, y - 2), (x + 2, y + 1), (x - 1, y + 1)]
-                elif orientation == 0:
-                    if y % 2 == 0:
-                        next_nearest = [(x - 2, y - 1), (x + 1, y - 1), (x, y + 2)]
-                    else:
-                        next_nearest = [(x - 1, y - 1), (x + 2, y - 1), (x, y + 2)]
-            else:
-                raise NotImplementedError("Next nearest neighbour is restricted to 6-fold rotational symmetries (for now).")
-            
-            next_nearest = list(map(lambda coord: self.wrap_coordinates(*coord), next_nearest))
-            return next_nearest
-
-        orientations = [0, 180]  
-
-        for x in range(self.width):
-            for y in range(self.height):
-                for orientation in orientations:
-                    # Compute neighbors and next-nearest neighbors for each orientation
-                    self.neighbours[(x, y)] = get_neighbours(x, y)
-                    self.next_nearest_neighbours[(x, y, orientation)] = get_next_nearest_neighbours(x, y, orientation)
+        if geometry is None:
+            geometry = get_geometry(self.width, self.rotational_symmetry, self.periodic)
+        self.geometry = geometry
+        self.neighbours = geometry.neighbour_dict()
+        self.next_nearest_neighbours = geometry.next_nearest_dict()
 
     
     def is_member(self, x, y):
@@ -2,12 +2,17 @@
 
 from lattice import Lattice
 from monomer import Monomer
-from defect import Defect
-from plotter import plot_simulation, plot_final_state, plot_analysis_results
-import matplotlib.pyplot as plt
+from defect import DefectField
+# plotting is not imported here so that headless workers do not load matplotlib; import from plotter to visualise runs
 # from plotter import plot_simulation, plot_final_state, plot_analysis_results
 
-from analysis import analyze_structure
+from analysis import analyze_structure, bond_graph, ring_statistics
+from result_cache import ResultCache, replica_key
+from snapshot import snapshot_state, restore_state
+from substrate import herringbone_substrate
+from instrumentation import Counters, logger, timed, merge_counters, configure_logging
+import hashlib
+import json
 import random
 import numpy as np
 
@@ -37,23 +42,41 @@ def initialize_dimer(lattice, monomer_params):
         lattice.place_monomer(monomer_2, x_2, y_2)
     return (monomer_1, monomer_2)
 
-def introduce_new_monomer(lattice, new_monomer, monomers, first_time, defects, max_steps=1e6):
+def introduce_new_monomer(lattice, new_monomer, monomers, first_time, defects, max_steps=1e6, recorder=None):
 
     '''
     Introduces a new monomer on the lattice and executes the Monomer.action() method iteratively until 
     monomer is coupled (at which point it is defined to not move anymore) or until max_steps has been reached. 
     In the latter case, the monomer is removed from the lattice. This was done to avoid having several islands growing at the same time. 
     We might want to relax this condition at some point.
+
+    If a TrajectoryRecorder is passed, every change of the monomer's position, orientation or coupling state is recorded.
+
+    If defects (a DefectField) are passed, they diffuse one step along with every step of the monomer, and the monomer
+    stops as a new nucleus if it is caught by one of them.
     '''
+    counters = lattice.counters
+    if counters is not None:
+        counters.placements += 1
     steps = 0
+    position, orientation = new_monomer.position, new_monomer.orientation
     while steps < max_steps:
         new_monomer.action(lattice, first_time)
+        if defects is not None:
+            defects.step()
+            if not new_monomer.coupled and not new_monomer.nucleating and defects.try_nucleate(new_monomer) and counters is not None:
+                counters.nucleations += 1
+        if recorder is not None and (new_monomer.position is not position or new_monomer.orientation != orientation or new_monomer.coupled):
+            recorder.track(new_monomer)
+            position, orientation = new_monomer.position, new_monomer.orientation
 
         for mon in monomers:
             mon.dehalogenate(lattice)
         if new_monomer.coupled or new_monomer.nucleating:
             monomers.append(new_monomer)
-            print(f"Monomer succesfully coupled after {steps} steps")
+            if counters is not None:
+                counters.steps += steps + 1
+            logger.debug("Monomer succesfully coupled after %d steps", steps)
             return 0
         
         steps += 1
@@ -61,40 +84,62 @@ def introduce_new_monomer(lattice, new_monomer, monomers, first_time, defects, m
     else:
         x, y = new_monomer.get_position()
         lattice.remove_monomer(x, y)
-        print(f"Monomer failed to couple after {max_steps} steps. Initializing new monomer...")
+        if recorder is not None:
+            recorder.forget(new_monomer)
+        if counters is not None:
+            counters.steps += steps
+            counters.failed_placements += 1
+        logger.info("Monomer failed to couple after %d steps. Initializing new monomer...", max_steps)
         return 1
 
 def create_defects(defect_density, lattice, defect_params):
+    '''
+    Place defect_density * (number of sites) defects at random sites. Returns a DefectField, or None without defects.
+    '''
     num_defects = round(defect_density*lattice.width**2)
-    defects = []
-    for num in range(num_defects):
-        defects.append(Defect(*defect_params))
-    return defects
+    if num_defects == 0:
+        return None
+    return DefectField(lattice, num_defects, *defect_params)
 
-def slow_growth_simulation(lattice, monomer_params, defect_params, defect_density, total_monomers, herringbone=True, max_steps=1e6):
+def slow_growth_simulation(lattice, monomer_params, defect_params, defect_density, total_monomers, herringbone=False, max_steps=1e6, monomers=None, first_time=True, recorder=None):
     '''
     What I call slow_growth here is what I had explained in our meeting, where the density of monomers is so low that 
     it is physically accurate to model only a single monomer at a time until it coupled to the growing island. Only after 
     the monomer has coupled is the next one introduced.
+
+    Passing monomers (e.g. restored from a snapshot, see snapshot.py) continues the growth of that island instead of starting
+    from a new dimer. Passing a TrajectoryRecorder (see trajectory.py) records the growth for later replay.
+
+    With herringbone=True (or a dict of herringbone_potential parameters), the monomers diffuse on the herringbone
+    reconstruction of Au(111) unless the lattice already has a substrate (see substrate.py).
     '''
+    if herringbone and lattice.substrate is None:
+        lattice.substrate = herringbone_substrate(lattice, **(herringbone if isinstance(herringbone, dict) else {}))
+    defects = create_defects(defect_density, lattice, defect_params) # defect_params: diffusion_rate, diffusion_energy, nucleation_prob
 
-    # Change the initialization of the dimer to a normal introduction of one monomer and allow it to nucleate at some point
-    monomer_1, monomer_2 = initialize_dimer(lattice, monomer_params)
-    #monomers = [monomer_1, monomer_2]
-    monomers = [monomer_1, monomer_2]
-    first_time = True
-    for i in range(2, total_monomers):
+    if monomers is None:
+        # Change the initialization of the dimer to a normal introduction of one monomer and allow it to nucleate at some point
+        monomer_1, monomer_2 = initialize_dimer(lattice, monomer_params)
+        #monomers = [monomer_1, monomer_2]
+        monomers = [monomer_1, monomer_2]
+        first_time = True
+    if recorder is not None:
+        for monomer in monomers:
+            recorder.track(monomer)
+    for i in range(len(monomers), total_monomers):
         new_monomer = Monomer(*monomer_params) # Constructing a monomer here is fine, but
                                                # we might want to input the lattice into the monomer as a matrix of probabilities
         j = 1                     
         lattice.randomly_place_monomers([new_monomer]) # initialize monomer with random position (note that this can also be inside the island on an unoccupied site)
+        if recorder is not None:
+            recorder.track(new_monomer)
         while j==1:
-            j = introduce_new_monomer(lattice, new_monomer, monomers, first_time, max_steps)
+            j = introduce_new_monomer(lattice, new_monomer, monomers, first_time, defects, max_steps, recorder=recorder)
         
         first_time = False
         
 
-    print("Growth simulation completed.")
+    logger.debug("Growth simulation completed.")
 
     #neighbour_freq, radius, radius_of_gyration = analyze_structure(lattice, monomers)
 
@@ -121,7 +166,10 @@ def save_results_to_csv(results, filename):
             "Average Radius", 
             "Standard Dev Radius",
             "Average Radius of Gyration",
-            "Standard Dev ROG"
+            "Standard Dev ROG",
+            "Replicas",
+            "Counters",
+            "Averaged Ring Sizes"
         ]
         writer.writerow(header)
 
@@ -136,10 +184,235 @@ def save_results_to_csv(results, filename):
                 result["avg_radius"],
                 result["std_radius"],
                 result["avg_radius_of_gyration"],
-                result["std_radius_of_gyration"]
+                result["std_radius_of_gyration"],
+                result.get("num_replicas", ""),
+                json.dumps(result["counters"]) if "counters" in result else "",
+                result.get("averaged_ring_sizes", "")
             ])
 
 
+def replica_seed(base_seed, monomer_params, defect_params, replica):
+    '''
+    Deterministic seed for one replica of a parameter point, so that re-running (or caching) a sweep reproduces the same islands.
+    '''
+    params = [p if isinstance(p, str) else float(p) for p in list(monomer_params) + list(defect_params)]
+    text = repr((base_seed, params, replica))
+    return int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+
+def analyze_replica(lattice, monomers, seed):
+    neighbour_freq, radius, radius_of_gyration = analyze_structure(lattice, monomers)
+    return {
+        "seed": seed,
+        "neighbour_freq": dict(neighbour_freq),
+        "radius": float(radius),
+        "radius_of_gyration": float(radius_of_gyration),
+        "ring_sizes": dict(ring_statistics(lattice, monomers)),
+        "bonds": bond_graph(lattice, monomers),
+    }
+
+def run_replica(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=1e6, cache=None, instrument=False, herringbone=False):
+    """
+    Grow and analyze a single island.
+
+    Args:
+        width (int): Lattice width.
+        monomer_params (list): Parameters passed to Monomer().
+        defect_params (list): Parameters passed to Defect().
+        defect_density (float): Defect density on the lattice.
+        total_monomers (int): Number of monomers in the island.
+        seed (int): Seed for the random number generator.
+        max_steps (float): Step limit per monomer.
+        cache (ResultCache): Optional result cache; the replica is only simulated if it is not cached yet.
+        instrument (bool): Count events and time the phases of the run (see instrumentation.py). The counts are returned
+            under "counters"; they are not cached.
+        herringbone (bool or dict): Grow on a herringbone substrate (see slow_growth_simulation).
+
+    Returns:
+        dict: Neighbour frequencies, radius, radius of gyration, ring-size histogram and bond graph of the island.
+    """
+    counters = Counters() if instrument else None
+    lattice_config = {"width": width, "rotational_symmetry": 6, "periodic": True, "temperature": 600}
+    if cache is not None:
+        key = replica_key(monomer_params, defect_params, defect_density, lattice_config, total_monomers, seed, max_steps,
+                          extra={"herringbone": herringbone} if herringbone else None)
+        description = (f"diffusion: {monomer_params[2]}, rotation: {monomer_params[4]}, coupling: {monomer_params[6]}, "
+                       f"dehalogen: {monomer_params[8]}, width: {width}, monomers: {total_monomers}, seed: {seed}")
+        with timed(counters, "cache"):
+            replica = cache.get(key, description)
+        if replica is not None:
+            if counters is not None:
+                replica = dict(replica, counters=counters.to_dict())
+            return replica
+
+    random.seed(seed)
+    with timed(counters, "setup"):
+        lattice = Lattice(**lattice_config)
+    lattice.counters = counters
+    with timed(counters, "growth"):
+        monomers = slow_growth_simulation(lattice, monomer_params, defect_params, defect_density=defect_density, total_monomers=total_monomers,
+                                          herringbone=herringbone, max_steps=max_steps)
+    with timed(counters, "analysis"):
+        replica = analyze_replica(lattice, monomers, seed)
+
+    if cache is not None:
+        with timed(counters, "cache"):
+            cache.put(key, replica, description)
+    if counters is not None:
+        replica["counters"] = counters.to_dict()
+    return replica
+
+def run_forked_replicas(width, param_sets, defect_params, defect_density, prefix_monomers, total_monomers, seed, max_steps=1e6, regrow_prefix=False, prefix_params=None, cache=None):
+    """
+    Grow the first prefix_monomers of an island once and continue it under each of several parameter sets. This is worthwhile
+    for parameters whose effect only shows up late in the growth (e.g. the dehalogenation energy).
+
+    Args:
+        width (int): Lattice width.
+        param_sets (list of list): Monomer parameters of each branch.
+        defect_params (list): Parameters passed to Defect().
+        defect_density (float): Defect density on the lattice.
+        prefix_monomers (int): Number of monomers in the shared prefix.
+        total_monomers (int): Number of monomers in each final island.
+        seed (int): Seed of the prefix; branch seeds are derived from it.
+        max_steps (float): Step limit per monomer.
+        regrow_prefix (bool): Grow a separate prefix for every branch (under that branch's parameters) when strictly
+            independent replicas are needed.
+        prefix_params (list): Monomer parameters used to grow the shared prefix. Defaults to the parameter set with the
+            largest dehalogenation energy, so that as few halogen sites as possible are gone when the branches take over
+            (a low barrier strips every site within the first steps, and every branch would continue from a fully
+            dehalogenated prefix).
+        cache (ResultCache): Optional result cache; nothing is simulated if every branch is cached already.
+
+    Returns:
+        list of dict: One run_replica-style result per parameter set.
+    """
+    prefix_params = prefix_params or max(param_sets, key=lambda monomer_params: monomer_params[8])
+    if cache is not None:
+        lattice_config = {"width": width, "rotational_symmetry": 6, "periodic": True, "temperature": 600}
+        fork = {"prefix_monomers": prefix_monomers, "regrow_prefix": regrow_prefix, "prefix_params": None if regrow_prefix else list(prefix_params)}
+        keys = [replica_key(monomer_params, defect_params, defect_density, lattice_config, total_monomers, seed, max_steps, extra=fork) for monomer_params in param_sets]
+        descriptions = [(f"diffusion: {p[2]}, rotation: {p[4]}, coupling: {p[6]}, dehalogen: {p[8]}, width: {width}, "
+                         f"monomers: {total_monomers}, seed: {seed}, forked after {prefix_monomers}") for p in param_sets]
+        cached = [cache.get(key, description) for key, description in zip(keys, descriptions)]
+        if all(replica is not None for replica in cached):
+            return cached
+
+    blob = None
+    if not regrow_prefix:
+        random.seed(seed)
+        lattice = Lattice(width=width, rotational_symmetry=6, periodic=True)
+        monomers = slow_growth_simulation(lattice, prefix_params, defect_params, defect_density=defect_density, total_monomers=prefix_monomers, max_steps=max_steps)
+        blob = snapshot_state(lattice, monomers, first_time=prefix_monomers <= 2)
+
+    replicas = []
+    for monomer_params in param_sets:
+        branch_seed = replica_seed(seed, monomer_params, defect_params, "branch")
+        if regrow_prefix:
+            random.seed(branch_seed)
+            lattice = Lattice(width=width, rotational_symmetry=6, periodic=True)
+            monomers = slow_growth_simulation(lattice, monomer_params, defect_params, defect_density=defect_density, total_monomers=total_monomers, max_steps=max_steps)
+        else:
+            lattice, monomers, first_time = restore_state(blob, monomer_params)
+            random.seed(branch_seed)
+            monomers = slow_growth_simulation(lattice, monomer_params, defect_params, defect_density=defect_density, total_monomers=total_monomers,
+                                              max_steps=max_steps, monomers=monomers, first_time=first_time)
+        replicas.append(analyze_replica(lattice, monomers, branch_seed))
+
+    if cache is not None:
+        for key, replica, description in zip(keys, replicas, descriptions):
+            cache.put(key, replica, description)
+    return replicas
+
+def replica_standard_errors(replicas, total_monomers):
+    """
+    Standard errors of the quantities averaged over replicas.
+
+    Args:
+        replicas (list of dict): Outputs of run_replica.
+        total_monomers (int): Number of monomers per island, used to turn histogram counts into fractions.
+
+    Returns:
+        tuple: (largest standard error over the degrees of the neighbour-frequency histogram as a fraction of the island,
+                relative standard error of the radius of gyration)
+    """
+    n = len(replicas)
+    if n < 2:
+        return np.inf, np.inf
+    degrees = sorted(set().union(*(replica["neighbour_freq"] for replica in replicas)))
+    counts = np.array([[replica["neighbour_freq"].get(degree, 0) for degree in degrees] for replica in replicas], dtype=float)
+    histogram_error = np.max(np.std(counts / total_monomers, axis=0, ddof=1)) / np.sqrt(n)
+    radii_of_gyration = np.array([replica["radius_of_gyration"] for replica in replicas])
+    rg_error = np.std(radii_of_gyration, ddof=1) / np.sqrt(n) / abs(np.mean(radii_of_gyration))
+    return histogram_error, rg_error
+
+def run_point_adaptive(width, monomer_params, defect_params, defect_density, total_monomers, base_seed, min_replicas=3, max_replicas=30,
+                       histogram_tolerance=0.01, rg_tolerance=0.01, max_steps=1e6, cache=None, instrument=False):
+    """
+    Run replicas of one parameter point until the averaged results are precise enough, instead of a fixed number.
+
+    Replicas are added until the standard error of every bin of the averaged degree histogram (as a fraction of the island)
+    is below histogram_tolerance and the relative standard error of the radius of gyration is below rg_tolerance, or
+    until max_replicas is reached. Replica seeds are the same as for a fixed replica count, so the first replicas are
+    shared with (and cached alongside) non-adaptive runs.
+
+    Returns:
+        list of dict: Outputs of run_replica.
+    """
+    replicas = []
+    while len(replicas) < max_replicas:
+        seed = replica_seed(base_seed, monomer_params, defect_params, len(replicas))
+        replicas.append(run_replica(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=max_steps, cache=cache, instrument=instrument))
+        if len(replicas) >= min_replicas:
+            histogram_error, rg_error = replica_standard_errors(replicas, total_monomers)
+            if histogram_error < histogram_tolerance and rg_error < rg_tolerance:
+                break
+    return replicas
+
+def aggregate_replicas(monomer_params, replicas):
+    """
+    Average the replicas of one parameter point into a results row (see save_results_to_csv).
+
+    Args:
+        monomer_params (list): Parameters passed to Monomer().
+        replicas (list of dict): Outputs of run_replica.
+
+    Returns:
+        dict: Aggregated result for this parameter point.
+    """
+    combined_freqs = {}
+    for replica in replicas:
+        for degree, count in replica["neighbour_freq"].items():
+            combined_freqs[degree] = combined_freqs.get(degree, 0) + count
+
+    averaged_neighbour_freq = {degree: count / len(replicas) for degree, count in combined_freqs.items()}
+
+    combined_rings = {}
+    for replica in replicas:
+        for size, count in replica.get("ring_sizes", {}).items():
+            combined_rings[size] = combined_rings.get(size, 0) + count
+    averaged_ring_sizes = {size: count / len(replicas) for size, count in sorted(combined_rings.items())}
+
+    # Average radius and radius of gyration
+    all_radii = [replica["radius"] for replica in replicas]
+    all_radii_of_gyration = [replica["radius_of_gyration"] for replica in replicas]
+
+    result = {
+        "diffusion_energy": monomer_params[2],
+        "rotation_energy": monomer_params[4],
+        "coupling_energy": monomer_params[6],
+        "dehalogen_energy": monomer_params[8],
+        "averaged_neighbour_freq": averaged_neighbour_freq,
+        "averaged_ring_sizes": averaged_ring_sizes,
+        "avg_radius": np.mean(all_radii),
+        "std_radius": np.std(all_radii),
+        "avg_radius_of_gyration": np.mean(all_radii_of_gyration),
+        "std_radius_of_gyration": np.std(all_radii_of_gyration),
+        "num_replicas": len(replicas)
+    }
+    if any("counters" in replica for replica in replicas):
+        result["counters"] = merge_counters(replica["counters"] for replica in replicas if "counters" in replica)
+    return result
+
 def main():
     # Initialize lattice and monomers
     diffusion_energies = np.linspace(0,1.5,6)
@@ -148,71 +421,60 @@ def main():
     rotation_energies = [0]
 
     width = 60 # only even numbers
-    num_simulations_per_triplet = 3
+    num_simulations_per_triplet = 3 # with adaptive = True, this is the minimum number of replicas per point
+    adaptive = False # keep adding replicas until the standard errors are below the tolerances (see run_point_adaptive)
+    max_replicas = 30
+    histogram_tolerance = 0.01 # standard error of each degree-histogram bin, as a fraction of the island
+    rg_tolerance = 0.01 # relative standard error of the radius of gyration
+    base_seed = 0 # replica seeds are derived from this and the energies, see replica_seed
+    cache = ResultCache("result_cache.sqlite") # replicas that were simulated before are read from here; set to None to always re-simulate
+    instrument = False # count events and time the phases of every run; the counts end up in the "Counters" column of the results
+    configure_logging("INFO") # "DEBUG" also logs every monomer that couples
+    prefix_monomers = 0 # if > 0, the first prefix_monomers of each island are grown once and continued for every dehalogenation energy (see run_forked_replicas)
     aggregated_results = [] # Store aggregated results
     axes = []
     for diff_energy in diffusion_energies:
         for rot_energy in rotation_energies:
             for coup_energy in coupling_energies:
-                for dehal_energy in dehalogen_energies:
-                    monomer_params = ['A', 1e13, diff_energy, 1e13, rot_energy, 1e13, coup_energy, 1e13, dehal_energy] 
-                    # monomer_type, diffusion_rate, diffusion_energy, rotation_rate, rotation_energy, coupling_rate, coupling_energy
+                defect_params = [1.0, 0.00, 1.0]
+                # diffusion_rate, diffusion_energy, nucleation_prob
 
-                    defect_params = [1.0, 0.00, 1.0]
-                    # diffusion_rate, diffusion_energy, nucleation_prob
+                param_sets = [['A', 1e13, diff_energy, 1e13, rot_energy, 1e13, coup_energy, 1e13, dehal_energy] for dehal_energy in dehalogen_energies]
+                # monomer_type, diffusion_rate, diffusion_energy, rotation_rate, rotation_energy, coupling_rate, coupling_energy, dehalogen_rate, dehalogen_energy
 
-                    # Initialize containers for results
-                    all_neighbour_freqs = []
-                    all_radii = []
-                    all_radii_of_gyration = []
-                    
-                    print('###########################################################################################################')
-                    print('')
-                    print(f"Simulation series beginning with diffusion: {diff_energy}, rotation: {rot_energy}, coupling: {coup_energy}, dehalogen: {dehal_energy}")
-                    print('')
-                    print('###########################################################################################################')
+                if prefix_monomers:
+                    # grow the prefix once per replica and continue it for every dehalogenation energy (always num_simulations_per_triplet replicas)
+                    forked = [run_forked_replicas(width, param_sets, defect_params, defect_density=0.0, prefix_monomers=prefix_monomers, total_monomers=50,
+                                                  seed=replica_seed(base_seed, param_sets[0], defect_params, sim), max_steps=1e6, cache=cache)
+                              for sim in range(num_simulations_per_triplet)]
+                    for i, monomer_params in enumerate(param_sets):
+                        aggregated_results.append(aggregate_replicas(monomer_params, [replicas[i] for replicas in forked]))
+                    continue
+
+                for monomer_params in param_sets:
+                    dehal_energy = monomer_params[8]
+                    logger.info("Simulation series beginning with diffusion: %s, rotation: %s, coupling: %s, dehalogen: %s", diff_energy, rot_energy, coup_energy, dehal_energy)
                     
-                    for sim in range(num_simulations_per_triplet):
-                        lattice = Lattice(width=width, rotational_symmetry=6, periodic=True)
-                        monomers = slow_growth_simulation(lattice, monomer_params,defect_params,defect_density=0.0, total_monomers=50, max_steps=1e6)
-        
-                        # call the plot_simulation function to visualize the diffusion
-                        #plot_simulation(lattice, monomers, max_steps = 1000, animate=False)
-                        neighbour_freq, radius, radius_of_gyration = analyze_structure(lattice, monomers)
-                        all_neighbour_freqs.append(neighbour_freq)
-                        all_radii.append(radius)
-                        all_radii_of_gyration.append(radius_of_gyration)
+                    if adaptive:
+                        replicas = run_point_adaptive(width, monomer_params, defect_params, defect_density=0.0, total_monomers=50, base_seed=base_seed,
+                                                      min_replicas=num_simulations_per_triplet, max_replicas=max_replicas, histogram_tolerance=histogram_tolerance,
+                                                      rg_tolerance=rg_tolerance, max_steps=1e6, cache=cache, instrument=instrument)
+                    else:
+                        replicas = []
+                        for sim in range(num_simulations_per_triplet):
+                            seed = replica_seed(base_seed, monomer_params, defect_params, sim)
+                            replicas.append(run_replica(width, monomer_params, defect_params, defect_density=0.0, total_monomers=50, seed=seed, max_steps=1e6, cache=cache, instrument=instrument))
+            
+                            # call the plot_simulation function to visualize the diffusion
+                            #plot_simulation(lattice, monomers, max_steps = 1000, animate=False)
                     #axes.append(plot_analysis_results(neighbour_freq, radius, lattice, monomers))
-                    combined_freqs = {}
-                    for freq in all_neighbour_freqs:
-                        for degree, count in freq.items():
-                            combined_freqs[degree] = combined_freqs.get(degree, 0) + count
-
-                    averaged_neighbour_freq = {degree: count / num_simulations_per_triplet for degree, count in combined_freqs.items()}
-
-                    # Average radius and radius of gyration
-                    avg_radius = np.mean(all_radii)
-                    std_radius = np.std(all_radii)
-                    avg_radius_of_gyration = np.mean(all_radii_of_gyration)
-                    std_radius_of_gyration = np.std(all_radii_of_gyration)
-
-                    aggregated_results.append({
-                        "diffusion_energy": diff_energy,
-                        "rotation_energy": rot_energy,
-                        "coupling_energy": coup_energy,
-                        "dehalogen_energy": dehal_energy,
-                        "averaged_neighbour_freq": averaged_neighbour_freq,
-                        "avg_radius": avg_radius,
-                        "std_radius": std_radius,
-                        "avg_radius_of_gyration": avg_radius_of_gyration,
-                        "std_radius_of_gyration":std_radius_of_gyration
-                    })
+                    aggregated_results.append(aggregate_replicas(monomer_params, replicas))
                     
 
     # Save aggregated results to a CSV file
     save_results_to_csv(aggregated_results, r"zach_output_rot.csv")
     
-    print("Parameter sweep completed. Results saved to 'zach_output_rot.csv'.")
+    logger.info("Parameter sweep completed. Results saved to 'zach_output_rot.csv'.")
 
 
 
@@ -0,0 +1,140 @@
+# src/match_index.py
+
+"""
+Persistent nearest-match index over the simulated degree histograms of a sweep.
+
+The 1-D Wasserstein distance between two histograms on unit-spaced bins is the L1 distance between their cumulative
+distributions (see wasserstein.py). The index therefore stores the normalized CDF of every simulated parameter point and
+answers "which energies best fit this STM image" with a k-nearest-neighbour query under the L1 metric on a KD-tree,
+instead of recomputing the distance to every point of the sweep.
+
+Example:
+    python match_index.py build cluster_results.csv zach_output_rot.csv -o sweep_index.npz
+    python match_index.py query sweep_index.npz STM02_graph_metrics.csv -k 5
+"""
+
+import argparse
+import numpy as np
+from scipy.spatial import cKDTree
+from wasserstein import EXCLUDED_DEGREES, ENERGY_COLUMNS, histogram_matrix, cumulative_distributions, load_simulated_histograms
+
+def index_degrees(max_degree):
+    return [d for d in range(1, max_degree + 1) if d not in EXCLUDED_DEGREES]
+
+def histogram_cdfs(histograms, degrees):
+    '''
+    CDF vectors for the index. Degrees above the largest indexed degree are counted in the last bin, and the last CDF
+    entry (always 1) is dropped since it never contributes to the distance.
+    '''
+    folded = []
+    for histogram in histograms:
+        f = {}
+        for degree, frequency in histogram.items():
+            if degree > degrees[-1] and degree not in EXCLUDED_DEGREES:
+                degree = degrees[-1]
+            f[degree] = f.get(degree, 0) + frequency
+        folded.append(f)
+    return cumulative_distributions(histogram_matrix(folded, degrees))[:, :-1]
+
+class MatchIndex:
+    def __init__(self, cdfs, energies, columns, degrees, sources):
+        self.cdfs = np.asarray(cdfs, dtype=float)
+        self.energies = np.asarray(energies, dtype=float)
+        self.columns = list(columns)
+        self.degrees = list(degrees)
+        self.sources = np.asarray(sources)
+        self.tree = cKDTree(self.cdfs)
+
+    def __len__(self):
+        return len(self.cdfs)
+
+    @classmethod
+    def build(cls, results_files, max_degree=8):
+        """
+        Build an index from one or more sweep results CSVs (see save_results_to_csv). Rows without any bonds are skipped.
+
+        Args:
+            results_files (list): Paths of the results files.
+            max_degree (int): Largest degree with its own bin; higher degrees are counted in the last bin.
+
+        Returns:
+            MatchIndex: The index.
+        """
+        degrees = index_degrees(max_degree)
+        columns = []
+        blocks = []
+        for path in results_files:
+            energies, file_columns, histograms = load_simulated_histograms(path)
+            columns += [column for column in file_columns if column not in columns]
+            blocks.append((path, energies, file_columns, histograms))
+        columns = [column for column in ENERGY_COLUMNS if column in columns]
+
+        cdfs, energies, sources = [], [], []
+        for path, file_energies, file_columns, histograms in blocks:
+            aligned = np.full((len(file_energies), len(columns)), np.nan) # columns a file does not have stay NaN
+            for i, column in enumerate(file_columns):
+                aligned[:, columns.index(column)] = file_energies[:, i]
+            file_cdfs = histogram_cdfs(histograms, degrees)
+            valid = np.isfinite(file_cdfs).all(axis=1)
+            cdfs.append(file_cdfs[valid])
+            energies.append(aligned[valid])
+            sources += [path] * int(valid.sum())
+        return cls(np.vstack(cdfs), np.vstack(energies), columns, degrees, sources)
+
+    def save(self, path):
+        np.savez(path, cdfs=self.cdfs, energies=self.energies, columns=np.array(self.columns), degrees=np.array(self.degrees), sources=self.sources)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["cdfs"], data["energies"], data["columns"].tolist(), data["degrees"].tolist(), data["sources"])
+
+    def query(self, histogram, k=5):
+        """
+        Find the parameter points whose simulated histograms are closest to a (experimental) histogram.
+
+        Args:
+            histogram (dict): {degree: frequency}.
+            k (int): Number of matches.
+
+        Returns:
+            list of tuple: (energies as {column: value}, Wasserstein distance, source file), best match first.
+        """
+        cdf = histogram_cdfs([histogram], self.degrees)[0]
+        if not np.isfinite(cdf).all():
+            raise ValueError("Cannot match an empty histogram.")
+        k = min(k, len(self))
+        distances, indices = self.tree.query(cdf, k=k, p=1)
+        distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+        return [(dict(zip(self.columns, self.energies[i].tolist())), float(d), str(self.sources[i])) for d, i in zip(distances, indices)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nearest-match index of simulated degree histograms.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build an index from sweep results files")
+    build.add_argument("results_files", nargs="+")
+    build.add_argument("-o", "--output", default="sweep_index.npz")
+    build.add_argument("--max-degree", type=int, default=8)
+    query = subparsers.add_parser("query", help="best-fit energies for experimental graph-metrics files")
+    query.add_argument("index")
+    query.add_argument("experimental_files", nargs="+")
+    query.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = MatchIndex.build(args.results_files, max_degree=args.max_degree)
+        index.save(args.output)
+        print(f"Indexed {len(index)} parameter points from {len(args.results_files)} files into '{args.output}'.")
+    else:
+        from experiments import load_experiments
+
+        index = MatchIndex.load(args.index)
+        dataset = load_experiments(args.experimental_files)
+        for name, histogram in zip(dataset.names, dataset.histograms):
+            print(name)
+            for energies, distance, source in index.query(histogram, k=args.k):
+                point = ", ".join(f"{column}: {value:.3f}" for column, value in energies.items() if np.isfinite(value))
+                print(f"    {distance:.4f}  {point}  ({source})")
+
+if __name__ == "__main__":
+    main()
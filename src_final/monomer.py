@@ -57,116 +57,47 @@ class Monomer:
 
     def diffuse(self, lattice, first_time):
         diffusion_prob = self.diffusion_probability(lattice) # get probability of moving
-        # the try block is in case no walls are built
-        try:
-            grid = lattice.wall_grid
-            divisor = lattice.rotational_symmetry
-            site0 = lattice.wall_params[2]
-            site2 = lattice.wall_params[3]
-
-            x_cur, y_cur = self.get_position()
-            if grid[y_cur][x_cur] == 1:
-                neighbours_grid = lattice.get_neighbours_with_wall(*self.get_position())[0] # get the coords of neighbours
-                neighbours_wall = lattice.get_neighbours_with_wall(*self.get_position())[1] # get the strengths of neighbouring cells
-                num_ones = neighbours_wall.count(1)                
-                num_twos = neighbours_wall.count(2)
-                num_other = divisor - num_twos - num_ones
-                index_ones = [i for i, x in enumerate(neighbours_wall) if (x == 1)]
-                index_twos = [i for i, x in enumerate(neighbours_wall) if x == 2]
-                index_other = [i for i, x in enumerate(neighbours_wall) if (x == 0)]
-
-                p_over_wall = num_twos*site2*diffusion_prob/divisor # probability of jumping over the wall
-                p_zero = num_other*site0*diffusion_prob/divisor # probability of moving to a 0
-                p_ones = num_ones*diffusion_prob/divisor # probability of moving along the wall
-                p_stay = 1 - (p_over_wall + p_zero + p_ones)
-                probabilities = [p_zero, p_ones, p_over_wall, p_stay]
-                prob_index = random.choices(range(len(probabilities)), weights=probabilities)[0] # choose a probability and return its index
-
-                landing_spots = []
-                if prob_index == 0:
-                    for index in index_other:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-
-                elif prob_index == 1:
-                    for index in index_ones:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-                    
-                elif prob_index == 2:
-                    for index in index_twos:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-
-                else:
-                    if first_time:
-                        self.coupled = True
-                    else:
-                        self.couple_with_wall(lattice)
-
-            if grid[y_cur][x_cur] == 2:
-                neighbours_grid = lattice.get_neighbours_with_wall(*self.get_position())[0] # get the coords of neighbours
-                neighbours_wall = lattice.get_neighbours_with_wall(*self.get_position())[1] # get the strengths of neighbouring cells
-                num_ones = neighbours_wall.count(1)
-                num_twos = neighbours_wall.count(2)
-                num_other = divisor - num_twos - num_ones
-                index_ones = [i for i, x in enumerate(neighbours_wall) if (x == 1)]
-                index_twos = [i for i, x in enumerate(neighbours_wall) if x == 2]
-                index_other = [i for i, x in enumerate(neighbours_wall) if (x == 0)]
-
-                p_over_wall = num_ones*site0*diffusion_prob/divisor # probability of jumping over the wall
-                p_zero = num_other*site0*diffusion_prob/divisor # probability of moving to a 0
-                p_twos = num_twos*diffusion_prob/divisor # probability of moving along the wall
-                p_stay = 1 - (p_over_wall + p_zero + p_twos)
-                probabilities = [p_zero, p_over_wall, p_twos, p_stay]
-                prob_index = random.choices(range(len(probabilities)), weights=probabilities)[0] # choose a probability and return its index
-
-                landing_spots = []
-                if prob_index == 0:
-                    for index in index_other:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-
-                elif prob_index == 1:
-                    for index in index_ones:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-
-                elif prob_index == 2:
-                    for index in index_twos:
-                        landing_spots.append(neighbours_grid[index])
-                    x_new, y_new = random.choice(landing_spots)
-                    lattice.move_monomer(self, x_new, y_new)
-
-            else:
-                if random.random() < diffusion_prob and not self.nucleating and not self.coupled: # based on the probability, decide if diffuse or not
-                    neighbours = lattice.get_neighbours(*self.get_position())
-                    x_new, y_new = random.choice(neighbours)
-                    lattice.move_monomer(self, x_new, y_new)        
-            
-     
-        except AttributeError:
-            if random.random() < diffusion_prob and not self.nucleating and not self.coupled: # based on the probability, decide if diffuse or not
-                neighbours = lattice.get_neighbours(*self.get_position())
-                x_new, y_new = random.choice(neighbours)
-                lattice.move_monomer(self, x_new, y_new)
-            
-
+        counters = lattice.counters
+        if counters is not None and not self.coupled:
+            counters.diffusion_attempts += 1
+        substrate = lattice.substrate
+        if substrate is not None:
+            # biased hop on a substrate potential, drawn from the precomputed alias tables (see substrate.py)
+            u = random.random() * 7
+            if not self.nucleating and not self.coupled:
+                probability, accept, alias = substrate.hop_table(diffusion_prob)
+                x, y = self.position
+                k = int(u)
+                i = 7 * (y * lattice.width + x) + k
+                target = accept[i] if u - k < probability[i] else alias[i]
+                if target >= 0: # -1 means the monomer stays
+                    lattice.move_monomer(self, target % lattice.width, target // lattice.width)
+                    if counters is not None and self.position != (x, y): # move_monomer refuses occupied targets
+                        counters.diffusion_accepted += 1
+            return
+        if random.random() < diffusion_prob and not self.nucleating and not self.coupled: # based on the probability, decide if diffuse or not
+            neighbours = lattice.get_neighbours(*self.get_position())
+            x_new, y_new = random.choice(neighbours)
+            lattice.move_monomer(self, x_new, y_new)
+            if counters is not None and self.position == (x_new, y_new): # move_monomer refuses occupied targets
+                counters.diffusion_accepted += 1
 
     def rotate(self, lattice):
         rotation_prob = self.rotation_probability(lattice)
+        counters = lattice.counters
+        if counters is not None and not self.coupled:
+            counters.rotation_attempts += 1
         if random.random() < rotation_prob:
             if random.random() < 0.5:
                 self.rotations += 1
             else:
                 self.rotations -= 1
+            if counters is not None:
+                counters.rotation_index_changes += 1
         if random.random() < rotation_prob:
             self.set_orientation(random.choice([o for o in self.orientations if not o == self.orientation]))
+            if counters is not None:
+                counters.rotation_accepted += 1
 
     def couple(self, lattice):
         """
@@ -174,18 +105,27 @@ class Monomer:
         """
         c_rate = self.coupling_probability(lattice)
         if random.random() < c_rate:
+            counters = lattice.counters
             x, y = self.get_position()
             next_nearest = lattice.get_next_nearest_neighbours(x, y, self.orientation)
             candidates = [
                 lattice.grid[ny][nx] for nx, ny in next_nearest
                 if lattice.grid[ny][nx] and lattice.grid[ny][nx].orientation != self.orientation
             ]
+            if counters is not None:
+                counters.coupling_attempts += 1
+                if not candidates:
+                    counters.coupling_no_partner += 1
             if candidates:
                 partner = random.choice(candidates)
                 halogen_bool = self.get_halogenation(lattice, partner)
                 if halogen_bool==1 or halogen_bool==None:
+                    if counters is not None:
+                        counters.coupling_rejected_halogenation += 1
                     return
                 self.couple_with(partner)
+                if counters is not None:
+                    counters.coupling_accepted += 1
             
     def calculate_diffusion_rate(self, lattice):
         """
@@ -456,6 +396,8 @@ class Monomer:
             
             if random.random() < rate:
                 sites[i] = False
+                if lattice.counters is not None:
+                    lattice.counters.dehalogenation_events += 1
         self.site1=sites[0]
         self.site2=sites[1]
         self.site3=sites[2]
@@ -2,72 +2,167 @@
 
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from matplotlib.patches import RegularPolygon, Circle
-import math
-
-def update_hexagonal_grid(lattice, monomers, ax):
+from matplotlib.collections import PolyCollection, EllipseCollection
+from matplotlib.colors import to_rgba
+import numpy as np
+import os
+import shutil
+import tempfile
+import weakref
+from trajectory import TrajectoryRecorder, TrajectoryReader
+
+BLUE = np.array(to_rgba("blue"))
+RED = np.array(to_rgba("red"))
+
+def hexagonal_positions(x, y):
     """
-    Updates the hexagonal grid to reflect the current state of the monomer's position.
-    Each hexagonal grid point is represented by a circle.
+    Plot coordinates of lattice sites: odd rows are shifted by half a site to create the staggered hexagonal effect.
     """
-    ax.clear()
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return x + 0.5 * (y % 2 != 0), y
 
-    """ # Loop through all valid lattice coordinates and plot circles at each point
-    for (x, y) in lattice.lattice_coord:
-        # Adjust x-position to create the staggered hexagonal effect
-        x_offset = x + 0.5 if y % 2 != 0 else x
+def triangle_vertices(x, y, orientation, radius):
+    """
+    Vertices of the monomer triangles as an (N, 3, 2) array, the same triangles as RegularPolygon(numVertices=3) draws.
 
-        ax.add_patch(plt.Circle((x_offset, y), 0.3, facecolor='lightgray', edgecolor='black', lw=1))
+    Args:
+        x, y (array): Plot coordinates of the triangle centres.
+        orientation (array): Orientations in degrees.
+        radius (float): Distance from the centre to the vertices.
     """
+    angles = np.radians(np.asarray(orientation, dtype=float))[:, None] + np.pi / 2 + 2 * np.pi / 3 * np.arange(3)
+    return np.stack([x[:, None] + radius * np.cos(angles), y[:, None] + radius * np.sin(angles)], axis=-1)
+
+def monomer_arrays(monomers):
+    '''
+    Positions, orientations and coupled flags of the monomers as arrays.
+    '''
+    x = np.fromiter((monomer.position[0] for monomer in monomers), dtype=float, count=len(monomers))
+    y = np.fromiter((monomer.position[1] for monomer in monomers), dtype=float, count=len(monomers))
+    orientation = np.fromiter((monomer.get_orientation() for monomer in monomers), dtype=float, count=len(monomers))
+    coupled = np.fromiter((bool(monomer.coupled) for monomer in monomers), dtype=bool, count=len(monomers))
+    return x, y, orientation, coupled
+
+def state_arrays(states, width):
+    '''
+    Same as monomer_arrays, for a recorded lattice state (see trajectory.py).
+    '''
+    sites = np.flatnonzero(states)
+    occupied = states[sites]
+    y, x = np.divmod(sites, width)
+    orientation = np.where((occupied == 1) | (occupied == 3), 0.0, 180.0) # see trajectory.state_orientation
+    return x, y, orientation, occupied >= 3
+
+def monomer_collection(x, y, orientation, coupled, radius=0.6, lw=2):
+    """
+    All monomers as a single PolyCollection: blue triangles for coupled and red for uncoupled monomers.
+    """
+    x_plot, y_plot = hexagonal_positions(x, y)
+    return PolyCollection(triangle_vertices(x_plot, y_plot, orientation, radius), facecolors=np.where(coupled[:, None], BLUE, RED),
+                          edgecolors="black", linewidths=lw)
 
-    # Plot the monomers' positions
-    for monomer in monomers:
-        x_mon, y_mon = monomer.position
-        x_mon = x_mon + 0.5 if y_mon % 2 != 0 else x_mon
-
-        orientation = monomer.get_orientation()
-
-        color = "blue" if monomer.coupled else "red"
-        triangle = RegularPolygon(
-            (x_mon, y_mon),
-            numVertices=3,
-            radius=0.6,
-            orientation=math.radians(orientation),
-            facecolor=color,
-            edgecolor="black",
-            lw=2
-        )
-        
-        ax.add_patch(triangle)
-
-    ax.set_xlim(-0.5, lattice.width)
-    ax.set_ylim(-0.5, lattice.height)
+def site_collection(ax, width, height, size=0.4):
+    """
+    All lattice sites as a single EllipseCollection of light gray circles.
+    """
+    y, x = np.divmod(np.arange(width * height), width)
+    offsets = np.column_stack(hexagonal_positions(x, y))
+    return EllipseCollection(size, size, 0, units="xy", offsets=offsets, offset_transform=ax.transData,
+                             facecolors="lightgray", edgecolors="black", linewidths=1)
+
+def format_lattice_axes(ax, width, height):
+    ax.set_xlim(-0.5, width)
+    ax.set_ylim(-0.5, height)
     ax.set_aspect('equal')  # Keep the aspect ratio so circles don't look squashed
     ax.grid(False)  # Disable the grid lines
     ax.set_xticks([])
     ax.set_yticks([])
 
-def run_actions(lattice, monomers, first_time):
+def update_hexagonal_grid(lattice, monomers, ax):
+    """
+    Updates the hexagonal grid to reflect the current state of the monomer's position.
+    """
+    ax.clear()
+    ax.add_collection(monomer_collection(*monomer_arrays(monomers)))
+    format_lattice_axes(ax, lattice.width, lattice.height)
+
+def update_hexagonal_grid_from_states(states, width, ax):
+    """
+    Same as update_hexagonal_grid, but draws a recorded lattice state (see trajectory.py) instead of live monomers.
+    """
+    ax.clear()
+    ax.add_collection(monomer_collection(*state_arrays(states, width)))
+    format_lattice_axes(ax, width, width)
+
+def animate_trajectory(path, step=1, interval=10, save_path=None):
+    """
+    Replay a recorded trajectory (see trajectory.py) as an animation, without re-running the simulation.
+
+    The monomers are one PolyCollection whose vertices and colours are replaced every frame, and the animation is blitted,
+    so only the collection is redrawn.
+
+    Args:
+        path (str): Base path of the trajectory files.
+        step (int): Number of recorded frames between animation frames.
+        interval (int): Delay between animation frames in ms.
+        save_path (str): If given, the animation is saved there instead of being shown.
+    """
+    reader = TrajectoryReader(path)
+    frames = reader.frames(step=step)
+    fig, ax = plt.subplots()
+    collection = PolyCollection([], edgecolors="black", linewidths=2, animated=True)
+    ax.add_collection(collection)
+    format_lattice_axes(ax, reader.width, reader.width)
+
+    def update(states):
+        x, y, orientation, coupled = state_arrays(states, reader.width)
+        x_plot, y_plot = hexagonal_positions(x, y)
+        collection.set_verts(triangle_vertices(x_plot, y_plot, orientation, 0.6))
+        collection.set_facecolor(np.where(coupled[:, None], BLUE, RED))
+        return (collection,)
+
+    ani = animation.FuncAnimation(fig, update, frames=frames, interval=interval, save_count=len(range(0, len(reader), step)),
+                                  cache_frame_data=False, blit=True)
+    if save_path is not None:
+        ani.save(save_path)
+    else:
+        plt.show()
+    return ani
+
+def run_actions(lattice, monomers, first_time, recorder=None):
     """Perform diffusion and update the hexagonal plot."""
     for monomer in monomers:
         monomer.action(lattice, first_time)
-
-def update_plot(frame, lattice, monomers, ax):
-    run_actions(lattice, monomers)
-    update_hexagonal_grid(lattice, monomers, ax)
+        if recorder is not None:
+            recorder.track(monomer)
 
 def all_monomers_coupled(monomers):
     # stopping condition - when all monomers have coupled together
     return all(monomer.coupled for monomer in monomers)
 
-def plot_simulation(lattice, monomers, max_steps=1000, animate=False):
+def plot_simulation(lattice, monomers, max_steps=1000, animate=False, trajectory_path=None):
     """
     Sets up the plot and runs the animation based on the current state of the simulation.
+
+    Args:
+        trajectory_path (str): Base path of the recorded trajectory files when animating, which are then kept. By default
+            they go to a temporary folder that is removed once the animation is garbage collected.
     """
+    recorder = None
+    if animate:
+        # record the run so that the animation replays what was actually simulated
+        directory = None
+        path = trajectory_path
+        if path is None:
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, "trajectory")
+        recorder = TrajectoryRecorder(path, lattice)
+
     steps = 0
     first_time = True
     while steps < max_steps:
-        run_actions(lattice, monomers, first_time)
+        run_actions(lattice, monomers, first_time, recorder)
         first_time = False
         if all_monomers_coupled(monomers):
             print(f"Termination condition reached after {steps + 1} steps.")
@@ -76,11 +171,11 @@ def plot_simulation(lattice, monomers, max_steps=1000, animate=False):
         steps += 1
 
     if animate:
-        fig, ax = plt.subplots()
-
-        ani = animation.FuncAnimation(fig, update_plot, fargs=(lattice, monomers, ax), interval=10, frames = 20) #  blit=True
-
-        plt.show()
+        recorder.close()
+        ani = animate_trajectory(path)
+        if directory is not None:
+            weakref.finalize(ani, shutil.rmtree, directory, ignore_errors=True)
+        return ani
     else:
         plot_final_state(lattice, monomers)
 
@@ -95,49 +190,22 @@ def plot_analysis_results(neighbor_frequencies, effective_radius, lattice, monom
     fig, ax = plt.subplots(1, 2, figsize=(14, 7)) 
 
     ax[0].clear()
-    
-    # loop through all valid lattice coordinates and plot circles at each point
-    for (x, y) in lattice.lattice_coord:
-        x_offset = x + 0.5 if y % 2 != 0 else x  # adjust for hexagonal staggered rows
-        ax[0].add_patch(plt.Circle((x_offset, y), 0.2, facecolor='lightgray', edgecolor='black', lw=1))
 
-    # plot the monomers' positions
-    for monomer in monomers:
-        x_mon, y_mon = monomer.position
-        if y_mon % 2 != 0:
-            x_mon += 0.5  # offset for odd rows
-
-        orientation = monomer.get_orientation()
-        color = "blue" if monomer.coupled else "red"
-        triangle = RegularPolygon(
-            (x_mon, y_mon),
-            numVertices=3,
-            radius=1,
-            orientation=math.radians(orientation),
-            facecolor=color,
-            edgecolor="black",
-            lw=2
-        )
-        ax[0].add_patch(triangle)
+    # all lattice sites as one collection of circles, the monomers as one collection of triangles
+    ax[0].add_collection(site_collection(ax[0], lattice.width, lattice.height))
+    x, y, orientation, coupled = monomer_arrays(monomers)
+    ax[0].add_collection(monomer_collection(x, y, orientation, coupled, radius=1))
 
     # calculate the center of mass for the polymer
-    x_positions = [monomer.position[0] for monomer in monomers]
-    y_positions = [monomer.position[1] for monomer in monomers]
-    
-    x_center_of_mass = sum(x_positions) / len(x_positions)
-    y_center_of_mass = sum(y_positions) / len(y_positions)
+    x_center_of_mass = x.mean()
+    y_center_of_mass = y.mean()
 
     # add the circle representing the radius of gyration
     #circle = Circle((x_center_of_mass, y_center_of_mass), effective_radius, fill=False, color='green', lw=2, linestyle='--')
     #ax[0].add_patch(circle)
     
     #ax[0].set_title('Polymer Structure with Radius of Gyration')
-    ax[0].set_xlim(-0.5, lattice.width)
-    ax[0].set_ylim(-0.5, lattice.height)
-    ax[0].set_aspect('equal')
-    ax[0].grid(False)
-    ax[0].set_xticks([]) # get rid of tick marks
-    ax[0].set_yticks([])
+    format_lattice_axes(ax[0], lattice.width, lattice.height)
 
     # plot the histogram of neighbor frequencies on the second axis
     labels = sorted(neighbor_frequencies.keys())
@@ -0,0 +1,231 @@
+# src/result_cache.py
+
+"""
+Content-addressed cache for per-replica simulation results.
+
+A replica is identified by a hash of everything that determines its outcome: the monomer and defect parameters, the
+lattice configuration, the seed and a fingerprint of the simulation source code. Re-running a sweep (or a widened
+version of it) then only simulates the points that are not in the cache yet.
+
+The cache is a single SQLite file. Entries are evicted least-recently-used first once the stored results exceed
+max_bytes. Every lookup is logged so hits and misses can be listed afterwards:
+
+    python result_cache.py stats --cache result_cache.sqlite
+    python result_cache.py log --cache result_cache.sqlite --misses
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+# modules whose source determines the outcome of a simulation
+ENGINE_MODULES = ["lattice.py", "geometry.py", "monomer.py", "defect.py", "analysis.py", "snapshot.py", "substrate.py"]
+# main.py is also the sweep driver, whose settings are edited in main(); only its engine functions are fingerprinted, so
+# widening a sweep there does not invalidate the cache
+ENGINE_FUNCTIONS = {"main.py": ["initialize_dimer", "introduce_new_monomer", "create_defects", "slow_growth_simulation",
+                                "analyze_replica", "run_replica", "run_forked_replicas"]}
+
+_CODE_VERSION = None
+
+def function_sources(path, names):
+    '''
+    Source code of the named top-level functions of a module, read without importing it.
+    '''
+    import ast
+    with open(path) as file:
+        source = file.read()
+    functions = {node.name: ast.get_source_segment(source, node) for node in ast.parse(source).body if isinstance(node, ast.FunctionDef)}
+    return [functions.get(name, "") for name in names]
+
+def code_version():
+    '''
+    Fingerprint of the simulation source code. Any edit to the engine modules or engine functions changes it and so
+    invalidates old entries.
+    '''
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ENGINE_MODULES:
+            path = os.path.join(here, name)
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    digest.update(name.encode())
+                    digest.update(file.read())
+        for name, functions in ENGINE_FUNCTIONS.items():
+            path = os.path.join(here, name)
+            if os.path.exists(path):
+                digest.update(name.encode())
+                for function, source in zip(functions, function_sources(path, functions)):
+                    digest.update(function.encode())
+                    digest.update(source.encode())
+        _CODE_VERSION = digest.hexdigest()[:16]
+    return _CODE_VERSION
+
+def _json_default(value):
+    # numpy scalars (e.g. from np.linspace) are converted to plain Python numbers
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Cannot hash value of type {type(value).__name__}")
+
+def replica_key(monomer_params, defect_params, defect_density, lattice_config, total_monomers, seed, max_steps=1e6, version=None, extra=None):
+    """
+    Compute the cache key of a single replica.
+
+    Args:
+        monomer_params (list): Parameters passed to Monomer().
+        defect_params (list): Parameters passed to Defect().
+        defect_density (float): Defect density on the lattice.
+        lattice_config (dict): Lattice configuration (width, rotational_symmetry, periodic, temperature).
+        total_monomers (int): Number of monomers grown.
+        seed (int): Seed of the replica.
+        max_steps (float): Step limit per monomer.
+        version (str): Code version; defaults to code_version().
+        extra (dict): Any further settings that change the outcome (e.g. how the replica was forked).
+
+    Returns:
+        str: Hex digest identifying the replica.
+    """
+    description = {
+        "monomer_params": list(monomer_params),
+        "defect_params": list(defect_params),
+        "defect_density": defect_density,
+        "lattice": dict(lattice_config),
+        "total_monomers": total_monomers,
+        "max_steps": max_steps,
+        "seed": seed,
+        "code": version or code_version(),
+    }
+    if extra:
+        description["extra"] = extra
+    encoded = json.dumps(description, sort_keys=True, default=_json_default)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class ResultCache:
+    def __init__(self, path, max_bytes=512 * 1024**2, max_log=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_log = max_log
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                description TEXT,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+            CREATE TABLE IF NOT EXISTS lookups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                time REAL NOT NULL,
+                key TEXT NOT NULL,
+                hit INTEGER NOT NULL,
+                description TEXT
+            );
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, key, description=None):
+        '''
+        Return the cached value for key, or None on a miss. The lookup is recorded in the hit/miss log.
+        '''
+        now = time.time()
+        row = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        with self.connection:
+            if row is not None:
+                self.connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self.connection.execute("INSERT INTO lookups (time, key, hit, description) VALUES (?, ?, ?, ?)",
+                                    (now, key, int(row is not None), description))
+        return pickle.loads(row[0]) if row is not None else None
+
+    def put(self, key, value, description=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO entries (key, value, size, description, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                                    (key, blob, len(blob), description, now, now))
+        self.evict()
+
+    def __contains__(self, key):
+        return self.connection.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def total_bytes(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        '''
+        Drop least-recently-used entries until the cache fits into max_bytes, and trim the lookup log to max_log rows.
+        '''
+        with self.connection:
+            excess = self.total_bytes() - self.max_bytes
+            if excess > 0:
+                freed = 0
+                victims = []
+                for key, size in self.connection.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self.connection.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self.connection.execute("DELETE FROM lookups WHERE id <= (SELECT MAX(id) FROM lookups) - ?", (self.max_log,))
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("DELETE FROM lookups")
+
+    def stats(self):
+        entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits, lookups = self.connection.execute("SELECT COALESCE(SUM(hit), 0), COUNT(*) FROM lookups").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": hits, "misses": lookups - hits}
+
+    def lookups(self, hits=True, misses=True, limit=None):
+        '''
+        Return the logged lookups as (time, key, hit, description) tuples, most recent first.
+        '''
+        condition = {(True, True): "1", (True, False): "hit = 1", (False, True): "hit = 0", (False, False): "0"}[(hits, misses)]
+        query = f"SELECT time, key, hit, description FROM lookups WHERE {condition} ORDER BY id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return self.connection.execute(query).fetchall()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the simulation result cache.")
+    parser.add_argument("command", choices=["stats", "log", "clear"])
+    parser.add_argument("--cache", default="result_cache.sqlite", help="path to the cache file")
+    parser.add_argument("--hits", action="store_true", help="only list cache hits")
+    parser.add_argument("--misses", action="store_true", help="only list cache misses")
+    parser.add_argument("--limit", type=int, default=50, help="number of lookups to list (0 for all)")
+    args = parser.parse_args(argv)
+
+    with ResultCache(args.cache) as cache:
+        if args.command == "stats":
+            stats = cache.stats()
+            print(f"{stats['entries']} entries, {stats['bytes'] / 1024**2:.1f} MiB of {stats['max_bytes'] / 1024**2:.0f} MiB")
+            print(f"{stats['hits']} hits, {stats['misses']} misses")
+        elif args.command == "log":
+            both = args.hits == args.misses
+            for t, key, hit, description in cache.lookups(hits=both or args.hits, misses=both or args.misses, limit=args.limit or None):
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+                print(f"{stamp}  {'HIT ' if hit else 'MISS'}  {key[:12]}  {description or ''}")
+        elif args.command == "clear":
+            cache.clear()
+            print(f"Cleared {args.cache}")
+
+if __name__ == "__main__":
+    main()
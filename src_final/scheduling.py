@@ -0,0 +1,184 @@
+# src/scheduling.py
+
+"""
+Cost model, longest-first ordering and progress reporting for sweep tasks (see sweep.py and work_queue.py).
+
+The runtime of a replica is dominated by the number of steps its walkers need before they couple. Monomer.action draws
+every event against rate * exp(-E / k_B T), which is a probability of 1 for barriers below about 1.55 eV at 600 K and
+falls off exponentially above that. A walker first has to find the island (about L^2 ln L steps on an L x L lattice,
+divided by the diffusion probability) and then win a coupling draw before it wanders off again; every step also runs
+the dehalogenation loop over all monomers of the island. The model
+
+    work = L^2 ln L * (1 / p_diffusion + 1 / (3 p_coupling)) + 1 / p_dehalogenation  steps per walker,
+           times (N + N^2 / 4) for the island of N monomers
+
+ranks the points of a sweep (the factor 3 and the quadratic term were read off test runs). The runtime is predicted as
+seconds = exp(alpha) * work^beta, and alpha and beta are refitted to the measured runtimes as tasks finish (a ridge fit in
+log space that keeps beta near 1 while there are few measurements). Points with measured replicas are predicted from
+their own mean runtime instead.
+
+Tasks are run longest-expected-first, which keeps the slowest points from being left until the end, and static shards
+are filled greedily by expected cost (LPT) instead of round robin.
+"""
+
+import math
+import time
+from monomer import k_B
+
+SECONDS_PER_UNIT = 2e-7 # prior, from test runs on a single core
+
+def event_probability(rate, energy, temperature=600):
+    '''
+    Probability per step with which Monomer.action accepts an event (see Monomer.diffusion_probability).
+    '''
+    return min(1.0, rate * math.exp(-energy / (k_B * temperature)))
+
+def expected_work(monomer_params, width, monomers, temperature=600):
+    """
+    Expected work of growing one island, in arbitrary units proportional to runtime.
+
+    Args:
+        monomer_params (list): Parameters passed to Monomer().
+        width (int): Lattice width.
+        monomers (int): Number of monomers in the island.
+        temperature (float): Lattice temperature in K.
+    """
+    _, diffusion_rate, diffusion_energy, _, _, coupling_rate, coupling_energy, dehalogen_rate, dehalogen_energy = monomer_params
+    p_diffusion = max(event_probability(diffusion_rate, diffusion_energy, temperature), 1e-300)
+    p_coupling = max(event_probability(coupling_rate, coupling_energy, temperature), 1e-300)
+    p_dehalogenation = max(event_probability(dehalogen_rate, dehalogen_energy, temperature), 1e-300)
+    steps = width**2 * math.log(width) * (1 / p_diffusion + 1 / (3 * p_coupling)) + 1 / p_dehalogenation
+    return steps * (monomers + monomers**2 / 4)
+
+class CostModel:
+    '''
+    Predicted runtime of the replicas of a sweep, refined with the measured runtimes of finished replicas.
+    '''
+    def __init__(self, spec, seconds_per_unit=SECONDS_PER_UNIT, stiffness=1.0):
+        '''
+        Args:
+            spec (dict): Sweep spec (see sweep.load_spec).
+            seconds_per_unit (float): Prior runtime per unit of expected_work.
+            stiffness (float): Weight of the prior beta = 1 in the fit.
+        '''
+        self.width = spec["width"]
+        self.monomers = spec["monomers"]
+        self.stiffness = stiffness
+        self.alpha = math.log(seconds_per_unit)
+        self.beta = 1.0
+        # running sums of the fit over the (log work, log seconds) of all measured replicas, so observe() is O(1)
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.measured = {} # point -> [sum of log seconds, count] of its finished replicas
+
+    def log_work(self, monomer_params):
+        return math.log(expected_work(monomer_params, self.width, self.monomers))
+
+    def observe(self, monomer_params, seconds):
+        '''
+        Add the measured runtime of a finished replica and refit.
+        '''
+        x = self.log_work(monomer_params)
+        y = math.log(max(seconds, 1e-6))
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+        measured = self.measured.setdefault(tuple(monomer_params), [0.0, 0])
+        measured[0] += y
+        measured[1] += 1
+        self.fit()
+
+    def fit(self):
+        # least squares of log seconds = alpha + beta * log work, with a penalty stiffness * (beta - 1)^2
+        a, b, c = self.n, self.sx, self.sxx + self.stiffness
+        determinant = a * c - b * b
+        if self.n == 0 or abs(determinant) < 1e-12:
+            return
+        self.alpha = (c * self.sy - b * (self.sxy + self.stiffness)) / determinant
+        self.beta = (a * (self.sxy + self.stiffness) - b * self.sy) / determinant
+
+    def predict(self, monomer_params):
+        '''
+        Expected runtime of one replica in seconds.
+        '''
+        measured = self.measured.get(tuple(monomer_params))
+        if measured:
+            return math.exp(measured[0] / measured[1])
+        return math.exp(self.alpha + self.beta * self.log_work(monomer_params))
+
+def longest_first(tasks, points, model):
+    '''
+    (point, replica) tasks sorted by decreasing predicted runtime; ties keep the sweep order.
+    '''
+    return sorted(tasks, key=lambda task: -model.predict(points[task[0]]))
+
+COST_UNITS = 10**6 # resolution of the shard split, relative to the most expensive task
+
+def balanced_shards(tasks, points, model, count):
+    """
+    Split the tasks into count shards of about equal predicted runtime (longest processing time first: each task goes to
+    the shard with the least work so far). Only depends on the spec, so every node computes the same split.
+
+    The predicted runtimes are rounded to integer units of COST_UNITS-th of the largest one, and ties (e.g. the replicas
+    of a point) are broken by (point, replica), so the split does not depend on the last bits of exp and log, which can
+    differ between platforms.
+
+    Returns:
+        list of list: The tasks of every shard, longest first.
+    """
+    costs = {point: model.predict(points[point]) for point in {point for point, _ in tasks}}
+    largest = max(costs.values(), default=1.0)
+    units = {point: max(1, round(COST_UNITS * cost / largest)) for point, cost in costs.items()}
+    shards = [[] for _ in range(count)]
+    loads = [0] * count
+    for task in sorted(tasks, key=lambda task: (-units[task[0]], task)):
+        shard = loads.index(min(loads))
+        shards[shard].append(task)
+        loads[shard] += units[task[0]]
+    return shards
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    if seconds < 86400:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 86400}d{seconds % 86400 // 3600:02d}h"
+
+class Progress:
+    '''
+    Throughput and estimated time to completion of a running sweep.
+    '''
+    def __init__(self, model, total, done=0, workers=1):
+        self.model = model
+        self.total = total
+        self.done = done
+        self.completed = 0 # finished since start
+        self.workers = workers
+        self.start = time.time()
+
+    def finished(self, monomer_params, seconds):
+        self.model.observe(monomer_params, seconds)
+        self.done += 1
+        self.completed += 1
+
+    def throughput(self):
+        '''
+        Simulations per hour since start.
+        '''
+        elapsed = time.time() - self.start
+        return 3600 * self.completed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, remaining):
+        '''
+        Seconds until the remaining tasks (monomer params of each) are done, spread over the workers.
+        '''
+        return sum(self.model.predict(monomer_params) for monomer_params in remaining) / max(self.workers, 1)
+
+    def report(self, remaining):
+        return (f"{self.done}/{self.total} done, {self.throughput():.1f} simulations/h, "
+                f"ETA {format_duration(self.eta(remaining))}")
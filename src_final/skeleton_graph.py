@@ -0,0 +1,216 @@
+# src/skeleton_graph.py
+
+"""
+Extraction of the junction graph of an STM island from its skeleton, as done by hand in STM-Island-Analysis.ipynb, in
+vectorized form.
+
+    1. Every skeleton pixel's 8-neighbour count comes from a single 3x3 convolution. Pixels with more than two
+       neighbours are junctions (the nodes of the graph), pixels with one neighbour are endpoints.
+    2. Removing the junctions splits the skeleton into branches. The branches are the connected components of the
+       pixel-adjacency sparse matrix, which scipy labels iteratively (no recursion, so long branches are fine). Two
+       junctions are connected if they touch the same branch or touch each other.
+    3. Junctions closer than `threshold` pixels are merged into one node at their rounded mean position. Close pairs come
+       from cKDTree.query_pairs and are merged transitively.
+    4. Nodes without edges are dropped. The notebook built its graph from the edge list, so it never had them, and
+       keeping them would change the node count, radius of gyration and degree histogram.
+
+Nodes are returned as an (N, 2) array of (row, column) pixel positions and edges as an (M, 2) array of node indices.
+
+Example:
+    python skeleton_graph.py STM02.bmp
+"""
+
+import argparse
+import csv
+import os
+import numpy as np
+from scipy import ndimage, sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+NEIGHBOUR_KERNEL = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
+OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+def load_skeleton(image_path, threshold=0.5):
+    '''
+    Grayscale -> threshold -> skeletonize, as in the notebook. The threshold is on the [0, 1] intensity scale for both
+    RGB and grayscale images.
+    '''
+    from skimage import io
+    from skimage.color import rgb2gray
+    from skimage.morphology import skeletonize
+    from skimage.util import img_as_float
+
+    image = io.imread(image_path)
+    if image.ndim == 3:
+        image = rgb2gray(image[..., :3])
+    return skeletonize(img_as_float(image) > threshold)
+
+def classify_pixels(skeleton):
+    """
+    Classify skeleton pixels by their number of 8-neighbours.
+
+    Returns:
+        tuple: (neighbour counts, junction mask, endpoint mask)
+    """
+    skeleton = np.asarray(skeleton, dtype=bool)
+    counts = ndimage.convolve(skeleton.astype(np.uint8), NEIGHBOUR_KERNEL, mode="constant")
+    counts = np.where(skeleton, counts, 0)
+    return counts, skeleton & (counts > 2), skeleton & (counts == 1)
+
+def adjacent_pairs(mask_a, mask_b):
+    '''
+    All (flat index in a, flat index in b) pairs of 8-adjacent pixels with the first pixel in mask_a and the second in mask_b.
+    '''
+    height, width = mask_a.shape
+    pairs = []
+    for dy, dx in OFFSETS:
+        # pixel (y, x) in a and (y + dy, x + dx) in b
+        a = mask_a[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+        b = mask_b[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+        y, x = np.nonzero(a & b)
+        y, x = y + max(0, -dy), x + max(0, -dx)
+        pairs.append(np.column_stack([y * width + x, (y + dy) * width + x + dx]))
+    return np.vstack(pairs)
+
+def junction_graph(skeleton):
+    """
+    Junction pixels of a skeleton and the junction pairs connected by a branch (or directly adjacent).
+
+    Returns:
+        tuple: (junction positions (J, 2), edges (M, 2) as indices into the junctions)
+    """
+    skeleton = np.asarray(skeleton, dtype=bool)
+    _, junctions, _ = classify_pixels(skeleton)
+    branches = skeleton & ~junctions
+
+    junction_index = np.full(skeleton.size, -1, dtype=np.int64)
+    junction_flat = np.flatnonzero(junctions)
+    junction_index[junction_flat] = np.arange(len(junction_flat))
+    positions = np.column_stack(np.unravel_index(junction_flat, skeleton.shape))
+
+    # label the branches over the pixel-adjacency matrix of the branch pixels
+    branch_flat = np.flatnonzero(branches)
+    branch_index = np.full(skeleton.size, -1, dtype=np.int64)
+    branch_index[branch_flat] = np.arange(len(branch_flat))
+    links = adjacent_pairs(branches, branches)
+    adjacency = sparse.coo_matrix((np.ones(len(links), dtype=np.int8), (branch_index[links[:, 0]], branch_index[links[:, 1]])),
+                                  shape=(len(branch_flat), len(branch_flat)))
+    _, labels = connected_components(adjacency, directed=False)
+
+    # junctions touching the same branch are connected
+    touching = adjacent_pairs(branches, junctions)
+    touching = np.unique(np.column_stack([labels[branch_index[touching[:, 0]]], junction_index[touching[:, 1]]]), axis=0)
+    edges = []
+    starts = np.flatnonzero(np.r_[True, touching[1:, 0] != touching[:-1, 0]])
+    for group in np.split(touching[:, 1], starts[1:]):
+        if len(group) > 1:
+            i, j = np.triu_indices(len(group), k=1)
+            edges.append(np.column_stack([group[i], group[j]]))
+
+    # as do junctions touching each other
+    direct = adjacent_pairs(junctions, junctions)
+    edges.append(np.column_stack([junction_index[direct[:, 0]], junction_index[direct[:, 1]]]))
+    edges = np.vstack(edges) if edges else np.zeros((0, 2), dtype=np.int64)
+    return positions, unique_edges(edges)
+
+def unique_edges(edges):
+    '''
+    Undirected edges without duplicates or self-loops, each as (smaller index, larger index).
+    '''
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return np.unique(edges, axis=0)
+
+def merge_close_nodes(positions, edges, threshold=2):
+    """
+    Merge nodes closer than the threshold (in pixels). Merging is transitive: chains of close nodes become one node.
+
+    Returns:
+        tuple: (merged positions (N, 2), merged edges (M, 2))
+    """
+    if len(positions) == 0:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, 2), dtype=np.int64)
+    pairs = cKDTree(positions).query_pairs(threshold, output_type="ndarray")
+    merge = sparse.coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(len(positions), len(positions)))
+    num_nodes, labels = connected_components(merge, directed=False)
+    sizes = np.bincount(labels, minlength=num_nodes)[:, None]
+    sums = np.zeros((num_nodes, 2))
+    np.add.at(sums, labels, positions)
+    merged = np.round(sums / sizes).astype(np.int64)
+    return merged, unique_edges(labels[edges])
+
+def drop_isolated_nodes(positions, edges):
+    '''
+    Remove the nodes without edges and renumber the edges: (positions (N, 2), edges (M, 2)).
+    '''
+    connected = np.unique(edges)
+    index = np.full(len(positions), -1, dtype=np.int64)
+    index[connected] = np.arange(len(connected))
+    return positions[connected], index[edges].reshape(-1, 2)
+
+def skeleton_to_graph(skeleton, threshold=2):
+    '''
+    Merged junction graph of a skeleton, without isolated nodes: (positions (N, 2), edges (M, 2)).
+    '''
+    positions, edges = junction_graph(skeleton)
+    return drop_isolated_nodes(*merge_close_nodes(positions, edges, threshold))
+
+def degree_histogram(positions, edges):
+    '''
+    {degree: number of nodes} over all nodes of the graph.
+    '''
+    degrees = np.bincount(edges.ravel(), minlength=len(positions))
+    values, counts = np.unique(degrees, return_counts=True)
+    return {int(d): int(c) for d, c in zip(values, counts)}
+
+def graph_metrics(positions, edges):
+    """
+    The metrics written by save_graph_metrics_to_csv in the notebook.
+
+    Returns:
+        dict: mean_distance (mean edge length), radius_of_gyration, num_nodes and degree_histogram.
+    """
+    positions = np.asarray(positions, dtype=float)
+    lengths = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1)
+    displacements = positions - positions.mean(axis=0) if len(positions) else positions
+    return {
+        "mean_distance": lengths.mean() if len(lengths) else np.nan,
+        "radius_of_gyration": np.sqrt(np.sum(displacements**2) / len(positions)) if len(positions) else np.nan,
+        "num_nodes": len(positions),
+        "degree_histogram": degree_histogram(positions, edges),
+    }
+
+def save_graph_metrics_to_csv(csv_path, metrics):
+    '''
+    Write the metrics in the graph-metrics CSV format read by experiments.parse_graph_metrics.
+    '''
+    with open(csv_path, mode="w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Metric", "Value"])
+        writer.writerow(["Mean Distance Between Nearest Neighbors", metrics["mean_distance"]])
+        writer.writerow(["Radius of Gyration", metrics["radius_of_gyration"]])
+        writer.writerow(["Number of Nodes", metrics["num_nodes"]])
+        writer.writerow([])
+        writer.writerow(["Degree", "Frequency"])
+        for degree, count in sorted(metrics["degree_histogram"].items()):
+            writer.writerow([degree, count])
+
+def metrics_file_name(image_path):
+    return os.path.splitext(os.path.basename(image_path))[0] + "_graph_metrics.csv"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the junction graph of an STM image and save its graph metrics.")
+    parser.add_argument("image_path")
+    parser.add_argument("-o", "--output", default=None, help="CSV file (defaults to <image>_graph_metrics.csv)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="grayscale threshold before skeletonizing")
+    parser.add_argument("--merge-distance", type=float, default=2, help="junctions closer than this (in pixels) are merged")
+    args = parser.parse_args(argv)
+
+    positions, edges = skeleton_to_graph(load_skeleton(args.image_path, args.threshold), args.merge_distance)
+    output = args.output or metrics_file_name(args.image_path)
+    save_graph_metrics_to_csv(output, graph_metrics(positions, edges))
+    print(f"{len(positions)} nodes and {len(edges)} edges. Metrics saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# src/snapshot.py
+
+"""
+Compact binary snapshots of a growing island, so that a common growth prefix can be simulated once and then continued
+("forked") under several different parameter sets.
+
+A snapshot holds the lattice configuration and, per monomer, its position, orientation, rotation counter, coupling
+state and halogenation sites. Energies are not stored: they are supplied again when the snapshot is restored, which is
+what allows one prefix to be continued with different energy sets.
+"""
+
+import struct
+import numpy as np
+from lattice import Lattice
+from monomer import Monomer
+
+MAGIC = b"KMCS"
+VERSION = 1
+HEADER = struct.Struct("<4sBIBBdIB") # magic, version, width, rotational_symmetry, periodic, temperature, number of monomers, first_time
+
+MONOMER_DTYPE = np.dtype([
+    ("x", "<u2"),
+    ("y", "<u2"),
+    ("orientation", "u1"), # index into Monomer.orientations
+    ("flags", "u1"), # bit 0: coupled, bit 1: nucleating, bits 2-4: halogen sites 1-3
+    ("rotations", "<i4"),
+])
+
+COUPLED, NUCLEATING, SITE1, SITE2, SITE3 = 1, 2, 4, 8, 16
+
+def snapshot_state(lattice, monomers, first_time=False):
+    """
+    Serialize the lattice configuration and monomer state into a compact binary blob.
+
+    Args:
+        lattice (Lattice): The lattice the monomers live on.
+        monomers (list): Monomers of the island (in the order they were added).
+        first_time (bool): Whether the next monomer would still be the first one introduced after the dimer.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    records = np.zeros(len(monomers), dtype=MONOMER_DTYPE)
+    for i, monomer in enumerate(monomers):
+        x, y = monomer.get_position()
+        flags = (COUPLED * monomer.coupled) | (NUCLEATING * monomer.nucleating) | (SITE1 * monomer.site1) | (SITE2 * monomer.site2) | (SITE3 * monomer.site3)
+        records[i] = (x, y, monomer.orientations.index(monomer.get_orientation()), flags, monomer.rotations)
+
+    header = HEADER.pack(MAGIC, VERSION, lattice.width, lattice.rotational_symmetry, int(lattice.periodic), lattice.temperature, len(monomers), int(first_time))
+    return header + records.tobytes()
+
+def restore_state(blob, monomer_params):
+    """
+    Rebuild a lattice and its monomers from a snapshot.
+
+    Args:
+        blob (bytes): Snapshot created by snapshot_state.
+        monomer_params (list): Parameters passed to Monomer() for the restored monomers. These may differ from the
+            parameters the snapshot was grown with.
+
+    Returns:
+        tuple: (lattice, monomers, first_time)
+    """
+    magic, version, width, rotational_symmetry, periodic, temperature, count, first_time = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not a KMC snapshot.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+
+    records = np.frombuffer(blob, dtype=MONOMER_DTYPE, count=count, offset=HEADER.size)
+    lattice = Lattice(width=width, rotational_symmetry=rotational_symmetry, periodic=bool(periodic), temperature=temperature)
+    monomers = []
+    for x, y, orientation, flags, rotations in records.tolist():
+        monomer = Monomer(*monomer_params)
+        monomer.set_orientation(monomer.orientations[orientation])
+        monomer.rotations = rotations
+        monomer.coupled = bool(flags & COUPLED)
+        monomer.nucleating = bool(flags & NUCLEATING)
+        monomer.site1 = bool(flags & SITE1)
+        monomer.site2 = bool(flags & SITE2)
+        monomer.site3 = bool(flags & SITE3)
+        lattice.place_monomer(monomer, x, y)
+        monomers.append(monomer)
+    return lattice, monomers, bool(first_time)
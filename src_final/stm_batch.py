@@ -0,0 +1,174 @@
+# src/stm_batch.py
+
+"""
+Batch processing of STM images into graph-metrics files.
+
+Every image in a folder goes through grayscale -> threshold -> skeletonize -> junction graph -> degree histogram (see
+skeleton_graph.py) in a pool of worker processes. For each image the usual <image>_graph_metrics.csv is written, and all
+images are collected in one summary table (Parquet, or CSV without pyarrow) with one row per image and one column per
+metric and degree.
+
+A manifest in the output folder records the SHA-256 of every processed image together with its metrics, so images whose
+content has not changed since their metrics file was written are skipped on the next run.
+
+Example:
+    python stm_batch.py STM_images/ -o NetworkQualityAnalysis/ --workers 8
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from skeleton_graph import load_skeleton, skeleton_to_graph, graph_metrics, save_graph_metrics_to_csv, metrics_file_name
+
+IMAGE_EXTENSIONS = (".bmp", ".png", ".tif", ".tiff", ".jpg", ".jpeg")
+MANIFEST_NAME = "stm_batch_manifest.json"
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def find_images(folder):
+    return sorted(path for path in glob.glob(os.path.join(folder, "*")) if path.lower().endswith(IMAGE_EXTENSIONS))
+
+def process_image(image_path, output_dir, threshold=0.5, merge_distance=2):
+    '''
+    Extract the graph of one image and write its graph-metrics CSV. Runs in a worker process.
+    '''
+    positions, edges = skeleton_to_graph(load_skeleton(image_path, threshold), merge_distance)
+    metrics = graph_metrics(positions, edges)
+    save_graph_metrics_to_csv(os.path.join(output_dir, metrics_file_name(image_path)), metrics)
+    metrics["mean_distance"] = float(metrics["mean_distance"])
+    metrics["radius_of_gyration"] = float(metrics["radius_of_gyration"])
+    return metrics
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def summary_table(entries):
+    """
+    One row per image with the scalar metrics and one "Degree <k>" column per degree (0 where an image has none).
+    """
+    import pandas as pd
+
+    degrees = sorted({int(d) for entry in entries for d in entry["degree_histogram"]})
+    rows = []
+    for entry in entries:
+        histogram = {int(d): count for d, count in entry["degree_histogram"].items()}
+        row = {
+            "Image": entry["image"],
+            "SHA256": entry["sha256"],
+            "Mean Distance Between Nearest Neighbors": entry["mean_distance"],
+            "Radius of Gyration": entry["radius_of_gyration"],
+            "Number of Nodes": entry["num_nodes"],
+        }
+        row.update({f"Degree {d}": histogram.get(d, 0) for d in degrees})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def save_summary(table, path):
+    '''
+    Write the summary as Parquet if pyarrow is available, otherwise as CSV next to the requested path. Returns the path written.
+    '''
+    if path.endswith(".parquet"):
+        try:
+            table.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = os.path.splitext(path)[0] + ".csv"
+            print(f"pyarrow is not installed, writing the summary as CSV to {path}")
+    table.to_csv(path, index=False)
+    return path
+
+def process_folder(image_dir, output_dir=None, summary_path=None, workers=None, threshold=0.5, merge_distance=2, force=False):
+    """
+    Process every image of a folder.
+
+    Args:
+        image_dir (str): Folder with the STM images.
+        output_dir (str): Folder for the graph-metrics CSVs and the manifest (defaults to image_dir).
+        summary_path (str): Summary table (defaults to <output_dir>_summary.parquet).
+        workers (int): Number of worker processes (defaults to the number of CPUs).
+        threshold (float): Grayscale threshold before skeletonizing.
+        merge_distance (float): Junctions closer than this (in pixels) are merged.
+        force (bool): Reprocess images even if they have not changed.
+
+    Returns:
+        tuple: (summary table, number of images processed, number skipped)
+    """
+    output_dir = output_dir or image_dir
+    os.makedirs(output_dir, exist_ok=True)
+    # next to the output folder rather than in it, so globs over the folder's *.csv only see graph-metrics files
+    summary_path = summary_path or os.path.normpath(output_dir) + "_summary.parquet"
+    manifest = load_manifest(output_dir)
+    settings = {"threshold": threshold, "merge_distance": merge_distance}
+
+    images = find_images(image_dir)
+    todo, entries = [], {}
+    for image_path in images:
+        name = metrics_file_name(image_path)
+        digest = file_hash(image_path)
+        entry = manifest.get(name)
+        if (not force and entry is not None and entry["sha256"] == digest and entry.get("settings") == settings
+                and os.path.exists(os.path.join(output_dir, name))):
+            entries[name] = entry
+        else:
+            todo.append((image_path, name, digest))
+
+    start = time.time()
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(process_image, image_path, output_dir, threshold, merge_distance): (image_path, name, digest)
+                       for image_path, name, digest in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                image_path, name, digest = futures[future]
+                try:
+                    metrics = future.result()
+                except Exception as error: # a broken image should not stop the batch
+                    print(f"[{done}/{len(todo)}] {os.path.basename(image_path)} failed: {error}")
+                    continue
+                metrics["degree_histogram"] = {str(d): c for d, c in metrics["degree_histogram"].items()}
+                entries[name] = manifest[name] = dict(metrics, image=os.path.basename(image_path), sha256=digest, settings=settings)
+                print(f"[{done}/{len(todo)}] {os.path.basename(image_path)}: {metrics['num_nodes']} nodes")
+                if done % 10 == 0:
+                    save_manifest(output_dir, manifest)
+        save_manifest(output_dir, manifest)
+
+    table = summary_table([entries[name] for name in sorted(entries)])
+    written = save_summary(table, summary_path)
+    print(f"Processed {len(todo)} images and skipped {len(images) - len(todo)} unchanged ones in {time.time() - start:.1f} s. Summary saved to {written}")
+    return table, len(todo), len(images) - len(todo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract graph metrics from a folder of STM images.")
+    parser.add_argument("image_dir")
+    parser.add_argument("-o", "--output-dir", default=None, help="folder for the graph-metrics CSVs (defaults to the image folder)")
+    parser.add_argument("--summary", default=None, help="summary table, .parquet or .csv (defaults to <output dir>_summary.parquet)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threshold", type=float, default=0.5, help="grayscale threshold before skeletonizing")
+    parser.add_argument("--merge-distance", type=float, default=2, help="junctions closer than this (in pixels) are merged")
+    parser.add_argument("--force", action="store_true", help="reprocess unchanged images")
+    args = parser.parse_args(argv)
+    process_folder(args.image_dir, args.output_dir, args.summary, args.workers, args.threshold, args.merge_distance, args.force)
+
+if __name__ == "__main__":
+    main()
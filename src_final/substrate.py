@@ -0,0 +1,150 @@
+# src/substrate.py
+
+"""
+Substrate potential maps and biased hops drawn from precomputed Walker alias tables.
+
+A substrate is a potential energy (in eV) per lattice site, e.g. the soliton walls of the herringbone reconstruction of
+Au(111). A walker at site i with diffusion probability p (see Monomer.diffusion_probability, capped at 1) hops to each
+of its n neighbours j with probability
+
+    p / n * min(1, exp(-(V_j - V_i) / k_B T))
+
+(downhill and level hops are not penalised, uphill hops are Boltzmann suppressed) and stays put otherwise. On a flat
+substrate this is exactly the unbiased hop of Monomer.diffuse. The 7 outcomes of every site (6 neighbours and "stay")
+are turned into a Walker alias table once per diffusion probability, so a hop costs one uniform draw and two table
+lookups:
+
+    u = 7 * random.random(); k = int(u)
+    target = accept[7 * site + k] if u - k < probability[7 * site + k] else alias[7 * site + k]    # -1 means stay
+
+Attach a substrate with lattice.substrate = SubstrateMap(...) (or slow_growth_simulation(..., herringbone=True)).
+"""
+
+import math
+import numpy as np
+from monomer import k_B
+
+OUTCOMES = 7 # 6 neighbours and "stay"
+
+def alias_tables(weights):
+    """
+    Walker alias tables of many discrete distributions at once (Vose's method, vectorized over the rows).
+
+    Args:
+        weights (array): (rows, n) non-negative weights; every row sums to 1.
+
+    Returns:
+        tuple: (probability, alias) arrays of shape (rows, n). Column k of a row is drawn with probability[k] and its
+            alias[k] otherwise.
+    """
+    rows, n = weights.shape
+    scaled = weights * n
+    probability = np.ones((rows, n))
+    alias = np.tile(np.arange(n), (rows, 1))
+    done = np.zeros((rows, n), dtype=bool)
+    everything = np.arange(rows)
+    for _ in range(n):
+        small = (scaled < 1.0) & ~done
+        large = (scaled >= 1.0) & ~done
+        active = small.any(axis=1) & large.any(axis=1)
+        if not active.any():
+            break
+        r = everything[active]
+        s = small[r].argmax(axis=1)
+        l = large[r].argmax(axis=1)
+        probability[r, s] = scaled[r, s]
+        alias[r, s] = l
+        done[r, s] = True
+        scaled[r, l] -= 1.0 - scaled[r, s]
+    return probability, alias
+
+class SubstrateMap:
+    '''
+    Per-site potential of a lattice and the hop tables derived from it.
+    '''
+    def __init__(self, geometry, potential, temperature=600):
+        """
+        Args:
+            geometry (LatticeGeometry): Geometry of the lattice (lattice.geometry).
+            potential (array): Potential energy in eV, as a (height, width) array or flat per site index y * width + x.
+            temperature (float): Temperature in K of the lattice.
+        """
+        potential = np.asarray(potential, dtype=float).reshape(-1)
+        if potential.size != geometry.num_sites:
+            raise ValueError(f"The potential has {potential.size} sites, the lattice {geometry.num_sites}")
+        self.geometry = geometry
+        self.potential = potential
+        self.temperature = temperature
+
+        neighbours = np.asarray(geometry.neighbours)
+        valid = neighbours >= 0
+        difference = self.potential[np.where(valid, neighbours, 0)] - self.potential[:, None]
+        # relative hop weight to each neighbour, 0 for neighbours off a non-periodic lattice
+        self.bias = np.where(valid, np.exp(-np.maximum(difference, 0.0) / (k_B * temperature)), 0.0) / valid.sum(axis=1, keepdims=True)
+        self.targets = np.column_stack([np.where(valid, neighbours, -1), np.full(len(neighbours), -1)])
+        self._tables = {}
+
+    def hop_table(self, diffusion_prob):
+        '''
+        (probability, accept, alias) of the hop alias tables for one diffusion probability, as flat lists indexed by
+        7 * site + outcome; accept and alias hold the target site of the outcome, -1 for staying. Computed on first use.
+        '''
+        table = self._tables.get(diffusion_prob)
+        if table is None:
+            hop = min(diffusion_prob, 1.0) * self.bias
+            weights = np.column_stack([hop, np.clip(1.0 - hop.sum(axis=1), 0.0, None)])
+            probability, alias = alias_tables(weights)
+            rows = np.arange(len(weights))[:, None]
+            table = self._tables[diffusion_prob] = (probability.ravel().tolist(), self.targets.ravel().tolist(),
+                                                    self.targets[rows, alias].ravel().tolist())
+        return table
+
+    def hop_probabilities(self, diffusion_prob):
+        '''
+        (sites, 7) probabilities of the hop outcomes, for checking the tables.
+        '''
+        hop = min(diffusion_prob, 1.0) * self.bias
+        return np.column_stack([hop, 1.0 - hop.sum(axis=1)])
+
+def herringbone_potential(width, height=None, period=22, hcp_width=9, wall_width=1.5, wall_height=0.1, hcp_offset=0.02,
+                          elbow_period=0, elbow_angle=120):
+    """
+    Potential of the herringbone reconstruction of Au(111): pairs of soliton walls running along y, which separate the
+    wider fcc stripes from the narrower hcp stripes and zig-zag with elbows every elbow_period / 2 rows.
+
+    Args:
+        width, height (int): Lattice size in sites (height defaults to width).
+        period (float): Distance between neighbouring pairs of walls, in sites (about 6.3 nm on Au(111)).
+        hcp_width (float): Distance between the two walls of a pair, i.e. width of the hcp stripe, in sites.
+        wall_width (float): Gaussian width of a wall, in sites.
+        wall_height (float): Potential on top of a wall, in eV.
+        hcp_offset (float): Potential of the hcp stripes relative to the fcc stripes, in eV.
+        elbow_period (float): Rows between two elbows in the same direction; 0 for straight walls.
+        elbow_angle (float): Angle between the wall segments at an elbow, in degrees.
+
+    Returns:
+        array: (height, width) potential in eV.
+    """
+    height = height or width
+    y, x = np.mgrid[0:height, 0:width].astype(float)
+    x = x + 0.5 * (y % 2) # plot coordinates of the staggered rows, see plotter.hexagonal_positions
+    y = y * math.sqrt(3) / 2
+    if elbow_period:
+        # zig-zag: the walls are tilted by +-(180 - elbow_angle) / 2 from the y axis, alternating every half elbow period
+        half = elbow_period * math.sqrt(3) / 4
+        phase = np.abs((y % (2 * half)) - half) # triangle wave
+        x = x - phase * math.tan(math.radians(180 - elbow_angle) / 2)
+    u = x % period
+    potential = np.zeros_like(u)
+    for wall in (0.0, hcp_width):
+        distance = np.abs(u - wall)
+        distance = np.minimum(distance, period - distance)
+        potential += wall_height * np.exp(-distance**2 / (2 * wall_width**2))
+    potential += np.where((u > 0) & (u < hcp_width), hcp_offset, 0.0)
+    return potential
+
+def herringbone_substrate(lattice, **params):
+    '''
+    SubstrateMap of a herringbone reconstruction (see herringbone_potential) for a lattice.
+    '''
+    return SubstrateMap(lattice.geometry, herringbone_potential(lattice.width, lattice.height, **params), lattice.temperature)
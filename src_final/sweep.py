@@ -0,0 +1,352 @@
+# src/sweep.py
+
+"""
+Parameter sweeps configured by a spec file instead of by editing main(), split deterministically between machines.
+
+A sweep spec (JSON, or YAML if PyYAML is installed) lists the energy axes and the run settings:
+
+    energies:
+      diffusion: {start: 0, stop: 1.5, num: 6}    # np.linspace(0, 1.5, 6)
+      rotation: [0]                               # explicit values
+      coupling: {start: 0, stop: 1.5, step: 0.3}  # 0, 0.3, ..., 1.5 (stop included)
+      dehalogenation: {start: 0, stop: 2.3, num: 6}
+    width: 60
+    monomers: 50
+    replicas: 3
+    seed: 0                        # base seed, replica seeds are derived from it as in main.py (replica_seed)
+    max_steps: 1e6
+    defect_params: [1.0, 0.0, 1.0]
+    defect_density: 0.0
+    herringbone: false             # true, or a dict of substrate.herringbone_potential parameters (reference engine only)
+    engine: reference              # an engine of equivalence.py, or "module:function"
+    cache: result_cache.sqlite     # null to always re-simulate (only used by the reference engine)
+    output: zach_output_rot.csv
+
+Every (point, replica) pair of the sweep is one task. `--shard i/N` runs the i-th (i from 1 to N) of N shards of about
+equal expected runtime (see scheduling.py). The split only depends on the spec, so N machines given the same spec run
+disjoint parts of the sweep without talking to each other. Tasks run longest-expected-first, and the progress is
+logged with the throughput and an ETA from the cost model, which is refined with the measured runtimes. Each shard
+appends its replicas to a JSON lines file as they finish and skips the tasks already in it when restarted. The merge
+subcommand combines the shard files and aggregates them exactly as a single-node run of the same spec does, so the
+merged CSV is identical to it.
+
+Example:
+    python sweep.py run sweep.yaml                          # whole sweep on this machine
+    python sweep.py run sweep.yaml --shard 2/4              # second of four machines, writes <output>.shard2of4.jsonl
+    python sweep.py merge sweep.yaml zach_output_rot.shard*.jsonl
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+import numpy as np
+
+AXES = ("diffusion", "rotation", "coupling", "dehalogenation")
+DEFAULTS = {
+    "width": 60,
+    "monomers": 50,
+    "replicas": 3,
+    "seed": 0,
+    "max_steps": 1e6,
+    "defect_params": [1.0, 0.0, 1.0],
+    "defect_density": 0.0,
+    "herringbone": False,
+    "engine": "reference",
+    "cache": "result_cache.sqlite",
+    "output": "zach_output_rot.csv",
+}
+# settings that do not change the results, and so are left out of the spec fingerprint
+RUN_SETTINGS = ("cache", "output")
+
+def load_spec(path):
+    """
+    Read a sweep spec and fill in the defaults.
+
+    Args:
+        path (str): JSON or YAML (.yaml/.yml) file.
+
+    Returns:
+        dict: The spec, with every energy axis expanded to a list of floats.
+    """
+    with open(path) as file:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            raw = yaml.safe_load(file)
+        else:
+            raw = json.load(file)
+    unknown = set(raw) - set(DEFAULTS) - {"energies"}
+    if unknown:
+        raise ValueError(f"Unknown sweep settings: {sorted(unknown)}")
+    missing = [axis for axis in AXES if axis not in raw.get("energies", {})]
+    if missing:
+        raise ValueError(f"The spec has no values for the {', '.join(missing)} energies")
+
+    spec = dict(DEFAULTS, **{key: value for key, value in raw.items() if key != "energies"})
+    spec["energies"] = {axis: axis_values(raw["energies"][axis]) for axis in AXES}
+    spec["width"] = int(spec["width"])
+    spec["monomers"] = int(spec["monomers"])
+    spec["replicas"] = int(spec["replicas"])
+    spec["max_steps"] = float(spec["max_steps"])
+    spec["defect_params"] = [float(value) for value in spec["defect_params"]]
+    spec["defect_density"] = float(spec["defect_density"])
+    if spec["width"] % 2:
+        raise ValueError("The lattice width has to be even")
+    return spec
+
+def axis_values(axis):
+    '''
+    Energies of one axis: a number, a list, {start, stop, num} (np.linspace) or {start, stop, step} (stop included).
+    '''
+    if isinstance(axis, (int, float)):
+        return [float(axis)]
+    if isinstance(axis, list):
+        return [float(value) for value in axis]
+    if "num" in axis:
+        return [float(value) for value in np.linspace(axis["start"], axis["stop"], int(axis["num"]))]
+    num = int(round((axis["stop"] - axis["start"]) / axis["step"])) + 1
+    return [float(value) for value in np.round(axis["start"] + axis["step"] * np.arange(num), 10)]
+
+def spec_fingerprint(spec):
+    '''
+    Hash of everything in the spec that affects the results, stored in the shard files so merge refuses foreign shards.
+    '''
+    settings = {key: value for key, value in spec.items() if key not in RUN_SETTINGS}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+def sweep_points(spec):
+    """
+    Monomer parameters of every point, in the loop order of main() (diffusion, rotation, coupling, dehalogenation).
+    """
+    energies = spec["energies"]
+    return [['A', 1e13, diffusion, 1e13, rotation, 1e13, coupling, 1e13, dehalogenation]
+            for diffusion, rotation, coupling, dehalogenation in itertools.product(*(energies[axis] for axis in AXES))]
+
+def sweep_tasks(spec):
+    '''
+    All (point index, replica) tasks of the sweep, in a fixed order.
+    '''
+    return [(point, replica) for point in range(len(sweep_points(spec))) for replica in range(spec["replicas"])]
+
+def parse_shard(text):
+    '''
+    "i/N" -> (i, N), with 1 <= i <= N.
+    '''
+    index, count = (int(part) for part in text.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {text}: expected i/N with 1 <= i <= N")
+    return index, count
+
+def shard_tasks(spec, index, count):
+    '''
+    Tasks of shard index (1..count), longest expected runtime first. The shards are balanced by the prior cost model.
+    '''
+    from scheduling import CostModel, balanced_shards
+    return balanced_shards(sweep_tasks(spec), sweep_points(spec), CostModel(spec), count)[index - 1]
+
+def shard_path(output, index, count):
+    return f"{os.path.splitext(output)[0]}.shard{index}of{count}.jsonl"
+
+def read_shard(path, fingerprint=None):
+    """
+    Replicas stored in a shard file.
+
+    Returns:
+        dict: {(point index, replica): replica dict}
+    """
+    replicas = {}
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break # last line of a shard that was killed while writing it
+            if fingerprint is not None and record["spec"] != fingerprint:
+                raise ValueError(f"{path} belongs to a different sweep spec")
+            replicas[(record["point"], record["index"])] = decode_replica(record["replica"])
+    return replicas
+
+def decode_replica(replica):
+    '''
+    A replica read back from JSON, whose object keys are strings.
+    '''
+    replica["neighbour_freq"] = {int(degree): count for degree, count in replica["neighbour_freq"].items()}
+    if "ring_sizes" in replica:
+        replica["ring_sizes"] = {int(size): count for size, count in replica["ring_sizes"].items()}
+    return replica
+
+def task_seed(spec, monomer_params, replica):
+    from main import replica_seed
+    return replica_seed(spec["seed"], monomer_params, spec["defect_params"], replica)
+
+def is_cached(spec, monomer_params, replica, cache):
+    '''
+    Whether run_task would read this replica from the cache instead of simulating it.
+    '''
+    from result_cache import replica_key
+
+    if cache is None:
+        return False
+    lattice_config = {"width": spec["width"], "rotational_symmetry": 6, "periodic": True, "temperature": 600} # as in run_replica
+    return replica_key(monomer_params, spec["defect_params"], spec["defect_density"], lattice_config, spec["monomers"],
+                       task_seed(spec, monomer_params, replica), spec["max_steps"],
+                       extra={"herringbone": spec["herringbone"]} if spec["herringbone"] else None) in cache
+
+def sweep_engine(spec):
+    '''
+    (engine, cache) of a spec: engine is None for the reference engine, which is the only one that uses the result cache.
+    '''
+    from result_cache import ResultCache
+
+    engine = None
+    if spec["engine"] != "reference":
+        if spec["herringbone"]:
+            raise ValueError("Herringbone substrates are only supported by the reference engine")
+        from equivalence import load_engine
+        engine = load_engine(spec["engine"])
+    cache = ResultCache(spec["cache"]) if spec["cache"] and engine is None else None
+    return engine, cache
+
+def run_task(spec, monomer_params, replica, cache=None, engine=None, instrument=False):
+    '''
+    Grow and analyze one replica of one point.
+    '''
+    from main import run_replica
+
+    seed = task_seed(spec, monomer_params, replica)
+    if engine is None:
+        return run_replica(spec["width"], monomer_params, spec["defect_params"], spec["defect_density"], spec["monomers"], seed,
+                           max_steps=spec["max_steps"], cache=cache, instrument=instrument, herringbone=spec["herringbone"])
+    return engine(spec["width"], monomer_params, spec["defect_params"], spec["defect_density"], spec["monomers"], seed, spec["max_steps"])
+
+def run_shard(spec, index=1, count=1, instrument=False):
+    """
+    Run the tasks of one shard, appending every finished replica to the shard file.
+
+    Args:
+        spec (dict): Sweep spec (see load_spec).
+        index, count (int): Shard index (1..count) and number of shards.
+        instrument (bool): Count events and time the phases of every run (reference engine only).
+
+    Returns:
+        str: Path of the shard file.
+    """
+    from instrumentation import logger
+    from scheduling import CostModel, Progress, longest_first
+
+    engine, cache = sweep_engine(spec)
+
+    fingerprint = spec_fingerprint(spec)
+    path = shard_path(spec["output"], index, count)
+    done = {}
+    if os.path.exists(path):
+        with open(path, "rb+") as file: # drop the partial last line of a shard that was killed while writing it
+            file.truncate(file.read().rfind(b"\n") + 1)
+        done = read_shard(path, fingerprint)
+    points = sweep_points(spec)
+    shard = shard_tasks(spec, index, count)
+    tasks = [task for task in shard if task not in done]
+    logger.info("Shard %d/%d: %d tasks to run, %d already done", index, count, len(tasks), len(shard) - len(tasks))
+
+    model = CostModel(spec)
+    progress = Progress(model, len(shard), len(shard) - len(tasks))
+    start = time.time()
+    with open(path, "a") as file:
+        while tasks:
+            point, replica_index = tasks.pop(0)
+            monomer_params = points[point]
+            logger.info("diffusion: %s, rotation: %s, coupling: %s, dehalogen: %s, replica %d (expected %.1f s)", monomer_params[2],
+                        monomer_params[4], monomer_params[6], monomer_params[8], replica_index, model.predict(monomer_params))
+            cached = is_cached(spec, monomer_params, replica_index, cache)
+            task_start = time.time()
+            replica = run_task(spec, monomer_params, replica_index, cache, engine, instrument)
+            file.write(json.dumps({"spec": fingerprint, "point": point, "index": replica_index, "replica": replica}) + "\n")
+            file.flush()
+            if cached: # a cache hit says nothing about the cost of the point
+                progress.done += 1
+            else:
+                progress.finished(monomer_params, time.time() - task_start)
+                tasks = longest_first(tasks, points, model)
+            logger.info(progress.report([points[task[0]] for task in tasks]))
+    logger.info("Shard %d/%d finished in %.1f s. Replicas saved to %s", index, count, time.time() - start, path)
+    return path
+
+def merge_shards(spec, paths, output=None):
+    """
+    Aggregate the replicas of shard files into the results CSV of the sweep (see save_results_to_csv).
+
+    Args:
+        spec (dict): Sweep spec the shards were run with.
+        paths (list of str): Shard files.
+        output (str): Results file (defaults to the spec's output).
+
+    Returns:
+        list of dict: The aggregated results.
+    """
+    fingerprint = spec_fingerprint(spec)
+    replicas = {}
+    for path in paths:
+        replicas.update(read_shard(path, fingerprint))
+    return write_results(spec, replicas, output)
+
+def write_results(spec, replicas, output=None):
+    """
+    Aggregate the replicas of a whole sweep per point and save them (see save_results_to_csv).
+
+    Args:
+        spec (dict): Sweep spec.
+        replicas (dict): {(point index, replica): replica dict} of every task of the sweep.
+        output (str): Results file (defaults to the spec's output).
+
+    Returns:
+        list of dict: The aggregated results.
+    """
+    from main import aggregate_replicas, save_results_to_csv
+
+    missing = [task for task in sweep_tasks(spec) if task not in replicas]
+    if missing:
+        raise ValueError(f"{len(missing)} of {len(sweep_tasks(spec))} tasks have no result, e.g. (point, replica) = {missing[0]}")
+
+    # replicas are aggregated in replica order, as run_replica returns them in a single-node run
+    results = [aggregate_replicas(monomer_params, [replicas[(point, replica)] for replica in range(spec["replicas"])])
+               for point, monomer_params in enumerate(sweep_points(spec))]
+    save_results_to_csv(results, output or spec["output"])
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep from a spec file, optionally as one of several shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="run the sweep, or one shard of it")
+    run.add_argument("spec", help="sweep spec (.json, .yaml or .yml)")
+    run.add_argument("--shard", default=None, help="i/N: run the i-th of N shards and only write its shard file")
+    run.add_argument("--instrument", action="store_true", help="count events and time the phases of every run")
+    run.add_argument("--log-level", default="INFO")
+
+    merge = subparsers.add_parser("merge", help="aggregate shard files into the results CSV")
+    merge.add_argument("spec")
+    merge.add_argument("shards", nargs="+", help="shard files written by run --shard")
+    merge.add_argument("-o", "--output", default=None, help="results file (defaults to the spec's output)")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.command == "merge":
+        results = merge_shards(spec, args.shards, args.output)
+        print(f"Merged {len(args.shards)} shard files into {len(results)} points. Results saved to {args.output or spec['output']}")
+        return 0
+
+    from instrumentation import configure_logging, logger
+    configure_logging(args.log_level)
+    index, count = parse_shard(args.shard) if args.shard else (1, 1)
+    path = run_shard(spec, index, count, args.instrument)
+    if args.shard is None:
+        merge_shards(spec, [path])
+        logger.info("Parameter sweep completed. Results saved to '%s'.", spec["output"])
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
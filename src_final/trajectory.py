@@ -0,0 +1,181 @@
+# src/trajectory.py
+
+"""
+Recording of simulation trajectories, so that runs can be animated (or otherwise inspected) afterwards without
+re-simulating them.
+
+A trajectory is stored as three files next to each other:
+
+    <path>.delta  int32 records (frame, site, state): the sites that changed in each frame
+    <path>.keys   uint8 full lattice states, one row of width * width entries per keyframe
+    <path>.json   header (lattice width, keyframe interval, frame numbers of the keyframes, number of frames)
+
+A frame is one event that changed the lattice (a monomer hopping, rotating, coupling, being placed or removed). Only
+the changed sites are written, plus a full keyframe every keyframe_interval frames. TrajectoryReader memory-maps the
+files and reconstructs any frame by starting from the closest keyframe and replaying the records after it.
+
+Site states: 0 is empty, 1 and 2 are uncoupled monomers with orientation 0 and 180, 3 and 4 are coupled monomers with
+orientation 0 and 180 (see site_state).
+"""
+
+import json
+from array import array
+import numpy as np
+
+EMPTY = 0
+
+def site_state(monomer):
+    return 1 + monomer.orientations.index(monomer.orientation) + 2 * bool(monomer.coupled)
+
+def lattice_states(lattice):
+    '''
+    Site states of the whole lattice, as a flat uint8 array indexed by y * width + x.
+    '''
+    states = np.zeros(lattice.width * lattice.height, dtype=np.uint8)
+    for y, row in enumerate(lattice.grid):
+        for x, monomer in enumerate(row):
+            if monomer is not None:
+                states[y * lattice.width + x] = site_state(monomer)
+    return states
+
+def state_orientation(state):
+    return 0 if state in (1, 3) else 180
+
+def state_coupled(state):
+    return state >= 3
+
+class TrajectoryRecorder:
+    def __init__(self, path, lattice, keyframe_interval=1000, buffer_records=65536):
+        self.path = path
+        self.width = lattice.width
+        self.keyframe_interval = keyframe_interval
+        self.buffer_records = buffer_records
+        self.states = lattice_states(lattice) # current lattice state, used for the keyframes
+        self.frame = 0
+        self.keyframes = []
+        # id(monomer) -> (site, state) as last recorded; the monomers already on the lattice are in the first keyframe,
+        # so the site they leave on their first move is recorded as empty
+        self._last = {id(monomer): (y * self.width + x, site_state(monomer))
+                      for y, row in enumerate(lattice.grid) for x, monomer in enumerate(row) if monomer is not None}
+        self._buffer = array("i")
+        self._delta_file = open(path + ".delta", "wb")
+        self._keys_file = open(path + ".keys", "wb")
+        self._write_keyframe()
+
+    def _write_keyframe(self):
+        self.keyframes.append(self.frame)
+        self._keys_file.write(self.states.tobytes())
+
+    def _flush(self):
+        self._delta_file.write(self._buffer.tobytes())
+        del self._buffer[:]
+
+    def _set(self, site, state):
+        self._buffer.extend((self.frame, site, state))
+        self.states[site] = state
+
+    def _end_frame(self):
+        self.frame += 1
+        if len(self._buffer) >= 3 * self.buffer_records:
+            self._flush()
+        if self.frame % self.keyframe_interval == 0:
+            self._write_keyframe()
+
+    def track(self, monomer):
+        '''
+        Record the current state of a monomer, if it changed since it was last recorded. The site it left (if any) is
+        recorded as empty.
+        '''
+        x, y = monomer.position
+        site = y * self.width + x
+        state = site_state(monomer)
+        last = self._last.get(id(monomer))
+        if last == (site, state):
+            return
+        if last is not None and last[0] != site:
+            self._set(last[0], EMPTY)
+        self._set(site, state)
+        self._last[id(monomer)] = (site, state)
+        self._end_frame()
+
+    def forget(self, monomer):
+        '''
+        Record the removal of a monomer from the lattice.
+        '''
+        last = self._last.pop(id(monomer), None)
+        if last is not None:
+            self._set(last[0], EMPTY)
+            self._end_frame()
+
+    def close(self):
+        self._flush()
+        self._delta_file.close()
+        self._keys_file.close()
+        header = {
+            "width": self.width,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframes": self.keyframes,
+            "frames": self.frame + 1,
+        }
+        with open(self.path + ".json", "w") as file:
+            json.dump(header, file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TrajectoryReader:
+    def __init__(self, path):
+        with open(path + ".json") as file:
+            header = json.load(file)
+        self.width = header["width"]
+        self.num_sites = self.width * self.width
+        self.num_frames = header["frames"]
+        self.keyframe_frames = np.array(header["keyframes"], dtype=np.int64)
+        self.deltas = np.memmap(path + ".delta", dtype=np.int32, mode="r").reshape(-1, 3) if self._size(path + ".delta") else np.zeros((0, 3), dtype=np.int32)
+        self.keyframes = np.memmap(path + ".keys", dtype=np.uint8, mode="r").reshape(-1, self.num_sites)
+
+    @staticmethod
+    def _size(path):
+        with open(path, "rb") as file:
+            file.seek(0, 2)
+            return file.tell()
+
+    def __len__(self):
+        return self.num_frames
+
+    def frame(self, frame):
+        '''
+        Lattice state (flat uint8 array of site states) after the given frame has been applied.
+        '''
+        if not 0 <= frame < self.num_frames:
+            raise IndexError(f"Frame {frame} out of range for a trajectory with {self.num_frames} frames.")
+        k = np.searchsorted(self.keyframe_frames, frame, side="right") - 1
+        states = np.array(self.keyframes[k])
+        frames = self.deltas[:, 0]
+        start = np.searchsorted(frames, self.keyframe_frames[k], side="left")
+        stop = np.searchsorted(frames, frame, side="left")
+        records = self.deltas[start:stop]
+        states[records[:, 1]] = records[:, 2] # later records overwrite earlier ones for the same site
+        return states
+
+    def frames(self, start=0, stop=None, step=1):
+        '''
+        Iterate over lattice states, replaying the records between frames instead of seeking for each one.
+        '''
+        stop = self.num_frames if stop is None else min(stop, self.num_frames)
+        if start >= stop:
+            return
+        states = self.frame(start)
+        frames = self.deltas[:, 0]
+        current = start
+        for target in range(start + step, stop, step):
+            yield states.copy()
+            lo = np.searchsorted(frames, current, side="left")
+            hi = np.searchsorted(frames, target, side="left")
+            records = self.deltas[lo:hi]
+            states[records[:, 1]] = records[:, 2]
+            current = target
+        yield states.copy()
@@ -0,0 +1,389 @@
+# src/walker.py
+
+"""
+Array kernel for the walker phase of slow growth, compiled with Numba when it is installed.
+
+In the reference loop (introduce_new_monomer and Monomer.action) every step of the walker is a handful of method calls,
+attribute lookups and dictionary lookups, followed by the dehalogenation loop over every monomer of the island. Here the
+lattice is flat arrays instead (the neighbour tables of geometry.py, the island index of the monomer on every site, and
+the orientation, rotation count and halogen sites of every island monomer) and one kernel call runs the diffuse /
+rotate / couple / dehalogenate step of the walker until it couples or max_steps is reached. Python only places walkers
+and writes the final island back into a Lattice and Monomer objects, so the analysis is the same as for the reference.
+
+The rules are those of the reference:
+    diffusion      a random neighbour, the hop is refused if it is occupied
+    rotation       the rotation count moves by +-1, then the orientation flips, each with the rotation probability
+    coupling       a random next-nearest neighbour of opposite orientation; accepted if the halogen site it would bond
+                   through is gone (see Monomer.get_halogenation, turned into a lookup table by halogenation_table)
+    dehalogenation every remaining halogen site of the island is removed with the dehalogenation probability per step
+
+The kernel draws its random numbers from its own generator (xoshiro128**, written with shifts and masks so that it
+gives the same numbers as 64-bit integers in Numba and as Python ints), so the compiled kernel and the pure-Python
+fallback grow the same islands for the same seed. The sequence of draws differs from that of the reference engine, so
+the two are compared statistically (python equivalence.py walker) instead of seed for seed. `python walker.py` checks
+that both backends grow the same islands, each in a fresh process, so the first island of a process is covered too.
+
+Defects and substrates are not simulated by the kernel; use the reference engine for those.
+
+Example:
+    from walker import run_replica
+    replica = run_replica(60, ['A', 1e13, 0.5, 1e13, 0.0, 1e13, 0.9, 1e13, 1.2], [1.0, 0.0, 1.0], 0.0, 50, seed=1)
+"""
+
+import argparse
+import json
+import random
+import numpy as np
+from lattice import Lattice
+from monomer import Monomer
+from main import initialize_dimer, analyze_replica
+from instrumentation import logger
+
+try:
+    from numba import njit
+except ImportError: # numba is optional, the kernel then runs as plain Python
+    njit = None
+
+MASK = 0xFFFFFFFF
+ANGLES = (0, 56, -56) # bond angles of get_halogenation, in the order of the angle classes
+
+def seed_state(seed):
+    '''
+    xoshiro128** state (4 words of 32 bits, never all zero) of a seed, via splitmix64.
+    '''
+    x = int(seed) & 0xFFFFFFFFFFFFFFFF
+    words = []
+    for _ in range(2):
+        x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        z = x
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        z ^= z >> 31
+        words += [z & MASK, z >> 32]
+    return words if any(words) else [1, 0, 0, 0]
+
+def next32(state):
+    # xoshiro128**; every intermediate fits into 44 bits, so int64 arithmetic never overflows
+    s0, s1, s2, s3 = state[0], state[1], state[2], state[3]
+    m = (s1 * 5) & MASK
+    result = ((((m << 7) | (m >> 25)) & MASK) * 9) & MASK
+    t = (s1 << 9) & MASK
+    s2 ^= s0
+    s3 ^= s1
+    s1 ^= s2
+    s0 ^= s3
+    s2 ^= t
+    s3 = ((s3 << 11) | (s3 >> 21)) & MASK
+    state[0], state[1], state[2], state[3] = s0, s1, s2, s3
+    return result
+
+def draw(state, n):
+    '''
+    Random integer in [0, n) from the kernel's generator, for the walker placements and orientations drawn in Python.
+    '''
+    words = [int(word) for word in state]
+    high, low = next32(words) >> 5, next32(words) >> 6
+    state[:] = words
+    return int((high * 67108864 + low) / 9007199254740992.0 * n)
+
+def make_kernel(jit=None):
+    '''
+    The walker kernel, with every function passed through jit (e.g. numba.njit); plain Python if jit is None.
+    '''
+    jit = jit or (lambda function: function)
+    next_word = jit(next32)
+
+    @jit
+    def uniform(state):
+        # 53-bit float in [0, 1) from two 32-bit draws, as random.random() does
+        return ((next_word(state) >> 5) * 67108864 + (next_word(state) >> 6)) / 9007199254740992.0
+
+    def walk(state, max_steps, site, orientation, rotations, p_diffusion, p_rotation, p_coupling, p_dehalogenation,
+             neighbours, next_nearest, angle_class, halogenation, occupant, island_orientation, island_rotations,
+             island_sites, island_size, num_sites):
+        """
+        Step a walker until it couples or max_steps is reached. The halogen sites of the island are updated in place.
+
+        Args:
+            state: Generator state (see seed_state).
+            site, orientation, rotations: Flat site index, orientation index (0 or 1) and rotation count of the walker.
+            p_*: Event probabilities per step (see Monomer.diffusion_probability and friends).
+            neighbours: (sites * 6) flat neighbour table, -1 for no neighbour.
+            next_nearest, angle_class: (2 * sites * 3) next-nearest neighbour table and angle class of every slot.
+            halogenation: (6 * 3 * 6) halogenation table (see halogenation_table).
+            occupant: Island index of the monomer on every site, -1 for empty sites.
+            island_orientation, island_rotations: Per island monomer.
+            island_sites: (3 * island_size) halogen sites of the island, 1 while present.
+
+        Returns:
+            tuple: (steps, site, orientation, rotations, partner); partner is the island index of the monomer the walker
+                coupled to, -1 if it did not couple within max_steps.
+        """
+        steps = 0
+        while steps < max_steps:
+            steps += 1
+            if uniform(state) < p_diffusion:
+                count = 0
+                for k in range(6):
+                    if neighbours[6 * site + k] >= 0:
+                        count += 1
+                pick = int(uniform(state) * count)
+                for k in range(6):
+                    target = neighbours[6 * site + k]
+                    if target >= 0:
+                        if pick == 0:
+                            if occupant[target] < 0:
+                                site = target
+                            break
+                        pick -= 1
+            if uniform(state) < p_rotation:
+                if uniform(state) < 0.5:
+                    rotations += 1
+                else:
+                    rotations -= 1
+            if uniform(state) < p_rotation:
+                orientation = 1 - orientation
+
+            partner = -1
+            if uniform(state) < p_coupling:
+                base = 3 * (orientation * num_sites + site)
+                count = 0
+                for k in range(3):
+                    other = next_nearest[base + k]
+                    if other >= 0 and occupant[other] >= 0 and island_orientation[occupant[other]] != orientation:
+                        count += 1
+                if count > 0:
+                    pick = int(uniform(state) * count)
+                    for k in range(3):
+                        other = next_nearest[base + k]
+                        if other >= 0 and occupant[other] >= 0 and island_orientation[occupant[other]] != orientation:
+                            if pick == 0:
+                                candidate = occupant[other]
+                                angle = angle_class[base + k]
+                                if angle >= 0:
+                                    bond = halogenation[(rotations % 6 * 3 + angle) * 6 + island_rotations[candidate] % 6]
+                                    # the walker is not dehalogenated while it walks, so the partner's site decides
+                                    if bond >= 0 and island_sites[3 * candidate + bond % 3] == 0:
+                                        partner = candidate
+                                break
+                            pick -= 1
+
+            for i in range(3 * island_size):
+                if island_sites[i] != 0 and uniform(state) < p_dehalogenation:
+                    island_sites[i] = 0
+            if partner >= 0:
+                return steps, site, orientation, rotations, partner
+        return steps, site, orientation, rotations, -1
+
+    return jit(walk)
+
+_KERNELS = {}
+
+def get_kernel(backend=None):
+    '''
+    The walker kernel of a backend: "numba" (compiled on first use of the backend), "python", or None for numba if it is
+    installed.
+    '''
+    backend = backend or ("numba" if njit is not None else "python")
+    if backend not in _KERNELS:
+        if backend == "numba":
+            if njit is None:
+                raise ImportError("The numba backend needs numba to be installed")
+            _KERNELS[backend] = compile_kernel(make_kernel(njit))
+        elif backend == "python":
+            _KERNELS[backend] = make_kernel()
+        else:
+            raise ValueError(f"Unknown backend '{backend}'")
+    return backend, _KERNELS[backend]
+
+def compile_kernel(walk):
+    '''
+    Compile a Numba kernel by calling it once on dummy arrays of the types slow_growth_simulation passes. Numba compiles
+    lazily and compiling changes the state of the random module, so without this the first island grown in a process
+    would differ from every later one of the same seed.
+    '''
+    state = random.getstate()
+    try:
+        table = np.zeros(1, dtype=np.int64)
+        walk(np.array(seed_state(0), dtype=np.int64), 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, table, table, table, table, table, table,
+             table, table, 0, 1)
+    finally:
+        random.setstate(state)
+    return walk
+
+_HALOGENATION = None
+
+def halogenation_table():
+    """
+    Monomer.get_halogenation as a lookup table: entry (rotations1 % 6, angle class, rotations2 % 6) is 3 * i + j if the
+    bond joins halogen site i of the first monomer with site j of the second (coupling needs either of them to be gone),
+    and -1 for combinations get_halogenation rejects. Generated by calling get_halogenation with distinct prime site values.
+    """
+    global _HALOGENATION
+    if _HALOGENATION is None:
+        lattice = Lattice(width=8)
+        state = random.getstate() # Monomer() draws an orientation, which must not shift the caller's seeded sequence
+        first, second = Monomer('A', 0, 0, 0, 0, 0, 0, 0, 0), Monomer('A', 0, 0, 0, 0, 0, 0, 0, 0)
+        random.setstate(state)
+        first.site1, first.site2, first.site3 = 2, 3, 5
+        second.site1, second.site2, second.site3 = 7, 11, 13
+        codes = {a * b: 3 * i + j for i, a in enumerate((2, 3, 5)) for j, b in enumerate((7, 11, 13))}
+        first.set_position(2, 2)
+        partners = {0: (2, 4), 56: (3, 3), -56: (0, 3)} # a next-nearest position at every bond angle
+        table = np.full((6, len(ANGLES), 6), -1, dtype=np.int64)
+        for r1 in range(6):
+            for a, angle in enumerate(ANGLES):
+                for r2 in range(6):
+                    first.rotations, second.rotations = r1, r2
+                    second.set_position(*partners[angle])
+                    product = first.get_halogenation(lattice, second)
+                    if product is not None:
+                        table[r1, a, r2] = codes[product]
+        _HALOGENATION = table.ravel()
+    return _HALOGENATION
+
+_TABLES = {}
+
+def geometry_tables(geometry):
+    """
+    Flat neighbour, next-nearest neighbour and angle class tables of a lattice geometry. The angle class of a
+    next-nearest neighbour slot is the index in ANGLES of the angle get_halogenation computes for the two positions,
+    -1 if it is none of them (bonds across the periodic boundary, which the reference rejects as well).
+    """
+    if geometry.key not in _TABLES:
+        width, num_sites = geometry.width, geometry.num_sites
+        next_nearest = np.asarray(geometry.next_nearest, dtype=np.int64)
+        site = np.arange(num_sites)[None, :, None]
+        x1, y1 = site % width + 0.5 * (site // width % 2), site // width
+        other = np.where(next_nearest >= 0, next_nearest, 0)
+        x2, y2 = other % width + 0.5 * (other // width % 2), other // width
+        with np.errstate(divide="ignore", invalid="ignore"):
+            angle = np.trunc(np.degrees(np.arctan((x2 - x1) / (y2 - y1))))
+        angle_class = np.full(next_nearest.shape, -1, dtype=np.int64)
+        for a, value in enumerate(ANGLES):
+            angle_class[(angle == value) & (next_nearest >= 0)] = a
+        _TABLES[geometry.key] = (np.asarray(geometry.neighbours, dtype=np.int64).ravel(), next_nearest.ravel(), angle_class.ravel())
+    return _TABLES[geometry.key]
+
+def slow_growth_simulation(lattice, monomer_params, total_monomers, seed, max_steps=1e6, backend=None):
+    """
+    Grow an island like main.slow_growth_simulation (without defects), running the walkers with the kernel.
+
+    Args:
+        lattice (Lattice): Empty lattice without a substrate.
+        monomer_params (list): Parameters passed to Monomer().
+        total_monomers (int): Number of monomers in the island.
+        seed (int): Seed of the kernel's generator, which also places and orients the walkers. The initial dimer is
+            placed with the random module, which the caller seeds.
+        max_steps (float): Step limit per attempt of a walker; as in the reference, a walker that hits it is taken off
+            the lattice and keeps walking from where it was.
+        backend (str): "numba", "python" or None (see get_kernel).
+
+    Returns:
+        list: The monomers of the island.
+    """
+    if lattice.substrate is not None:
+        raise ValueError("The walker kernel does not simulate substrates")
+    backend, walk = get_kernel(backend)
+    width, num_sites = lattice.width, lattice.geometry.num_sites
+    neighbours, next_nearest, angle_class = geometry_tables(lattice.geometry)
+    halogenation = halogenation_table()
+
+    monomers = list(initialize_dimer(lattice, monomer_params))
+    occupant = np.full(num_sites, -1, dtype=np.int64)
+    island_orientation = np.zeros(total_monomers, dtype=np.int64)
+    island_rotations = np.zeros(total_monomers, dtype=np.int64)
+    island_sites = np.ones(3 * total_monomers, dtype=np.int64)
+    for i, monomer in enumerate(monomers):
+        x, y = monomer.position
+        occupant[y * width + x] = i
+        island_orientation[i] = monomer.orientation == 180
+        island_rotations[i] = monomer.rotations
+    state = np.array(seed_state(seed), dtype=np.int64)
+    if backend == "python": # lists index faster than arrays in plain Python
+        neighbours, next_nearest, angle_class, halogenation = neighbours.tolist(), next_nearest.tolist(), angle_class.tolist(), halogenation.tolist()
+        occupant, island_orientation, island_rotations, island_sites = occupant.tolist(), island_orientation.tolist(), island_rotations.tolist(), island_sites.tolist()
+        state = state.tolist()
+
+    probe = Monomer(*monomer_params)
+    # floats, so the compiled kernel is called with the types it was compiled for (see compile_kernel)
+    probabilities = tuple(float(p) for p in (probe.diffusion_probability(lattice), probe.rotation_probability(lattice),
+                                              probe.coupling_probability(lattice), probe.calculate_dehalogen_rate(lattice)))
+    max_steps = int(max_steps)
+    for _ in range(len(monomers), total_monomers):
+        walker = Monomer(*monomer_params)
+        # placed on a random free site with a random orientation, drawn from the kernel's generator; the walker is kept
+        # off the occupancy map while the kernel runs it
+        free = np.flatnonzero(np.asarray(occupant) < 0)
+        site, orientation, rotations = int(free[draw(state, len(free))]), draw(state, 2), walker.rotations
+        while True:
+            _, site, orientation, rotations, partner = walk(state, max_steps, site, orientation, rotations, *probabilities, neighbours,
+                                                            next_nearest, angle_class, halogenation, occupant, island_orientation,
+                                                            island_rotations, island_sites, len(monomers), num_sites)
+            if partner >= 0:
+                break
+            logger.info("Monomer failed to couple after %d steps. Initializing new monomer...", max_steps)
+
+        index = len(monomers)
+        lattice.place_monomer(walker, site % width, site // width)
+        walker.set_orientation(walker.orientations[orientation])
+        walker.rotations = int(rotations)
+        walker.couple_with(monomers[partner])
+        monomers.append(walker)
+        occupant[site] = index
+        island_orientation[index] = orientation
+        island_rotations[index] = rotations
+
+    for i, monomer in enumerate(monomers):
+        monomer.site1, monomer.site2, monomer.site3 = (bool(island_sites[3 * i + s]) for s in range(3))
+    return monomers
+
+def run_replica(width, monomer_params, defect_params, defect_density, total_monomers, seed, max_steps=1e6, backend=None):
+    """
+    Grow and analyze a single island with the walker kernel; an engine for equivalence.py and sweeps (see main.run_replica).
+    """
+    if defect_density:
+        raise ValueError("The walker kernel does not simulate defects")
+    random.seed(seed)
+    lattice = Lattice(width=width, rotational_symmetry=6, periodic=True, temperature=600)
+    monomers = slow_growth_simulation(lattice, monomer_params, total_monomers, seed, max_steps=max_steps, backend=backend)
+    return analyze_replica(lattice, monomers, seed)
+
+def fresh_process_replicas(backend, width, monomer_params, total_monomers, seeds, max_steps):
+    """
+    Replicas of the given seeds, grown in order in a new process with the given backend.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_replicas, backend, width, monomer_params, total_monomers, seeds, max_steps).result()
+
+def _replicas(backend, width, monomer_params, total_monomers, seeds, max_steps):
+    return [run_replica(width, monomer_params, [1.0, 0.0, 1.0], 0.0, total_monomers, seed, max_steps, backend) for seed in seeds]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the numba and python backends of the walker kernel grow the same islands.")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--monomers", type=int, default=30)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--max-steps", type=float, default=1e5)
+    parser.add_argument("--energies", type=float, nargs=4, default=[0.5, 0.0, 0.9, 1.2], help="diffusion, rotation, coupling and dehalogenation energies")
+    args = parser.parse_args(argv)
+
+    diffusion, rotation, coupling, dehalogenation = args.energies
+    monomer_params = ['A', 1e13, diffusion, 1e13, rotation, 1e13, coupling, 1e13, dehalogenation]
+    seeds = list(range(args.seeds)) * 2 # every seed twice, the first run of a seed being the first island of the process
+    # compared as JSON, so NaN results (islands without rings, ...) compare equal
+    results = {backend: [json.dumps(replica, sort_keys=True, default=str) for replica in
+                         fresh_process_replicas(backend, args.width, monomer_params, args.monomers, seeds, args.max_steps)]
+               for backend in ("python", "numba")}
+    mismatches = [seed for seed, python, numba in zip(seeds, results["python"], results["numba"]) if python != numba]
+    mismatches += [seed for seed, first, second in zip(seeds, results["numba"], results["numba"][args.seeds:]) if first != second]
+    if mismatches:
+        print(f"Backends differ for seeds {sorted(set(mismatches))}")
+        return 1
+    print(f"numba and python grew the same {len(seeds)} islands")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+# src/wasserstein.py
+
+"""
+Vectorized Wasserstein distances between simulated and experimental degree histograms.
+
+For histograms on the same ordered bins with unit spacing, the 1-D Wasserstein distance is the L1 distance between the
+cumulative distributions. All simulated histograms are stacked into an (S, D) array and all experimental ones into an
+(E, D) array, so the full S x E distance matrix is a single vectorized pass instead of one scipy call per pair.
+
+Degree filtering follows comparing-simulated-experimental-histograms.ipynb: degrees 0 and 4 are excluded and the
+remaining degrees are placed on consecutive bins.
+
+Example:
+    python wasserstein.py cluster_results.csv NetworkQualityAnalysis/ -o wasserstein-distance-experiment-vs-simulations.csv
+"""
+
+import argparse
+import ast
+import csv
+import os
+import numpy as np
+
+EXCLUDED_DEGREES = {0, 4}
+ENERGY_COLUMNS = ["Diffusion Energy", "Rotation Energy", "Coupling Energy", "Dehalogenation Energy"]
+
+def histogram_degrees(histograms, max_degree=None):
+    '''
+    Ordered list of the degrees used as bins for a collection of {degree: frequency} histograms.
+    '''
+    if max_degree is None:
+        max_degree = max((max(h) for h in histograms if h), default=1)
+    return [d for d in range(1, max_degree + 1) if d not in EXCLUDED_DEGREES]
+
+def histogram_matrix(histograms, degrees):
+    """
+    Stack {degree: frequency} histograms into a float array with one row per histogram and one column per degree.
+    """
+    matrix = np.zeros((len(histograms), len(degrees)))
+    columns = {degree: i for i, degree in enumerate(degrees)}
+    for row, histogram in enumerate(histograms):
+        for degree, frequency in histogram.items():
+            column = columns.get(degree)
+            if column is not None:
+                matrix[row, column] = frequency
+    return matrix
+
+def cumulative_distributions(matrix):
+    '''
+    Row-normalized cumulative distributions. Rows without any counts become NaN.
+    '''
+    totals = matrix.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.cumsum(matrix / np.where(totals > 0, totals, np.nan), axis=1)
+
+def wasserstein_matrix(simulated, experimental, chunk_size=None):
+    """
+    1-D Wasserstein distances between every simulated and every experimental histogram.
+
+    Args:
+        simulated (ndarray): (S, D) histogram counts.
+        experimental (ndarray): (E, D) histogram counts on the same bins.
+        chunk_size (int): Simulated rows processed at once (bounds the (chunk, E, D) intermediate).
+
+    Returns:
+        ndarray: (S, E) distances; NaN for empty histograms.
+    """
+    cdf_sim = cumulative_distributions(np.asarray(simulated, dtype=float))
+    cdf_exp = cumulative_distributions(np.asarray(experimental, dtype=float))
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // max(1, cdf_exp.size))
+    distances = np.empty((len(cdf_sim), len(cdf_exp)))
+    for start in range(0, len(cdf_sim), chunk_size):
+        block = cdf_sim[start:start + chunk_size]
+        distances[start:start + chunk_size] = np.abs(block[:, None, :] - cdf_exp[None, :, :]).sum(axis=2)
+    return distances
+
+def histogram_distance(sim_freq, exp_freq):
+    '''
+    Wasserstein distance between a single pair of {degree: frequency} histograms (inf if either is empty).
+    '''
+    degrees = histogram_degrees([sim_freq, exp_freq])
+    distance = wasserstein_matrix(histogram_matrix([sim_freq], degrees), histogram_matrix([exp_freq], degrees))[0, 0]
+    return distance if np.isfinite(distance) else np.inf
+
+def load_simulated_histograms(file_path):
+    """
+    Load a results CSV written by save_results_to_csv (or an older sweep file).
+
+    Returns:
+        tuple: (energies as an (S, k) array, names of the k energy columns present, list of {degree: frequency} histograms)
+    """
+    with open(file_path, newline="") as file:
+        reader = csv.DictReader(file)
+        columns = [column for column in ENERGY_COLUMNS if column in reader.fieldnames]
+        energies, histograms = [], []
+        for row in reader:
+            energies.append([float(row[column]) for column in columns])
+            histograms.append(ast.literal_eval(row["Averaged Neighbour Frequency"]))
+    return np.array(energies).reshape(-1, len(columns)), columns, histograms
+
+def compare_histograms(simulated_file, experimental_folder):
+    """
+    Wasserstein distances between every row of a simulation results file and every experimental histogram in a folder.
+
+    Returns:
+        tuple: (energies (S, k), energy column names, experimental file names, (S, E) distance matrix)
+    """
+    from experiments import load_experiments # experiments.py builds on this module
+
+    energies, columns, sim_histograms = load_simulated_histograms(simulated_file)
+    dataset = load_experiments(experimental_folder)
+    names, exp_histograms = dataset.names, dataset.histograms
+    degrees = histogram_degrees(sim_histograms + exp_histograms)
+    distances = wasserstein_matrix(histogram_matrix(sim_histograms, degrees), histogram_matrix(exp_histograms, degrees))
+    return energies, columns, names, distances
+
+def save_distances_to_csv(energies, columns, names, distances, filename):
+    '''
+    Write the distances in the long format of wasserstein-distance-experiment-vs-simulations.csv (one row per simulation
+    and experimental file).
+    '''
+    with open(filename, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns + ["Experimental File", "Wasserstein Distance"])
+        for point, row in zip(energies.tolist(), distances.tolist()):
+            for name, distance in zip(names, row):
+                writer.writerow(point + [name, distance])
+
+def save_wasserstein_matrices(energies, columns, names, distances, output_dir, axes=("Diffusion Energy", "Rotation Energy", "Coupling Energy")):
+    '''
+    Write one gridded distance matrix per experimental file, in the <file>_wasserstein_matrix.npy / <file>_axes.npy format
+    of data/wasserstein_matrices. Points missing from the sweep are NaN.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    indices = [columns.index(axis) for axis in axes]
+    axis_values = [np.unique(energies[:, i]) for i in indices]
+    position = tuple(np.searchsorted(values, energies[:, i]) for values, i in zip(axis_values, indices))
+    for e, name in enumerate(names):
+        grid = np.full([len(values) for values in axis_values], np.nan)
+        grid[position] = distances[:, e]
+        np.save(os.path.join(output_dir, f"{name}_wasserstein_matrix.npy"), grid)
+        np.save(os.path.join(output_dir, f"{name}_axes.npy"), {key: list(values) for key, values in zip(("x_vals", "y_vals", "z_vals"), axis_values)})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wasserstein distances between simulated and experimental degree histograms.")
+    parser.add_argument("simulated_file", help="results CSV of a simulation sweep")
+    parser.add_argument("experimental_folder", help="folder with the graph-metrics CSVs of the experimental islands")
+    parser.add_argument("-o", "--output", default="wasserstein-distance-experiment-vs-simulations.csv")
+    parser.add_argument("--matrices", default=None, help="also write gridded distance matrices to this folder")
+    args = parser.parse_args(argv)
+
+    energies, columns, names, distances = compare_histograms(args.simulated_file, args.experimental_folder)
+    save_distances_to_csv(energies, columns, names, distances, args.output)
+    if args.matrices:
+        save_wasserstein_matrices(energies, columns, names, distances, args.matrices)
+    print(f"Compared {len(energies)} simulations with {len(names)} experimental files. Results saved to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+# src/work_queue.py
+
+"""
+Lease-based work queue for running one sweep (see sweep.py) on any number of workers and hosts.
+
+Static sharding (sweep.py run --shard) fixes the work of every machine up front, so machines that drew cheap points sit
+idle while others grind through points whose walkers time out at max_steps. Here the (point, replica) tasks of a sweep
+are rows of an SQLite file instead, and workers take them one at a time until none are left:
+
+    lease      a worker takes the pending task with the longest expected runtime (see scheduling.py) in a write
+               transaction, so no two workers get the same task
+    heartbeat  while the task runs, a background thread extends the lease every lease_seconds / 3
+    expiry     a task whose lease ran out (its worker died or lost the file) goes back to pending for the next worker
+    complete   the replica is stored and the task marked done in one transaction; a late result of a task that was
+               re-leased in the meantime is discarded, which is harmless as both runs use the same seed
+
+Every reprioritize_seconds (and when it starts), a worker refits the cost model to the measured runtimes of all finished
+tasks and updates the expected runtimes of the pending ones, so the slowest tasks are started first; in between, it adds
+its own finished tasks to its model. The status command reports the throughput and an ETA.
+
+Workers can join or leave at any time; a worker that is stopped with Ctrl-C hands its task back. Put the queue file on
+a filesystem all hosts can reach (or on a local disk for several workers on one machine). SQLite relies on the
+filesystem's locks, so a network filesystem has to support them (NFSv4 or a local mount work; rollback journal mode
+is used because WAL does not work over the network).
+
+Example:
+    python work_queue.py init sweep.yaml --queue sweep_queue.sqlite     # once
+    python work_queue.py work --queue sweep_queue.sqlite                # on every worker, as many as you like
+    python work_queue.py status --queue sweep_queue.sqlite
+    python work_queue.py merge --queue sweep_queue.sqlite               # results CSV, identical to sweep.py run
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=300, timeout=60):
+        '''
+        Args:
+            path (str): Queue file.
+            lease_seconds (float): Time after which a task without heartbeat is handed to another worker.
+            timeout (float): How long to wait for another worker's lock on the file before giving up.
+        '''
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = DELETE")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                point INTEGER NOT NULL,
+                replica INTEGER NOT NULL,
+                seed INTEGER NOT NULL,
+                monomer_params TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                priority REAL NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                started REAL,
+                finished REAL,
+                seconds REAL,
+                result TEXT,
+                UNIQUE (point, replica)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, priority DESC, id);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Write transaction that takes the file lock at the start, so concurrent lease() calls cannot both pick the same task.
+        '''
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def spec(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'spec'").fetchone()
+        if row is None:
+            raise ValueError(f"{self.path} has no sweep yet, run 'work_queue.py init' first")
+        return json.loads(row[0])
+
+    def enqueue(self, spec):
+        """
+        Add the tasks of a sweep. Enqueueing the same spec again only adds the tasks that are missing, so init can safely be
+        run twice.
+
+        Args:
+            spec (dict): Sweep spec (see sweep.load_spec).
+
+        Returns:
+            int: Number of tasks added.
+        """
+        from sweep import spec_fingerprint, sweep_points, sweep_tasks, task_seed
+        from scheduling import CostModel
+
+        fingerprint = spec_fingerprint(spec)
+        points = sweep_points(spec)
+        model = CostModel(spec)
+        rows = [(point, replica, task_seed(spec, points[point], replica), json.dumps(points[point]), model.predict(points[point]))
+                for point, replica in sweep_tasks(spec)]
+        with self.transaction() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is not None and row[0] != fingerprint:
+                raise ValueError(f"{self.path} already holds a different sweep")
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('spec', ?)", (json.dumps(spec),))
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO tasks (point, replica, seed, monomer_params, priority) VALUES (?, ?, ?, ?, ?)", rows)
+            return connection.total_changes - before
+
+    def requeue_expired(self, connection, now):
+        return connection.execute("UPDATE tasks SET state = 'pending', worker = NULL, lease_expires = NULL "
+                                  "WHERE state = 'leased' AND lease_expires < ?", (now,)).rowcount
+
+    def lease(self, worker):
+        """
+        Take the pending task with the longest expected runtime, re-queueing expired leases first.
+
+        Returns:
+            tuple: (task id, point, replica, seed, monomer params), or None if no task is pending.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            self.requeue_expired(connection, now)
+            row = connection.execute("SELECT id, point, replica, seed, monomer_params FROM tasks WHERE state = 'pending' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                               (worker, now + self.lease_seconds, now, row[0]))
+        task_id, point, replica, seed, monomer_params = row
+        return task_id, point, replica, seed, json.loads(monomer_params)
+
+    def heartbeat(self, task_id, worker):
+        '''
+        Extend the lease of a task. Returns False if the worker no longer holds it (the lease expired and was re-queued).
+        '''
+        with self.transaction() as connection:
+            return connection.execute("UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                                      (time.time() + self.lease_seconds, task_id, worker)).rowcount == 1
+
+    def complete(self, task_id, worker, replica, seconds=None):
+        '''
+        Store the result of a task and its runtime (None for cache hits, which are left out of the cost model). Returns
+        False if the task was completed by another worker first.
+        '''
+        with self.transaction() as connection:
+            return connection.execute("UPDATE tasks SET state = 'done', worker = ?, lease_expires = NULL, finished = ?, seconds = ?, result = ? "
+                                      "WHERE id = ? AND state != 'done'", (worker, time.time(), seconds, json.dumps(replica), task_id)).rowcount == 1
+
+    def cost_model(self):
+        '''
+        Cost model of the sweep (see scheduling.py), fitted to the runtimes of all finished tasks.
+        '''
+        from scheduling import CostModel
+
+        model = CostModel(self.spec())
+        params = {} # point -> monomer params, so every point is decoded once
+        for point, monomer_params, seconds in self.connection.execute(
+                "SELECT point, monomer_params, seconds FROM tasks WHERE state = 'done' AND seconds IS NOT NULL ORDER BY finished"):
+            if point not in params:
+                params[point] = json.loads(monomer_params)
+            model.observe(params[point], seconds)
+        return model
+
+    def reprioritize(self, model):
+        '''
+        Set the expected runtimes of the pending tasks from a cost model.
+        '''
+        # predict outside the write lock; a point that is no longer pending by the time of the update just updates no rows
+        pending = self.connection.execute("SELECT point, MIN(monomer_params) FROM tasks WHERE state = 'pending' GROUP BY point").fetchall()
+        priorities = [(model.predict(json.loads(params)), point) for point, params in pending]
+        with self.transaction() as connection:
+            connection.executemany("UPDATE tasks SET priority = ? WHERE point = ? AND state = 'pending'", priorities)
+
+    def eta(self, model=None, window=3600):
+        """
+        Progress estimate of the sweep.
+
+        Args:
+            model (CostModel): Fitted cost model (defaults to cost_model()).
+            window (float): Seconds over which the throughput is measured.
+
+        Returns:
+            tuple: (simulations finished per hour over the last window, seconds until all tasks are done at the current
+                    number of workers)
+        """
+        model = model or self.cost_model()
+        now = time.time()
+        first, recent = self.connection.execute("SELECT MIN(started), SUM(finished >= ?) FROM tasks WHERE state = 'done' AND seconds IS NOT NULL",
+                                                (now - window,)).fetchone()
+        throughput = 3600 * (recent or 0) / min(window, now - first) if first is not None and now > first else 0.0
+        # remaining work: the pending tasks and whatever is left of the running ones, spread over the running workers
+        remaining = sum(count * model.predict(json.loads(params)) for params, count in self.connection.execute(
+            "SELECT MIN(monomer_params), COUNT(*) FROM tasks WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+            "GROUP BY point", (now,)))
+        running = self.workers()
+        remaining += sum(max(model.predict(json.loads(params)) - elapsed, 0.0) for params, elapsed in self.connection.execute(
+            "SELECT monomer_params, ? - started FROM tasks WHERE state = 'leased' AND lease_expires >= ?", (now, now)))
+        return throughput, remaining / max(len({worker for worker, *_ in running}), 1)
+
+    def release(self, task_id, worker):
+        '''
+        Hand a leased task back, e.g. when the worker is stopped.
+        '''
+        with self.transaction() as connection:
+            connection.execute("UPDATE tasks SET state = 'pending', worker = NULL, lease_expires = NULL WHERE id = ? AND worker = ? AND state = 'leased'",
+                               (task_id, worker))
+
+    def counts(self):
+        '''
+        Number of tasks per state, with expired leases counted as pending.
+        '''
+        counts = {"pending": 0, "leased": 0, "done": 0}
+        for state, count in self.connection.execute("SELECT CASE WHEN state = 'leased' AND lease_expires < ? THEN 'pending' ELSE state END, COUNT(*) "
+                                                    "FROM tasks GROUP BY 1", (time.time(),)):
+            counts[state] += count
+        return counts
+
+    def workers(self):
+        '''
+        Workers holding a live lease, with their task and how long it has been running: [(worker, point, replica, seconds)].
+        '''
+        now = time.time()
+        return [(worker, point, replica, now - started) for worker, point, replica, started in self.connection.execute(
+            "SELECT worker, point, replica, started FROM tasks WHERE state = 'leased' AND lease_expires >= ? ORDER BY started", (now,))]
+
+    def results(self):
+        '''
+        Replicas of all finished tasks: {(point, replica): replica dict}.
+        '''
+        from sweep import decode_replica
+        return {(point, replica): decode_replica(json.loads(result))
+                for point, replica, result in self.connection.execute("SELECT point, replica, result FROM tasks WHERE state = 'done'")}
+
+class Heartbeat:
+    '''
+    Background thread that keeps the lease of the running task alive. It uses its own connection to the queue file.
+    '''
+    def __init__(self, path, task_id, worker, lease_seconds, timeout):
+        self.lost = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(path, task_id, worker, lease_seconds, timeout), daemon=True)
+        self.thread.start()
+
+    def run(self, path, task_id, worker, lease_seconds, timeout):
+        queue = WorkQueue(path, lease_seconds, timeout)
+        try:
+            while not self.stop.wait(lease_seconds / 3):
+                try:
+                    if not queue.heartbeat(task_id, worker):
+                        self.lost = True
+                        return
+                except sqlite3.OperationalError: # file busy for longer than the timeout, try again at the next beat
+                    pass
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def work(path, worker=None, lease_seconds=300, poll=10, max_tasks=None, instrument=False, timeout=60, reprioritize_seconds=60):
+    """
+    Lease and run tasks until the sweep is finished (or max_tasks were run).
+
+    While no task is pending but other workers still hold leases, the worker waits and polls, so it picks up the tasks of
+    workers that die.
+
+    Args:
+        path (str): Queue file.
+        worker (str): Name of this worker (defaults to host:pid).
+        lease_seconds (float): Lease duration; heartbeats are sent every lease_seconds / 3.
+        poll (float): Seconds between polls while waiting for leased tasks.
+        max_tasks (int): Stop after this many tasks.
+        instrument (bool): Count events and time the phases of every run (reference engine only).
+        timeout (float): How long to wait for a lock on the queue file.
+        reprioritize_seconds (float): Seconds between refits of the cost model to the finished tasks of all workers.
+
+    Returns:
+        int: Number of tasks this worker completed.
+    """
+    from sweep import sweep_engine, run_task, is_cached
+    from instrumentation import logger
+    from scheduling import format_duration
+
+    worker = worker or default_worker_name()
+    completed = 0
+    with WorkQueue(path, lease_seconds, timeout) as queue:
+        spec = queue.spec()
+        engine, cache = sweep_engine(spec)
+        model = queue.cost_model()
+        queue.reprioritize(model)
+        refitted = time.time()
+        while max_tasks is None or completed < max_tasks:
+            task = queue.lease(worker)
+            if task is None:
+                if queue.counts()["leased"] == 0:
+                    break
+                time.sleep(poll)
+                continue
+
+            task_id, point, replica_index, seed, monomer_params = task
+            logger.info("%s: diffusion: %s, rotation: %s, coupling: %s, dehalogen: %s, replica %d", worker, monomer_params[2],
+                        monomer_params[4], monomer_params[6], monomer_params[8], replica_index)
+            cached = is_cached(spec, monomer_params, replica_index, cache)
+            start = time.time()
+            try:
+                with Heartbeat(path, task_id, worker, lease_seconds, timeout) as heartbeat:
+                    replica = run_task(spec, monomer_params, replica_index, cache, engine, instrument)
+            except BaseException:
+                queue.release(task_id, worker)
+                raise
+            seconds = time.time() - start
+            if heartbeat.lost:
+                logger.warning("%s: lost the lease of point %d, replica %d; storing the result anyway", worker, point, replica_index)
+            if queue.complete(task_id, worker, replica, None if cached else seconds):
+                completed += 1
+                if not cached:
+                    model.observe(monomer_params, seconds)
+
+            if time.time() - refitted >= reprioritize_seconds:
+                model = queue.cost_model()
+                queue.reprioritize(model)
+                refitted = time.time()
+            throughput, eta = queue.eta(model)
+            counts = queue.counts()
+            logger.info("%s: finished in %.1f s; %d/%d done, %.1f simulations/h, ETA %s", worker, seconds, counts["done"],
+                        sum(counts.values()), throughput, format_duration(eta))
+    logger.info("%s: no tasks left after completing %d", worker, completed)
+    return completed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a sweep through a shared work queue.")
+    parser.add_argument("command", choices=["init", "work", "status", "merge"])
+    parser.add_argument("spec", nargs="?", help="sweep spec (init only)")
+    parser.add_argument("--queue", default="sweep_queue.sqlite", help="path to the queue file")
+    parser.add_argument("--worker", default=None, help="worker name (defaults to host:pid)")
+    parser.add_argument("--lease", type=float, default=300, help="lease duration in seconds")
+    parser.add_argument("--poll", type=float, default=10, help="seconds between polls while other workers finish")
+    parser.add_argument("--max-tasks", type=int, default=None)
+    parser.add_argument("--reprioritize", type=float, default=60, help="seconds between refits of the cost model")
+    parser.add_argument("--instrument", action="store_true")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("-o", "--output", default=None, help="results file of merge (defaults to the spec's output)")
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        from sweep import load_spec
+        if args.spec is None:
+            parser.error("init needs a sweep spec")
+        with WorkQueue(args.queue) as queue:
+            added = queue.enqueue(load_spec(args.spec))
+            print(f"Added {added} tasks to {args.queue} ({queue.counts()})")
+    elif args.command == "work":
+        from instrumentation import configure_logging
+        configure_logging(args.log_level)
+        work(args.queue, args.worker, args.lease, args.poll, args.max_tasks, args.instrument, reprioritize_seconds=args.reprioritize)
+    elif args.command == "status":
+        from scheduling import format_duration
+        with WorkQueue(args.queue) as queue:
+            counts = queue.counts()
+            throughput, eta = queue.eta()
+            print(f"{counts['done']} done, {counts['leased']} running, {counts['pending']} pending")
+            print(f"{throughput:.1f} simulations/h, ETA {format_duration(eta)}")
+            for worker, point, replica, seconds in queue.workers():
+                print(f"    {worker}: point {point}, replica {replica}, running for {seconds:.0f} s")
+    elif args.command == "merge":
+        from sweep import write_results
+        with WorkQueue(args.queue) as queue:
+            spec = queue.spec()
+            results = write_results(spec, queue.results(), args.output)
+        print(f"Results of {len(results)} points saved to {args.output or spec['output']}")
+
+if __name__ == "__main__":
+    main()
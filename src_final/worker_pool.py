@@ -0,0 +1,46 @@
+# src/worker_pool.py
+
+"""
+Process pools whose workers start warm, for running many short simulations in parallel.
+
+A fresh worker process has to start the interpreter and import the simulation core (numpy, lattice, monomer, main, ...)
+before it can run its first island, which is a noticeable share of the runtime of a short simulation. warm_pool starts a
+forkserver that imports the core (and the running script) once; every worker is then forked from it with everything
+already imported, instead of being spawned from scratch or forked from a parent that may hold threads, plots and large
+arrays. main.py only imports the core: plotting (plotter.py, matplotlib) and the heavy parts of analysis.py (scipy,
+networkx, skimage) are imported where they are used.
+
+Example:
+    from worker_pool import warm_pool
+    with warm_pool(workers=8) as pool:
+        futures = [pool.submit(run_replica, ...) for ...]
+
+On platforms without forkserver (Windows) this is a plain ProcessPoolExecutor.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# modules of the simulation core, imported once by the forkserver
+CORE_MODULES = ["numpy", "instrumentation", "geometry", "lattice", "monomer", "defect", "substrate", "analysis", "snapshot",
+                "result_cache", "main"]
+
+def warm_pool(workers=None, preload=(), initializer=None, initargs=()):
+    """
+    ProcessPoolExecutor whose workers are forked from a server that has imported the simulation core.
+
+    Args:
+        workers (int): Number of worker processes (defaults to the number of CPUs).
+        preload (list): Further modules to import in the server, e.g. the module of the function run by the workers.
+        initializer, initargs: Passed on to ProcessPoolExecutor, run once in every worker.
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    context = multiprocessing.get_context("forkserver")
+    # "__main__" makes the server run the script's imports, so that workers do not re-import it to unpickle its
+    # functions; modules that fail to import are skipped by the server. Only takes effect before the server is started.
+    context.set_forkserver_preload(["__main__"] + CORE_MODULES + list(preload))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer, initargs=initargs)